@@ -0,0 +1,135 @@
+# app/admission.py
+# ------------------------------------------------------------
+# Admission control di depan endpoint mahal (/api/invoice, /api/qr miss):
+# - token bucket per uid DAN per IP klien, per endpoint (uid dikirim klien,
+#   jadi IP tetap dibatasi)
+# - budget global scraper: maks ADMIT_SCRAPER_SLOTS sesi Chromium bersamaan
+#   per proses (tiap worker punya browser sendiri); penuh → tolak, bukan antri
+# - ditolak → Rejected(retry_after) → 429 + Retry-After cepat di main.py
+#   (Retry-After slot scraper = rata-rata durasi scrape terakhir, EWMA);
+#   Mini App (app.js loadQrWithRetry) menunggu Retry-After lalu mencoba lagi
+# - counter admission_rejected_total{endpoint,reason} di /metrics
+#
+# Hit cache QR / payload yang sudah ada tidak lewat sini (murah).
+#
+# ENV:
+#   ADMISSION=1                    (opsional; 0 = nonaktif)
+#   ADMIT_INVOICE_UID_PER_MIN=6    (opsional)
+#   ADMIT_INVOICE_IP_PER_MIN=30    (opsional)
+#   ADMIT_QR_UID_PER_MIN=4         (opsional; hanya QR yang perlu generate)
+#   ADMIT_QR_IP_PER_MIN=12         (opsional)
+#   ADMIT_UID_BURST=3              (opsional)
+#   ADMIT_IP_BURST=10              (opsional)
+#   ADMIT_SCRAPER_SLOTS=2          (opsional; 0 = tanpa batas global)
+#   ADMIT_PROXY_HOPS=1             (opsional; IP klien = entri X-Forwarded-For ke-N dari kanan; 0 = abaikan XFF)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import contextlib
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from . import metrics
+from .cache import LRUCache
+from .ratelimit import TokenBucket
+
+ADMISSION = os.getenv("ADMISSION", "1") == "1"
+ADMIT_UID_BURST = float(os.getenv("ADMIT_UID_BURST", "3"))
+ADMIT_IP_BURST = float(os.getenv("ADMIT_IP_BURST", "10"))
+ADMIT_SCRAPER_SLOTS = int(os.getenv("ADMIT_SCRAPER_SLOTS", "2"))
+ADMIT_PROXY_HOPS = int(os.getenv("ADMIT_PROXY_HOPS", "1"))
+
+# endpoint → (uid/detik, ip/detik)
+POLICIES: Dict[str, tuple] = {
+    "invoice": (float(os.getenv("ADMIT_INVOICE_UID_PER_MIN", "6")) / 60,
+                float(os.getenv("ADMIT_INVOICE_IP_PER_MIN", "30")) / 60),
+    "qr": (float(os.getenv("ADMIT_QR_UID_PER_MIN", "4")) / 60,
+           float(os.getenv("ADMIT_QR_IP_PER_MIN", "12")) / 60),
+}
+SCRAPE_EWMA_ALPHA = 0.2
+
+REJECTED = metrics.Counter(
+    "admission_rejected_total", "Request mahal yang ditolak (429)", ("endpoint", "reason"),
+)
+
+_BUCKETS = LRUCache("admission_buckets", max_items=50_000)  # (endpoint, "uid"|"ip", key) → TokenBucket
+_SCRAPES = {"inflight": 0, "avg_s": 20.0}
+_STATS: Dict[str, int] = {"admitted": 0, "rejected": 0}
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_ip(headers: Any, peer: Optional[str]) -> str:
+    """IP klien; di belakang proxy (Railway) pakai X-Forwarded-For dari kanan."""
+    xff = headers.get("x-forwarded-for") if ADMIT_PROXY_HOPS > 0 else None
+    if xff:
+        hops = [h.strip() for h in xff.split(",") if h.strip()]
+        if hops:
+            return hops[-min(ADMIT_PROXY_HOPS, len(hops))]
+    return peer or "unknown"
+
+
+def _take(endpoint: str, kind: str, key: Any, rate: float, burst: float, now: float) -> float:
+    if rate <= 0 or key in (None, ""):
+        return 0.0
+    ck = (endpoint, kind, key)
+    b = _BUCKETS.get(ck, count=False)
+    if b is None:
+        b = TokenBucket(rate, burst)
+        b.ts = now  # now diambil sebelum bucket dibuat; jangan sampai dt negatif
+        _BUCKETS.set(ck, b)
+    return b.take(now)
+
+
+def _reject(endpoint: str, reason: str, retry_after: float) -> None:
+    REJECTED.inc(endpoint, reason)
+    _STATS["rejected"] += 1
+    raise Rejected(reason, retry_after)
+
+
+def check(endpoint: str, uid: Any, ip: Optional[str]) -> None:
+    """Lolos → return; lewat batas → raise Rejected."""
+    if not ADMISSION or endpoint not in POLICIES:
+        return
+    uid_rate, ip_rate = POLICIES[endpoint]
+    now = time.monotonic()
+    # IP dulu: ditolak karena IP tidak memakan token uid user tsb
+    wait = _take(endpoint, "ip", ip, ip_rate, ADMIT_IP_BURST, now)
+    if wait:
+        _reject(endpoint, "ip", wait)
+    wait = _take(endpoint, "uid", str(uid) if uid is not None else None, uid_rate, ADMIT_UID_BURST, now)
+    if wait:
+        _reject(endpoint, "uid", wait)
+    _STATS["admitted"] += 1
+
+
+@contextlib.contextmanager
+def scrape_slot(endpoint: str = "qr") -> Iterator[None]:
+    """Budget global sesi scraper; penuh → Rejected (tanpa antri)."""
+    if ADMISSION and ADMIT_SCRAPER_SLOTS > 0 and _SCRAPES["inflight"] >= ADMIT_SCRAPER_SLOTS:
+        _reject(endpoint, "scraper_busy", _SCRAPES["avg_s"])
+    _SCRAPES["inflight"] += 1
+    t0 = time.monotonic()
+    try:
+        yield
+    finally:
+        _SCRAPES["inflight"] -= 1
+        _SCRAPES["avg_s"] += SCRAPE_EWMA_ALPHA * (time.monotonic() - t0 - _SCRAPES["avg_s"])
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_STATS,
+        "enabled": ADMISSION,
+        "scraper_inflight": _SCRAPES["inflight"],
+        "scraper_slots": ADMIT_SCRAPER_SLOTS,
+        "scrape_avg_s": round(_SCRAPES["avg_s"], 2),
+        "buckets": len(_BUCKETS),
+    }
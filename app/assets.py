@@ -0,0 +1,172 @@
+# app/assets.py
+# ------------------------------------------------------------
+# Aset statis Mini App (app/webapp) tanpa build step:
+# - saat startup: baca semua file, hash isi (sha256) → URL content-addressed
+#   /assets/<nama>.<hash>.<ext>, aman di-cache "immutable" 1 tahun
+# - precompress sekali (gzip + brotli; `brotli` ada di requirements.txt,
+#   tanpa modul itu jatuh ke gzip saja) untuk tipe teks; gambar apa adanya
+# - file sampingan editor/OS (salinan "x copy.js", dotfile, *~, *.bak/.orig/.tmp)
+#   tidak masuk manifest
+# - index.html: referensi "/webapp/x" / "/static/x" (query ?v= diabaikan)
+#   ditulis ulang ke URL ber-hash; index sendiri no-cache + ETag (selalu
+#   revalidasi, murah: 304) sehingga deploy baru langsung terambil
+# - negosiasi Content-Encoding: br > gzip > identity (Vary: Accept-Encoding)
+#
+# /webapp/* dan /static/* lama tetap dilayani StaticFiles (kompatibilitas).
+#
+# ENV:
+#   ASSETS_DIR=app/webapp       (opsional)
+#   ASSETS_RELOAD=0             (opsional; 1 = rebuild bila file berubah, untuk dev)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+ASSETS_DIR = os.getenv("ASSETS_DIR", "app/webapp")
+ASSETS_RELOAD = os.getenv("ASSETS_RELOAD", "0") == "1"
+URL_PREFIX = "/assets/"
+INDEX = "index.html"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".html", ".js", ".css", ".svg", ".json", ".txt", ".map", ".ico"}
+MIN_COMPRESS_BYTES = 512
+
+_IGNORED_RE = re.compile(r"(?:^|/)\.|(?: copy(?: \d+)?\.[^/.]+$)|~$|\.(?:bak|orig|tmp|swp)$", re.I)
+
+# referensi dalam tanda kutip ke aset lokal, mis. "/webapp/app.js?v=neon8"
+_REF_RE = re.compile(r"""(["'])/(?:webapp|static)/([^"'?#\s]+)(?:\?[^"'#\s]*)?\1""")
+
+try:  # opsional; tanpa brotli cukup gzip
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class Asset:
+    __slots__ = ("path", "url", "media_type", "etag", "body", "gz", "br", "cache_control")
+
+    def __init__(self, path: str, body: bytes, url: str, cache_control: str):
+        self.path = path
+        self.url = url
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type.endswith(("javascript", "json")):
+            self.media_type += "; charset=utf-8"
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.body = body
+        self.cache_control = cache_control
+        self.gz = self.br = None
+        if os.path.splitext(path)[1].lower() in COMPRESSIBLE and len(body) >= MIN_COMPRESS_BYTES:
+            gz = gzip.compress(body, 9, mtime=0)
+            self.gz = gz if len(gz) < len(body) else None
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                self.br = br if len(br) < len(body) else None
+
+    def pick(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(body, content-encoding) sesuai Accept-Encoding klien."""
+        ae = (accept_encoding or "").lower()
+        if self.br is not None and "br" in ae:
+            return self.br, "br"
+        if self.gz is not None and "gzip" in ae:
+            return self.gz, "gzip"
+        return self.body, None
+
+
+_LOCK = threading.Lock()
+_BY_PATH: Dict[str, Asset] = {}  # "app.js" → Asset
+_BY_URL: Dict[str, Asset] = {}   # "app.1a2b3c4d5e.js" → Asset
+_MTIMES: Dict[str, float] = {}
+
+
+def _hashed_name(rel: str, body: bytes) -> str:
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+
+
+def _scan() -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for root, _, files in os.walk(ASSETS_DIR):
+        for name in files:
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, ASSETS_DIR).replace(os.sep, "/")
+            if not _IGNORED_RE.search(rel):
+                out[rel] = os.path.getmtime(full)
+    return out
+
+
+def _rewrite(html: str, by_path: Dict[str, Asset]) -> str:
+    def sub(m: re.Match) -> str:
+        a = by_path.get(m.group(2))
+        return f"{m.group(1)}{a.url}{m.group(1)}" if a else m.group(0)
+    return _REF_RE.sub(sub, html)
+
+
+def build() -> Dict[str, Any]:
+    """Hash + precompress seluruh ASSETS_DIR (dipanggil di startup, di thread)."""
+    mtimes = _scan()
+    by_path: Dict[str, Asset] = {}
+    for rel in sorted(mtimes):
+        if rel == INDEX:
+            continue
+        with open(os.path.join(ASSETS_DIR, rel), "rb") as f:
+            body = f.read()
+        by_path[rel] = Asset(rel, body, URL_PREFIX + _hashed_name(rel, body), IMMUTABLE)
+    if INDEX in mtimes:
+        with open(os.path.join(ASSETS_DIR, INDEX), encoding="utf-8") as f:
+            html = _rewrite(f.read(), by_path)
+        by_path[INDEX] = Asset(INDEX, html.encode(), "/webapp/", REVALIDATE)
+    with _LOCK:
+        _BY_PATH.clear()
+        _BY_PATH.update(by_path)
+        _BY_URL.clear()
+        _BY_URL.update({a.url[len(URL_PREFIX):]: a for a in by_path.values() if a.url.startswith(URL_PREFIX)})
+        _MTIMES.clear()
+        _MTIMES.update(mtimes)
+    return stats()
+
+
+def _ensure() -> None:
+    if not _BY_PATH or (ASSETS_RELOAD and _scan() != _MTIMES):
+        build()
+
+
+def index() -> Optional[Asset]:
+    _ensure()
+    return _BY_PATH.get(INDEX)
+
+
+def by_url(name: str) -> Optional[Asset]:
+    _ensure()
+    return _BY_URL.get(name)
+
+
+def url_for(path: str) -> str:
+    """URL ber-hash untuk file di ASSETS_DIR (fallback /webapp/<path>)."""
+    _ensure()
+    a = _BY_PATH.get(path)
+    return a.url if a else f"/webapp/{path}"
+
+
+def file_hash(path: str) -> Optional[str]:
+    """Hash isi file (untuk kunci cache di luar HTTP, mis. file_id banner Telegram)."""
+    _ensure()
+    a = _BY_PATH.get(path)
+    return a.etag.strip('"') if a else None
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "files": len(_BY_PATH),
+        "brotli": brotli is not None,
+        "bytes": sum(len(a.body) for a in _BY_PATH.values()),
+        "gzip_bytes": sum(len(a.gz or a.body) for a in _BY_PATH.values()),
+        "br_bytes": sum(len(a.br or a.gz or a.body) for a in _BY_PATH.values()),
+        "urls": {p: a.url for p, a in _BY_PATH.items()},
+    }
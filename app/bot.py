@@ -3,7 +3,7 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import os, json, time, asyncio, re
+import os, json, time, re
 from typing import Any, Optional, List, Tuple, Dict
 
 from telegram import (
@@ -18,9 +18,12 @@ except Exception:
     from telegram.constants import BotCommandScopeDefault, BotCommandScopeAllPrivateChats, BotCommandScopeAllGroupChats
 
 from telegram.ext import (
-    Application, CommandHandler, ContextTypes, CallbackQueryHandler
+    Application, CommandHandler, ContextTypes, CallbackQueryHandler, ChatMemberHandler
 )
-from telegram.error import Forbidden, BadRequest, RetryAfter, TimedOut, NetworkError
+from telegram.error import BadRequest
+
+from . import assets, chats, gate, storage
+from .ratelimit import LIMITER
 
 # ===================== ENV & CONFIG BASE =====================
 
@@ -30,6 +33,8 @@ if not BOT_TOKEN:
 
 BASE_URL = os.getenv("BASE_URL") or "http://127.0.0.1:8000"
 WEBAPP_URL = (os.getenv("WEBAPP_URL") or "").strip()
+# opsional: Bot API lain (mis. stand-in lokal bench/bench_e2e.py); default Telegram
+TELEGRAM_API_URL = (os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org").rstrip("/")
 
 # GROUPS untuk pemetaan id->nama (dipakai saat kirim undangan)
 GROUPS = json.loads(os.getenv("GROUP_IDS_JSON") or "[]")
@@ -43,11 +48,14 @@ try:
 except Exception:
     pass
 
-ALLOWED_STATUSES = {"member", "administrator", "creator"}
-
 def build_app() -> Application:
     # NOTE: menu global dipasang via install_global_menu_and_commands(...) setelah app dibuat (di main.py)
-    return Application.builder().token(BOT_TOKEN).build()
+    # rate limiter global (dibagi dengan bot_check di main.py) → 1 budget Telegram
+    return (
+        Application.builder().token(BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .rate_limiter(LIMITER).build()
+    )
 
 # ===================== DEBUG HELPERS =====================
 
@@ -79,11 +87,11 @@ def _menu_webapp_url_for(uid: Optional[int] = None) -> str:
         if uid is None:
             return WEBAPP_URL
         sep = "&" if ("?" in WEBAPP_URL) else "?"
-        return f"{WEBAPP_URL}{sep}uid={uid}&t={int(time.time())}"
-    # fallback: serve dari BASE_URL
+        return f"{WEBAPP_URL}{sep}uid={uid}"
+    # fallback: serve dari BASE_URL (index no-cache + ETag, aset ber-hash → tanpa ?t=)
     if uid is None:
         return f"{BASE_URL}/webapp/"
-    return f"{BASE_URL}/webapp/?uid={uid}&t={int(time.time())}"
+    return f"{BASE_URL}/webapp/?uid={uid}"
 
 async def install_global_menu_and_commands(bot, base_url: str):
     webapp_url = f"{base_url.rstrip('/')}/webapp/"  # index.html auto
@@ -120,8 +128,8 @@ async def _reset_menu_to_default_for_chat(bot, chat_id: int):
 def _webapp_url_for(uid: int) -> str:
     if WEBAPP_URL:
         sep = "&" if ("?" in WEBAPP_URL) else "?"
-        return f"{WEBAPP_URL}{sep}uid={uid}&t={int(time.time())}"
-    return f"{BASE_URL}/webapp/index.html?v=neon4&uid={uid}"
+        return f"{WEBAPP_URL}{sep}uid={uid}"
+    return f"{BASE_URL}/webapp/?uid={uid}"
 
 async def _send_webapp_hint(chat_id: int, uid: int, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -141,90 +149,26 @@ async def _send_webapp_hint(chat_id: int, uid: int, context: ContextTypes.DEFAUL
 
 # ===================== GATE: RUNTIME ENV LOADER =====================
 
-_USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{5,32}$")  # username publik valid (tanpa @)
-
-def _split_env(name: str) -> List[str]:
-    v = os.getenv(name, "") or ""
-    return [x.strip() for x in v.split(",") if x.strip()]
-
-def _valid_usernames(items: List[str]) -> List[str]:
-    return [x for x in items if _USERNAME_RE.fullmatch(x)]
-
 def _load_gate_env():
     """Baca semua variabel gate SETIAP KALI dipanggil (runtime reload)."""
-    group_ids   = _split_env("REQUIRED_GROUP_IDS")
-    channel_ids = _split_env("REQUIRED_CHANNEL_IDS")
-    group_links = _split_env("REQUIRED_GROUP_INVITES")
-    chan_links  = _split_env("REQUIRED_CHANNEL_INVITES")
-    group_users = _valid_usernames(_split_env("REQUIRED_GROUP_USERNAMES"))
-    chan_users  = _valid_usernames(_split_env("REQUIRED_CHANNEL_USERNAMES"))
-    mode        = (os.getenv("REQUIRED_MODE", "ALL") or "ALL").upper()
-    try:
-        min_count = int(os.getenv("REQUIRED_MIN_COUNT", "1"))
-    except ValueError:
-        min_count = 1
-
-    return {
-        "group_ids": group_ids,
-        "channel_ids": channel_ids,
-        "group_links": group_links,
-        "chan_links": chan_links,
-        "group_users": group_users,
-        "chan_users": chan_users,
-        "mode": mode,
-        "min_count": min_count,
-    }
+    return gate.load_env()
 
 # ===================== GATE: HELPERS =====================
 
 async def _is_member(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: str) -> Optional[bool]:
-    if not chat_id:
-        return True
-    try:
-        cm = await context.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
-        return getattr(cm, "status", "") in ALLOWED_STATUSES
-    except (Forbidden, BadRequest):
-        return None
-    except Exception:
-        return None
+    res = await gate.is_member(context.bot, user_id, chat_id)
+    return None if res == -1 else bool(res)
 
-# ---- title resolver (cache) ----
-_NAME_CACHE: Dict[str, str] = {}
+# ---- title resolver (metadata chat bersama, lihat app/chats.py) ----
 
 async def _resolve_titles(context: ContextTypes.DEFAULT_TYPE, cfg) -> Tuple[List[str], List[str]]:
     """
     Kembalikan (group_titles[], channel_titles[]) urutannya sejajar dengan id.
-    Sumber nama:
-      1) GROUP_NAME_BY_ID (dari katalog)
-      2) get_chat(title) (di-cache)
-      3) fallback: id/username
+    Sumber nama: katalog → get_chat(title) (cache bersama) → id/username.
     """
-    group_titles: List[str] = []
-    channel_titles: List[str] = []
-
-    async def _title_for(chat_id: str) -> str:
-        key = str(chat_id)
-        if key in GROUP_NAME_BY_ID:
-            title = GROUP_NAME_BY_ID[key]
-        elif key in _NAME_CACHE:
-            title = _NAME_CACHE[key]
-        else:
-            try:
-                chat = await context.bot.get_chat(chat_id=chat_id)
-                title = getattr(chat, "title", None) or f"@{getattr(chat, 'username', '')}".strip("@") or key
-            except Exception:
-                title = key
-            if len(title) > 32:
-                title = title[:29] + "..."
-            _NAME_CACHE[key] = title
-        return title
-
-    for gid in cfg["group_ids"]:
-        group_titles.append(await _title_for(gid))
-    for cid in cfg["channel_ids"]:
-        channel_titles.append(await _title_for(cid))
-
-    return group_titles, channel_titles
+    n_groups = len(cfg["group_ids"])
+    titles = await chats.titles(context.bot, cfg["group_ids"] + cfg["channel_ids"])
+    return list(titles[:n_groups]), list(titles[n_groups:])
 
 def _join_button(label: str, invite: Optional[str], username: Optional[str]) -> InlineKeyboardButton:
     if invite:
@@ -255,30 +199,14 @@ async def _count_memberships(
       None  -> tidak bisa diperiksa (bot belum punya akses)
     """
     total_required = len(cfg["group_ids"]) + len(cfg["channel_ids"])
-    ok_count = 0
-    total_checkable = 0
-    any_cannot_check = False
-
-    mem_groups: List[Optional[bool]] = []
-    mem_channels: List[Optional[bool]] = []
-
-    for chat_id in cfg["group_ids"]:
-        res = await _is_member(context, user_id, chat_id)
-        mem_groups.append(res)
-        if res is None:
-            any_cannot_check = True
-        else:
-            total_checkable += 1
-            if res: ok_count += 1
-
-    for chat_id in cfg["channel_ids"]:
-        res = await _is_member(context, user_id, chat_id)
-        mem_channels.append(res)
-        if res is None:
-            any_cannot_check = True
-        else:
-            total_checkable += 1
-            if res: ok_count += 1
+    ok_count, any_cannot_check, res_groups, res_channels = await gate.count(context.bot, user_id, cfg)
+    total_checkable = sum(1 for r in res_groups + res_channels if r != -1)
+
+    def _as_opt(r: int) -> Optional[bool]:
+        return None if r == -1 else bool(r)
+
+    mem_groups: List[Optional[bool]] = [_as_opt(r) for r in res_groups]
+    mem_channels: List[Optional[bool]] = [_as_opt(r) for r in res_channels]
 
     return ok_count, total_checkable, total_required, any_cannot_check, mem_groups, mem_channels
 
@@ -325,6 +253,31 @@ def _is_pass(ok_count: int, total_required: int, cfg) -> bool:
         min_need = total_required
     return ok_count >= min_need
 
+# ===================== BANNER /start =====================
+# Upload file hanya sekali per isi banner; selanjutnya pakai file_id Telegram
+# (disimpan di kv, kunci = hash isi file → ganti gambar = upload ulang otomatis)
+START_BANNER = "img/start-banner.jpg"
+START_CAPTION = (
+    "👋 *Welcome to the VIP Zone!*\n\n"
+    "💠 Tekan **Join VIP** di menu bawah untuk membuka Mini App.\n"
+    "📂 Jelajahi katalog premium eksklusif.\n"
+    "⚡ Jika tombol belum tampil, cukup ketik /refresh."
+)
+
+async def _send_start_banner(bot, chat_id: int) -> None:
+    key = f"tg_file_id:{START_BANNER}:{assets.file_hash(START_BANNER)}"
+    file_id = storage.kv_get(key)
+    if file_id:
+        try:
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=START_CAPTION, parse_mode="Markdown")
+            return
+        except BadRequest as e:
+            print("[banner] cached file_id rejected, re-uploading:", e)
+    with open(os.path.join(assets.ASSETS_DIR, START_BANNER), "rb") as img:
+        msg = await bot.send_photo(chat_id=chat_id, photo=img, caption=START_CAPTION, parse_mode="Markdown")
+    if msg and msg.photo:
+        storage.kv_set(key, msg.photo[-1].file_id)
+
 # ===================== HANDLERS =====================
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -336,18 +289,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # --- KIRIM BANNER START ---
     try:
-        with open("app/webapp/img/start-banner.jpg", "rb") as img:
-            await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=img,
-                caption=(
-                    "👋 *Welcome to the VIP Zone!*\n\n"
-                    "💠 Tekan **Join VIP** di menu bawah untuk membuka Mini App.\n"
-                    "📂 Jelajahi katalog premium eksklusif.\n"
-                    "⚡ Jika tombol belum tampil, cukup ketik /refresh."
-                ),
-                parse_mode="Markdown"
-            )
+        await _send_start_banner(context.bot, chat_id)
     except Exception as e:
         print("Gagal mengirim banner /start:", e)
 
@@ -407,6 +349,27 @@ async def cmd_debug_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mb = await context.bot.get_chat_menu_button(chat_id=update.effective_chat.id)
     await update.message.reply_text(f"MenuButton saat ini: {type(mb).__name__}")
 
+# ===================== MEMBERSHIP INDEX (update chat_member) =====================
+
+def _tracked_chat_ids() -> set:
+    """Chat yang perlu diindex: wajib gate (ENV runtime) + grup katalog."""
+    cfg = gate.load_env()
+    return set(cfg["group_ids"]) | set(cfg["channel_ids"]) | set(GROUP_NAME_BY_ID)
+
+async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Catat join/leave/kick ke index SQLite supaya gate tidak perlu get_chat_member."""
+    cmu = update.chat_member
+    if not cmu or not cmu.new_chat_member:
+        return
+    chat_id = str(cmu.chat.id)
+    if chat_id not in _tracked_chat_ids():
+        return
+    member = cmu.new_chat_member
+    try:
+        gate.record_event(chat_id, member.user.id, member.status)
+    except Exception as e:
+        print("[membership] index update failed:", e)
+
 # ===================== INVITE LINK (sesuai versi stabil) =====================
 
 async def _to_int_or_str(v: Any):
@@ -415,46 +378,56 @@ async def _to_int_or_str(v: Any):
     except Exception:
         return str(v)
 
-async def _create_link_with_retry(bot, chat_id, **kwargs):
-    delays = [0, 0.7, 1.2]
-    last_err: Optional[Exception] = None
-    for d in delays:
-        if d:
-            await asyncio.sleep(d)
-        try:
-            return await bot.create_chat_invite_link(chat_id=chat_id, **kwargs)
-        except RetryAfter as e:
-            await asyncio.sleep(getattr(e, "retry_after", 1.5))
-            last_err = e
-        except (TimedOut, NetworkError) as e:
-            last_err = e
-        except (Forbidden, BadRequest) as e:
-            last_err = e
-            break
-        except Exception as e:
-            last_err = e
-    if last_err:
-        print("[invite] create_chat_invite_link failed:", last_err)
-    return None
+async def _create_link(bot, chat_id, **kwargs):
+    # RetryAfter sudah dijeda + di-retry oleh limiter (TG_MAX_RETRIES); kegagalan
+    # lain diteruskan ke caller (fallback export link / retry job outbox)
+    try:
+        return await bot.create_chat_invite_link(chat_id=chat_id, **kwargs)
+    except Exception as e:
+        print("[invite] create_chat_invite_link failed:", e)
+        return None
+
+async def notify_invite_failed(app: Application, user_id: int, target_group_id) -> None:
+    group_id_str = str(target_group_id)
+    group_name   = GROUP_NAME_BY_ID.get(group_id_str, group_id_str)
+    try:
+        await app.bot.send_message(
+            chat_id=user_id,
+            text=f"⚠️ Gagal membuat undangan untuk grup: {group_name}\n"
+                 f"Pastikan bot adalah admin/diizinkan membuat link di grup tsb."
+        )
+    except Exception as e:
+        print("[invite] notify user failed:", e)
 
-async def send_invite_link(app: Application, user_id: int, target_group_id):
-    """Kirim 1 undangan untuk 1 grup (dipanggil dari main.py)."""
+async def send_invite_link(app: Application, user_id: int, target_group_id, *,
+                           raise_on_failure: bool = False, invite_link: Optional[str] = None):
+    """
+    Kirim 1 undangan untuk 1 grup (dipanggil dari main.py / outbox).
+    invite_link → link dari pool (app/linkpool.py); None → buat on-demand.
+    raise_on_failure=True → gagal buat link / kirim DM dilempar sebagai exception
+    (caller yang retry + memberi tahu user), bukan langsung kirim pesan gagal.
+    Return link yang terkirim (None bila gagal).
+    """
     group_id_norm = await _to_int_or_str(target_group_id)
     group_id_str  = str(target_group_id)
     group_name    = GROUP_NAME_BY_ID.get(group_id_str, group_id_str)
 
-    # expire_ts = int(time.time()) + 15 * 60
-    link_obj = await _create_link_with_retry(
-        app.bot,
-        chat_id=group_id_norm,
-        member_limit=1,
-        # expire_date=expire_ts,
-        creates_join_request=False,
-        name="Paid join",
-    )
+    link_obj = None
+    if not invite_link:
+        # expire_ts = int(time.time()) + 15 * 60
+        link_obj = await _create_link(
+            app.bot,
+            chat_id=group_id_norm,
+            member_limit=1,
+            # expire_date=expire_ts,
+            creates_join_request=False,
+            name="Paid join",
+        )
 
-    invite_link_url: Optional[str] = None
-    if link_obj and getattr(link_obj, "invite_link", None):
+    invite_link_url: Optional[str] = invite_link
+    if invite_link_url:
+        pass
+    elif link_obj and getattr(link_obj, "invite_link", None):
         invite_link_url = link_obj.invite_link
     else:
         try:
@@ -463,15 +436,10 @@ async def send_invite_link(app: Application, user_id: int, target_group_id):
             print(f"[invite] export_chat_invite_link failed for {group_id_str}:", e)
 
     if not invite_link_url:
-        try:
-            await app.bot.send_message(
-                chat_id=user_id,
-                text=f"⚠️ Gagal membuat undangan untuk grup: {group_name}\n"
-                     f"Pastikan bot adalah admin/diizinkan membuat link di grup tsb."
-            )
-        except Exception as e:
-            print("[invite] notify user failed:", e)
-        return
+        if raise_on_failure:
+            raise RuntimeError(f"cannot create invite link for {group_id_str}")
+        await notify_invite_failed(app, user_id, target_group_id)
+        return None
 
     try:
         await app.bot.send_message(
@@ -490,6 +458,10 @@ async def send_invite_link(app: Application, user_id: int, target_group_id):
         )
     except Exception as e:
         print("[invite] send DM failed:", e)
+        if raise_on_failure:
+            raise
+        return None
+    return invite_link_url
 
 # ===================== REGISTER HANDLERS =====================
 
@@ -501,3 +473,4 @@ def register_handlers(app: Application):
     app.add_handler(CommandHandler("reset_keyboard", reset_keyboard))  # opsional
     app.add_handler(CallbackQueryHandler(on_recheck, pattern="^recheck_membership$"))
     app.add_handler(CallbackQueryHandler(lambda u, c: u.callback_query.answer(), pattern="^noop$"))
+    app.add_handler(ChatMemberHandler(on_chat_member, ChatMemberHandler.CHAT_MEMBER))
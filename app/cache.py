@@ -0,0 +1,112 @@
+# app/cache.py
+# ------------------------------------------------------------
+# LRU in-memory sederhana (single event loop, tanpa lock):
+# - batas jumlah item dan/atau total bytes
+# - TTL opsional per cache / per entry
+# - counter hit/miss/eviction untuk observability (semua instance: LRUCache.all())
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+_ALL: List["LRUCache"] = []
+
+
+class LRUCache:
+    def __init__(
+        self,
+        name: str,
+        max_items: int = 1024,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = lambda v: 1,
+    ):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, expires_at|None, size)
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        _ALL.append(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        ent = self._data.get(key)
+        if ent is None:
+            if count:
+                self.misses += 1
+            return default
+        value, exp, _ = ent
+        if exp is not None and exp <= time.monotonic():
+            self.pop(key)
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.pop(key)
+        ttl = self.ttl if ttl is None else ttl
+        exp = (time.monotonic() + ttl) if ttl else None
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # terlalu besar untuk di-cache
+        self._data[key] = (value, exp, size)
+        self.bytes += size
+        while self._data and (
+            len(self._data) > self.max_items
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, _, sz) = self._data.popitem(last=False)
+            self.bytes -= sz
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        ent = self._data.pop(key, None)
+        if ent is None:
+            return default
+        self.bytes -= ent[2]
+        return ent[0]
+
+    def pop_where(self, pred: Callable[[Hashable], bool]) -> int:
+        keys = [k for k in self._data if pred(k)]
+        for k in keys:
+            self.pop(k)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+    @staticmethod
+    def all() -> List["LRUCache"]:
+        return list(_ALL)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "items": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
@@ -0,0 +1,194 @@
+# app/chats.py
+# ------------------------------------------------------------
+# Metadata chat Telegram (title, username, type, member_count) — satu
+# sumber untuk main.py (gate API) dan bot.py (tombol Re-check):
+# - LRU terbatas di memori, warm start dari SQLite (tabel chat_meta)
+# - entry lewat TTL tetap dipakai, refresh jalan di background (1x per chat)
+# - id yang belum dikenal di-resolve paralel dalam satu batch
+# - nama katalog (GROUP_IDS_JSON) selalu menang untuk tampilan
+# - sebelum get_chat, cek row SQLite yang masih segar (ditulis worker lain)
+#
+# ENV:
+#   CHAT_META_TTL=21600        (opsional; detik sebelum di-refresh)
+#   CHAT_META_MAX=2000         (opsional; maks entry di memori)
+#   CHAT_META_CONCURRENCY=8    (opsional; maks get_chat bersamaan)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import storage
+from .cache import LRUCache
+
+CHAT_META_TTL = int(os.getenv("CHAT_META_TTL", "21600"))
+CHAT_META_MAX = int(os.getenv("CHAT_META_MAX", "2000"))
+CHAT_META_CONCURRENCY = int(os.getenv("CHAT_META_CONCURRENCY", "8"))
+CHAT_META_RETRY = 60  # detik sebelum chat yang gagal di-resolve dicoba lagi
+TITLE_MAX = 32
+
+_META = LRUCache("chat_meta", max_items=CHAT_META_MAX)
+_CATALOG_NAMES: Dict[str, str] = {}
+_REFRESHING: set = set()
+_BG_TASKS: set = set()  # refresh background; referensi ditahan supaya tidak di-GC
+_LOADED = False
+_SEM: Optional[asyncio.Semaphore] = None
+
+
+def set_catalog_names(names: Dict[str, str]) -> None:
+    """Nama dari katalog (ENV) — lookup dict, bukan scan list tiap kali."""
+    _CATALOG_NAMES.clear()
+    _CATALOG_NAMES.update({str(k): str(v).strip() for k, v in names.items() if str(v).strip()})
+
+
+def _ensure_loaded() -> None:
+    global _LOADED
+    if _LOADED:
+        return
+    _LOADED = True
+    try:
+        rows = storage.list_chat_meta(CHAT_META_MAX)
+    except Exception as e:
+        print("[chats] warm start failed:", e)
+        return
+    for r in reversed(rows):  # paling baru jadi paling "recent" di LRU
+        _META.set(str(r["chat_id"]), r)
+
+
+def _sem() -> asyncio.Semaphore:
+    global _SEM
+    if _SEM is None:
+        _SEM = asyncio.Semaphore(CHAT_META_CONCURRENCY)
+    return _SEM
+
+
+async def _fetch_one(bot, chat_id: str, with_count: bool) -> Optional[Dict[str, Any]]:
+    try:
+        async with _sem():
+            chat = await bot.get_chat(chat_id=chat_id)
+            count = None
+            if with_count:
+                try:
+                    count = await bot.get_chat_member_count(chat_id=chat_id)
+                except Exception:
+                    pass
+    except Exception as e:
+        print(f"[chats] get_chat {chat_id} failed:", e)
+        return None
+    return {
+        "chat_id": str(chat_id),
+        "title": getattr(chat, "title", None),
+        "username": getattr(chat, "username", None),
+        "type": str(getattr(chat, "type", "") or ""),
+        "member_count": count,
+        "updated_at": int(time.time()),
+    }
+
+
+def _shared_fresh(ids: List[str], with_count: bool) -> Dict[str, Dict[str, Any]]:
+    try:
+        rows = storage.get_chat_meta(ids)
+    except Exception as e:
+        print("[chats] shared read failed:", e)
+        return {}
+    now = time.time()
+    return {
+        cid: r for cid, r in rows.items()
+        if now - (r.get("updated_at") or 0) <= CHAT_META_TTL and (not with_count or r.get("member_count") is not None)
+    }
+
+
+async def _fetch_batch(bot, ids: List[str], with_count: bool = False) -> Dict[str, Dict[str, Any]]:
+    shared = _shared_fresh(ids, with_count)
+    for m in shared.values():
+        _META.set(m["chat_id"], m)
+    ids = [cid for cid in ids if cid not in shared]
+    if not ids:
+        return shared
+    results = await asyncio.gather(*(_fetch_one(bot, cid, with_count) for cid in ids))
+    fresh = [m for m in results if m]
+    failed_at = int(time.time()) - CHAT_META_TTL + CHAT_META_RETRY
+    for cid, m in zip(ids, results):
+        if m is None and _META.get(cid, count=False) is None:
+            # placeholder (tidak dipersist): fallback id, dicoba ulang di background
+            _META.set(cid, {"chat_id": cid, "title": None, "username": None, "type": "",
+                            "member_count": None, "updated_at": failed_at})
+    for m in fresh:
+        prev = _META.get(m["chat_id"], count=False)
+        if m["member_count"] is None and prev:
+            m["member_count"] = prev.get("member_count")
+        _META.set(m["chat_id"], m)
+    try:
+        storage.upsert_chat_meta(fresh)
+    except Exception as e:
+        print("[chats] persist failed:", e)
+    return {**shared, **{m["chat_id"]: m for m in fresh}}
+
+
+async def _refresh_bg(bot, ids: List[str]) -> None:
+    try:
+        await _fetch_batch(bot, ids)
+    finally:
+        _REFRESHING.difference_update(ids)
+
+
+async def resolve_many(bot, chat_ids: Iterable[Any], with_count: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Return {chat_id: meta} untuk semua id yang bisa di-resolve.
+    Miss → 1 batch paralel; entry lewat TTL → dipakai dulu, refresh di background.
+    """
+    _ensure_loaded()
+    out: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    stale: List[str] = []
+    now = time.time()
+    for cid in dict.fromkeys(str(c) for c in chat_ids):
+        meta = _META.get(cid)
+        if meta is None or (with_count and meta.get("member_count") is None):
+            missing.append(cid)
+            continue
+        out[cid] = meta
+        if now - (meta.get("updated_at") or 0) > CHAT_META_TTL and cid not in _REFRESHING:
+            stale.append(cid)
+
+    if missing:
+        out.update(await _fetch_batch(bot, missing, with_count))
+    if stale:
+        _REFRESHING.update(stale)
+        task = asyncio.create_task(_refresh_bg(bot, stale))
+        _BG_TASKS.add(task)
+        task.add_done_callback(_BG_TASKS.discard)
+    return out
+
+
+def display_title(chat_id: Any, meta: Optional[Dict[str, Any]] = None) -> str:
+    key = str(chat_id)
+    meta = meta if meta is not None else _META.get(key, count=False)
+    nm = _CATALOG_NAMES.get(key)
+    if not nm and meta:
+        nm = meta.get("title") or meta.get("username")
+    nm = nm or key
+    if len(nm) > TITLE_MAX:
+        nm = nm[:TITLE_MAX - 3] + "..."
+    return nm
+
+
+async def titles(bot, chat_ids: List[Any]) -> List[str]:
+    """Judul tampilan sejajar chat_ids (nama katalog → title → @username → id)."""
+    need = [c for c in chat_ids if str(c) not in _CATALOG_NAMES]
+    metas = await resolve_many(bot, need) if need else {}
+    return [display_title(c, metas.get(str(c))) for c in chat_ids]
+
+
+async def prewarm(bot, chat_ids: Iterable[Any]) -> int:
+    """Dipanggil saat startup: resolve semua chat katalog + gate (dengan member_count)."""
+    metas = await resolve_many(bot, chat_ids, with_count=True)
+    print(f"[chats] prewarmed {len(metas)} chats")
+    return len(metas)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _META.stats()
@@ -0,0 +1,189 @@
+# app/cluster.py
+# ------------------------------------------------------------
+# Mode multi-proses (uvicorn --workers N) di satu mesin, state bersama via SQLite:
+# - leader election pakai lease (tabel leases): hanya leader yang menjalankan
+#   bootstrap bot (set_webhook, menu global, prewarm) + job background
+#   yang boros call Telegram (outbox undangan, pool link)
+# - lock antar proses (try_lock/unlock) untuk single-flight, mis. generate QR
+#   per invoice atau refresh listing ImageKit
+# - event bridge: perubahan status/QR yang ditulis proses lain diteruskan ke
+#   subscriber SSE lokal (1 query per detik per proses, hanya invoice yang ditonton)
+#
+# Proses tunggal = otomatis jadi leader; perilaku sama seperti sebelumnya.
+# Lease leader habis (proses mati) → proses lain mengambil alih dalam ≤ CLUSTER_LEADER_TTL.
+#
+# PENTING: `uvicorn --workers N` TIDAK men-set WEB_CONCURRENCY → set CLUSTER_MODE=1
+# sendiri. Tanpa itu bridge mati; penunggu QR tetap benar karena jatuh ke polling
+# DB bila lock QR dipegang proses lain (held_elsewhere), tapi SSE status tidak.
+#
+# Tetap per proses (tidak dibagi lewat SQLite): cache membership gate
+# (gate._MEMBER_CACHE), bucket admission (admission._BUCKETS → batas efektif
+# ×N worker), dedupe event timeline "once" (timeline._MARKED), cache gambar QR.
+#
+# ENV:
+#   CLUSTER_MODE=1             (opsional; otomatis aktif bila WEB_CONCURRENCY > 1)
+#   CLUSTER_LEADER_TTL=30      (opsional; detik lease leader)
+#   CLUSTER_EVENT_POLL_S=1     (opsional; interval event bridge)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from . import events, storage
+
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "") == "1" or int(os.getenv("WEB_CONCURRENCY", "1") or 1) > 1
+CLUSTER_LEADER_TTL = float(os.getenv("CLUSTER_LEADER_TTL", "30"))
+CLUSTER_EVENT_POLL_S = float(os.getenv("CLUSTER_EVENT_POLL_S", "1"))
+LEADER_LEASE = "leader"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+Hook = Callable[[], Awaitable[Any]]
+
+_LEADER = False
+_HOOKS: Dict[str, Optional[Hook]] = {"elected": None, "demoted": None}
+_TASKS: list = []
+
+
+def is_leader() -> bool:
+    return _LEADER
+
+
+async def _tick() -> None:
+    global _LEADER
+    try:
+        ok = storage.lease_acquire(LEADER_LEASE, WORKER_ID, CLUSTER_LEADER_TTL)
+    except Exception as e:
+        print("[cluster] lease error:", e)
+        ok = False  # tidak bisa memastikan lease → anggap bukan leader
+    if ok and not _LEADER:
+        _LEADER = True
+        print(f"[cluster] {WORKER_ID} is leader")
+        if _HOOKS["elected"]:
+            await _HOOKS["elected"]()
+    elif not ok and _LEADER:
+        _LEADER = False
+        print(f"[cluster] {WORKER_ID} lost leadership")
+        if _HOOKS["demoted"]:
+            await _HOOKS["demoted"]()
+
+
+async def _leader_loop() -> None:
+    while True:
+        await asyncio.sleep(CLUSTER_LEADER_TTL / 3)
+        try:
+            await _tick()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("[cluster] leader hook failed:", e)
+
+
+async def start(on_elected: Hook, on_demoted: Hook) -> None:
+    """Percobaan pertama langsung (proses tunggal bootstrap saat startup), lalu renew di background."""
+    _HOOKS["elected"], _HOOKS["demoted"] = on_elected, on_demoted
+    try:
+        await _tick()
+    except Exception as e:
+        print("[cluster] leader hook failed:", e)
+    _TASKS.append(asyncio.create_task(_leader_loop()))
+
+
+async def stop() -> None:
+    global _LEADER
+    for t in _TASKS:
+        t.cancel()
+    await asyncio.gather(*_TASKS, return_exceptions=True)
+    _TASKS.clear()
+    if _LEADER:
+        _LEADER = False
+        if _HOOKS["demoted"]:
+            await _HOOKS["demoted"]()
+        try:
+            storage.lease_release(LEADER_LEASE, WORKER_ID)  # restart tidak perlu menunggu TTL
+        except Exception as e:
+            print("[cluster] release failed:", e)
+
+
+# ---------- lock antar proses ----------
+def try_lock(name: str, ttl: float) -> Optional[str]:
+    """Return token bila lock didapat (juga unik antar coroutine dalam 1 proses)."""
+    token = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+    try:
+        return token if storage.lease_acquire("lock:" + name, token, ttl) else None
+    except Exception as e:
+        print(f"[cluster] lock {name} error:", e)
+        return token  # DB bermasalah → jangan blok pekerjaan
+
+
+def held_elsewhere(name: str) -> bool:
+    """True bila lock `name` sedang dipegang proses lain (event-nya tidak sampai ke sini)."""
+    try:
+        owner = storage.lease_owner("lock:" + name)
+    except Exception:
+        return False
+    return bool(owner) and not owner.startswith(WORKER_ID + ":")
+
+
+def unlock(name: str, token: Optional[str]) -> None:
+    if not token:
+        return
+    try:
+        storage.lease_release("lock:" + name, token)
+    except Exception as e:
+        print(f"[cluster] unlock {name} error:", e)
+
+
+# ---------- event bridge (status/QR dari proses lain → SSE lokal) ----------
+async def _bridge_loop(status_fn: Callable[[str], Optional[Dict[str, Any]]]) -> None:
+    seen: Dict[str, tuple] = {}
+    while True:
+        await asyncio.sleep(CLUSTER_EVENT_POLL_S)
+        ids = events.subscribed_ids()
+        for stale in set(seen) - set(ids):
+            seen.pop(stale, None)
+        for invoice_id in ids:
+            try:
+                st = status_fn(invoice_id)
+            except Exception as e:
+                print("[cluster] bridge read failed:", e)
+                break
+            if not st:
+                continue
+            key = (st.get("status"), bool(st.get("has_qr")))
+            prev = seen.get(invoice_id)
+            seen[invoice_id] = key
+            if prev == key:
+                continue
+            # pertama kali dilihat: terbitkan hanya kondisi "maju" (duplikat aman di client)
+            if (prev is None or prev[1] != key[1]) and key[1]:
+                events.publish(invoice_id, "qr", {"invoice_id": invoice_id, "has_qr": True})
+            if (prev is None and key[0] != "PENDING") or (prev is not None and prev[0] != key[0]):
+                events.publish(invoice_id, "status", st)
+
+
+def start_event_bridge(status_fn: Callable[[str], Optional[Dict[str, Any]]]) -> None:
+    if CLUSTER_MODE:
+        _TASKS.append(asyncio.create_task(_bridge_loop(status_fn), name="cluster-bridge"))
+        print("[cluster] event bridge on")
+
+
+def needs_polling() -> bool:
+    """True bila event dari proses lain TIDAK sampai ke subscriber lokal
+    (cluster mode tanpa bridge berjalan) → penunggu harus cek DB sendiri."""
+    if not CLUSTER_MODE:
+        return False
+    return not any(t.get_name() == "cluster-bridge" and not t.done() for t in _TASKS)
+
+
+def stats() -> Dict[str, Any]:
+    try:
+        owner = storage.lease_owner(LEADER_LEASE)
+    except Exception:
+        owner = None
+    return {"worker": WORKER_ID, "cluster_mode": CLUSTER_MODE, "is_leader": _LEADER, "leader": owner}
@@ -0,0 +1,114 @@
+# app/events.py
+# ------------------------------------------------------------
+# Pub/sub in-process per invoice_id (dipakai endpoint SSE):
+# - publish(invoice_id, event, data) dipanggil saat status / QR berubah
+# - subscribe(invoice_id) → asyncio.Queue milik 1 koneksi
+# - riwayat pendek per invoice supaya reconnect (Last-Event-ID) bisa replay
+# - next_event(q, "qr", timeout) → waiter dibangunkan saat event tiba
+#
+# Catatan: hanya dalam 1 proses. Client tetap punya fallback polling.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+HISTORY_PER_INVOICE = 16
+MAX_TRACKED_INVOICES = 2000
+QUEUE_SIZE = 32
+
+_SUBS: Dict[str, Set[asyncio.Queue]] = {}
+# { invoice_id: {"seq": int, "events": deque[{"id","event","data"}]} } — LRU terbatas
+_HISTORY: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _history(invoice_id: str) -> Dict[str, Any]:
+    ent = _HISTORY.get(invoice_id)
+    if ent is None:
+        ent = {"seq": 0, "events": deque(maxlen=HISTORY_PER_INVOICE)}
+        _HISTORY[invoice_id] = ent
+        while len(_HISTORY) > MAX_TRACKED_INVOICES:
+            _HISTORY.popitem(last=False)
+    else:
+        _HISTORY.move_to_end(invoice_id)
+    return ent
+
+
+def publish(invoice_id: str, event: str, data: Dict[str, Any]) -> int:
+    """Catat event + kirim ke semua subscriber invoice tsb. Return id event."""
+    ent = _history(invoice_id)
+    ent["seq"] += 1
+    ev = {"id": ent["seq"], "event": event, "data": data}
+    ent["events"].append(ev)
+    for q in list(_SUBS.get(invoice_id, ())):
+        try:
+            q.put_nowait(ev)
+        except asyncio.QueueFull:
+            pass  # subscriber lambat; dia akan dapat snapshot saat reconnect
+    return ev["id"]
+
+
+def subscribe(invoice_id: str) -> asyncio.Queue:
+    q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _SUBS.setdefault(invoice_id, set()).add(q)
+    return q
+
+
+def unsubscribe(invoice_id: str, q: asyncio.Queue) -> None:
+    subs = _SUBS.get(invoice_id)
+    if not subs:
+        return
+    subs.discard(q)
+    if not subs:
+        _SUBS.pop(invoice_id, None)
+
+
+async def next_event(q: asyncio.Queue, event: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Tunggu event bernama `event` di queue subscriber, maksimal `timeout` detik."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        try:
+            ev = await asyncio.wait_for(q.get(), remaining)
+        except asyncio.TimeoutError:
+            return None
+        if ev["event"] == event:
+            return ev
+
+
+def current_id(invoice_id: str) -> int:
+    ent = _HISTORY.get(invoice_id)
+    return ent["seq"] if ent else 0
+
+
+def replay(invoice_id: str, last_id: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Event setelah last_id bila masih ada di riwayat.
+    None → riwayat tidak cukup (mis. proses restart); caller kirim snapshot.
+    """
+    try:
+        last = int(last_id) if last_id not in (None, "") else None
+    except ValueError:
+        return None
+    ent = _HISTORY.get(invoice_id)
+    if last is None or not ent or last > ent["seq"]:
+        return None
+    events: Deque[Dict[str, Any]] = ent["events"]
+    if events and events[0]["id"] > last + 1:
+        return None  # ada event yang sudah terbuang dari riwayat
+    return [ev for ev in events if ev["id"] > last]
+
+
+def subscribed_ids() -> List[str]:
+    return list(_SUBS.keys())
+
+
+def subscriber_count(invoice_id: Optional[str] = None) -> int:
+    if invoice_id is not None:
+        return len(_SUBS.get(invoice_id, ()))
+    return sum(len(s) for s in _SUBS.values())
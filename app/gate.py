@@ -0,0 +1,201 @@
+# app/gate.py
+# ------------------------------------------------------------
+# Membership gate (satu implementasi untuk main.py /api/gate/status
+# dan bot.py tombol Re-check):
+# - baca ENV gate saat runtime
+# - get_chat_member paralel dengan batas konkurensi
+# - cache TTL hasil per (uid, chat): positif lebih lama, negatif lebih singkat
+# - index membership di SQLite (dari update chat_member) dijawab lebih dulu;
+#   get_chat_member hanya untuk cold miss
+#
+# ENV:
+#   GATE_CONCURRENCY=8         (opsional; maks get_chat_member bersamaan)
+#   GATE_CACHE_TTL_POS=60      (opsional; detik, hasil "member")
+#   GATE_CACHE_TTL_NEG=10      (opsional; detik, hasil "bukan member"/tidak bisa cek)
+#   GATE_INDEX_API_TRUST=300   (opsional; detik, umur row index POSITIF hasil API yang dipercaya;
+#                               row negatif hasil API hanya selama GATE_CACHE_TTL_NEG)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden
+
+from . import storage
+from .cache import LRUCache
+
+ALLOWED_STATUSES = {"member", "administrator", "creator"}
+
+GATE_CONCURRENCY = int(os.getenv("GATE_CONCURRENCY", "8"))
+GATE_CACHE_TTL_POS = float(os.getenv("GATE_CACHE_TTL_POS", "60"))
+GATE_CACHE_TTL_NEG = float(os.getenv("GATE_CACHE_TTL_NEG", "10"))
+GATE_INDEX_API_TRUST = int(os.getenv("GATE_INDEX_API_TRUST", "300"))
+
+_USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{5,32}$")  # username publik valid (tanpa @)
+
+# (user_id, chat_id) -> 1 joined, 0 not joined, -1 cannot check
+_MEMBER_CACHE = LRUCache("gate_members", max_items=50_000)
+_SEM: Optional[asyncio.Semaphore] = None
+
+
+# ===================== ENV =====================
+
+def split_env(name: str) -> List[str]:
+    v = os.getenv(name, "") or ""
+    return [x.strip() for x in v.split(",") if x.strip()]
+
+
+def _valid_usernames(items: List[str]) -> List[str]:
+    return [x for x in items if _USERNAME_RE.fullmatch(x)]
+
+
+def load_env() -> Dict[str, Any]:
+    """Baca semua variabel gate SETIAP KALI dipanggil (runtime reload)."""
+    try:
+        min_count = int(os.getenv("REQUIRED_MIN_COUNT", "1"))
+    except ValueError:
+        min_count = 1
+    return {
+        "group_ids": split_env("REQUIRED_GROUP_IDS"),
+        "channel_ids": split_env("REQUIRED_CHANNEL_IDS"),
+        "group_links": split_env("REQUIRED_GROUP_INVITES"),
+        "chan_links": split_env("REQUIRED_CHANNEL_INVITES"),
+        "group_users": _valid_usernames(split_env("REQUIRED_GROUP_USERNAMES")),
+        "chan_users": _valid_usernames(split_env("REQUIRED_CHANNEL_USERNAMES")),
+        "mode": (os.getenv("REQUIRED_MODE", "ALL") or "ALL").upper(),
+        "min_count": min_count,
+    }
+
+
+# ===================== MEMBERSHIP =====================
+
+def _sem() -> asyncio.Semaphore:
+    global _SEM
+    if _SEM is None:
+        _SEM = asyncio.Semaphore(GATE_CONCURRENCY)
+    return _SEM
+
+
+def _from_index(row: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    Row dari update chat_member selalu dipercaya (join/leave/kick tercatat).
+    Row hasil API dipercaya singkat: positif GATE_INDEX_API_TRUST (tanpa akses
+    admin bot tidak menerima event keluar), negatif GATE_CACHE_TTL_NEG (user
+    yang baru join tidak perlu menunggu lama saat Re-check).
+    """
+    if not row:
+        return None
+    res = 1 if row.get("status") in ALLOWED_STATUSES else 0
+    if row.get("source") != "event":
+        trust = GATE_INDEX_API_TRUST if res == 1 else GATE_CACHE_TTL_NEG
+        if (time.time() - (row.get("updated_at") or 0)) > trust:
+            return None
+    return res
+
+
+def _index_lookup(user_id: int, chat_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    try:
+        return storage.get_memberships(user_id, chat_ids)
+    except Exception as e:
+        print("[gate] membership index read failed:", e)
+        return {}
+
+
+def _remember(user_id: int, chat_id: str, res: int) -> None:
+    _MEMBER_CACHE.set((int(user_id), str(chat_id)), res, ttl=GATE_CACHE_TTL_POS if res == 1 else GATE_CACHE_TTL_NEG)
+
+
+async def _fetch(bot, user_id: int, chat_id: str) -> int:
+    """Cold miss: tanya Telegram, simpan hasil (positif & negatif) ke index."""
+    try:
+        async with _sem():
+            cm = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        status = getattr(cm, "status", "")
+        res = 1 if status in ALLOWED_STATUSES else 0
+    except (Forbidden, BadRequest):
+        return -1
+    except Exception:
+        return -1
+    # negatif juga ditulis → row positif lama (user sudah keluar) ikut terkoreksi
+    try:
+        storage.upsert_membership(chat_id, user_id, status or "left", "api")
+    except Exception as e:
+        print("[gate] membership index write failed:", e)
+    return res
+
+
+async def check_many(bot, user_id: int, chat_ids: List[str]) -> List[int]:
+    """
+    Cek banyak chat sekaligus. Urutan hasil sejajar chat_ids.
+    Urutan sumber: cache memori → index SQLite (1 query) → get_chat_member paralel.
+    """
+    if not chat_ids:
+        return []
+    out: Dict[str, int] = {}
+    missing: List[str] = []
+    for cid in chat_ids:
+        key = str(cid)
+        if not cid:
+            out[key] = 1
+            continue
+        cached = _MEMBER_CACHE.get((int(user_id), key))
+        if cached is not None:
+            out[key] = cached
+        elif key not in missing:
+            missing.append(key)
+
+    if missing:
+        rows = _index_lookup(user_id, missing)
+        cold: List[str] = []
+        for key in missing:
+            res = _from_index(rows.get(key))
+            if res is None:
+                cold.append(key)
+            else:
+                out[key] = res
+                _remember(user_id, key, res)
+        fetched = await asyncio.gather(*(_fetch(bot, user_id, key) for key in cold))
+        for key, res in zip(cold, fetched):
+            out[key] = res
+            _remember(user_id, key, res)
+
+    return [out[str(cid)] for cid in chat_ids]
+
+
+async def is_member(bot, user_id: int, chat_id: str) -> int:
+    """return 1 joined, 0 not joined, -1 cannot check (no access)"""
+    return (await check_many(bot, user_id, [chat_id]))[0]
+
+
+def record_event(chat_id: str, user_id: int, status: str) -> None:
+    """Dipanggil handler chat_member: catat ke index + buang cache memori."""
+    storage.upsert_membership(chat_id, user_id, status, "event")
+    invalidate(user_id, chat_id)
+
+
+async def count(bot, user_id: int, cfg: Dict[str, Any]) -> Tuple[int, bool, List[int], List[int]]:
+    """
+    Return: ok_count, any_cannot_check, mem_groups, mem_channels
+    mem_* berisi 1 (member) / 0 (bukan) / -1 (tidak bisa diperiksa).
+    """
+    n_groups = len(cfg["group_ids"])
+    res = await check_many(bot, user_id, cfg["group_ids"] + cfg["channel_ids"])
+    ok_count = sum(1 for r in res if r == 1)
+    any_cannot = any(r == -1 for r in res)
+    return ok_count, any_cannot, res[:n_groups], res[n_groups:]
+
+
+def invalidate(user_id: int, chat_id: Optional[str] = None) -> None:
+    if chat_id is not None:
+        _MEMBER_CACHE.pop((int(user_id), str(chat_id)))
+    else:
+        _MEMBER_CACHE.pop_where(lambda k: k[0] == int(user_id))
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _MEMBER_CACHE.stats()
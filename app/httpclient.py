@@ -0,0 +1,168 @@
+# app/httpclient.py
+# ------------------------------------------------------------
+# Registry httpx.AsyncClient bersama untuk semua call keluar (ImageKit,
+# scrape folder, debug Saweria) — menggantikan AsyncClient baru per call:
+# - 1 client per host → batas pool per host, keep-alive (tanpa handshake TCP+TLS ulang)
+# - HTTP/2 opsional (aktif bila paket `h2` terpasang dan HTTP2=1)
+# - timeout + kebijakan retry per host (configure_host)
+# - statistik reuse koneksi per host via trace extension httpcore
+#
+# Dibuka lazy saat dipakai pertama kali; close_all() dipanggil di on_stop.
+#
+# ENV:
+#   HTTP_POOL_MAX=20           (opsional; maks koneksi per host)
+#   HTTP_KEEPALIVE_MAX=10      (opsional; maks koneksi idle per host)
+#   HTTP_KEEPALIVE_EXPIRY=30   (opsional; detik koneksi idle dipertahankan)
+#   HTTP_TIMEOUT=10            (opsional; detik, default per request)
+#   HTTP_RETRIES=1             (opsional; retry default untuk GET/HEAD)
+#   HTTP2=1                    (opsional; 0 untuk mematikan HTTP/2)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:  # HTTP/2 butuh paket h2 (httpx[http2])
+    import h2  # type: ignore  # noqa: F401
+    _H2_AVAILABLE = True
+except Exception:  # pragma: no cover - dependency opsional
+    _H2_AVAILABLE = False
+
+HTTP_POOL_MAX = int(os.getenv("HTTP_POOL_MAX", "20"))
+HTTP_KEEPALIVE_MAX = int(os.getenv("HTTP_KEEPALIVE_MAX", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "1"))
+HTTP2 = os.getenv("HTTP2", "1") == "1" and _H2_AVAILABLE
+
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_BACKOFF_S = 0.2
+
+# host → profil {timeout, retries, max_connections, http2}
+_PROFILES: Dict[str, Dict[str, Any]] = {}
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def configure_host(host: str, *, timeout: Optional[float] = None, retries: Optional[int] = None,
+                   max_connections: Optional[int] = None, http2: Optional[bool] = None) -> None:
+    """Override profil untuk 1 host (dipanggil saat modul caller di-load)."""
+    prof = _PROFILES.setdefault(host.lower(), {})
+    if timeout is not None:
+        prof["timeout"] = timeout
+    if retries is not None:
+        prof["retries"] = retries
+    if max_connections is not None:
+        prof["max_connections"] = max_connections
+    if http2 is not None:
+        prof["http2"] = http2 and _H2_AVAILABLE
+
+
+def _profile(host: str) -> Dict[str, Any]:
+    prof = _PROFILES.get(host, {})
+    return {
+        "timeout": prof.get("timeout", HTTP_TIMEOUT),
+        "retries": prof.get("retries", HTTP_RETRIES),
+        "max_connections": prof.get("max_connections", HTTP_POOL_MAX),
+        "http2": prof.get("http2", HTTP2),
+    }
+
+
+def _stats(host: str) -> Dict[str, int]:
+    st = _STATS.get(host)
+    if st is None:
+        st = _STATS[host] = {"requests": 0, "connections": 0, "retries": 0, "errors": 0}
+    return st
+
+
+def client_for(host: str) -> httpx.AsyncClient:
+    """AsyncClient milik host (dibuat sekali, dipakai ulang sampai close_all)."""
+    host = host.lower()
+    client = _CLIENTS.get(host)
+    if client is None or client.is_closed:
+        prof = _profile(host)
+        client = httpx.AsyncClient(
+            timeout=prof["timeout"],
+            http2=prof["http2"],
+            limits=httpx.Limits(
+                max_connections=prof["max_connections"],
+                max_keepalive_connections=min(HTTP_KEEPALIVE_MAX, prof["max_connections"]),
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _CLIENTS[host] = client
+    return client
+
+
+def _tracer(st: Dict[str, int]):
+    async def trace(event_name: str, info: Dict[str, Any]) -> None:
+        # hanya dipanggil saat httpcore benar-benar membuka koneksi baru
+        if event_name == "connection.connect_tcp.complete":
+            st["connections"] += 1
+    return trace
+
+
+async def request(method: str, url: str, *, stream: bool = False, **kwargs: Any) -> httpx.Response:
+    """
+    Request lewat client bersama host tsb. GET/HEAD di-retry (error transport
+    atau 429/502/503/504) dengan backoff eksponensial singkat.
+    stream=True → body belum dibaca (aiter_bytes); pemanggil wajib aclose().
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    client = client_for(host)
+    st = _stats(host)
+    retries = _profile(host)["retries"] if method.upper() in RETRY_METHODS else 0
+    ext = dict(kwargs.pop("extensions", None) or {})
+    ext["trace"] = _tracer(st)
+
+    attempt = 0
+    while True:
+        st["requests"] += 1
+        try:
+            resp = await client.send(client.build_request(method, url, extensions=ext, **kwargs), stream=stream)
+        except (httpx.TransportError, httpx.TimeoutException):
+            st["errors"] += 1
+            if attempt >= retries:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+            await resp.aclose()
+        attempt += 1
+        st["retries"] += 1
+        await asyncio.sleep(RETRY_BACKOFF_S * (2 ** (attempt - 1)))
+
+
+async def get(url: str, **kwargs: Any) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def close_all() -> None:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception as e:
+            print("[http] close error:", e)
+
+
+def stats() -> Dict[str, Any]:
+    """Per host: requests, koneksi baru, reuse (request yang tidak membuka koneksi)."""
+    out: Dict[str, Any] = {}
+    for host, st in _STATS.items():
+        reused = max(0, st["requests"] - st["connections"] - st["errors"])
+        out[host] = {
+            **st,
+            "reused": reused,
+            "reuse_ratio": round(reused / st["requests"], 3) if st["requests"] else 0.0,
+            "open": host in _CLIENTS and not _CLIENTS[host].is_closed,
+            **{k: v for k, v in _profile(host).items() if k != "max_connections"},
+        }
+    return {"http2_available": _H2_AVAILABLE, "hosts": out}
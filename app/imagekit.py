@@ -0,0 +1,255 @@
+# app/imagekit.py
+# ------------------------------------------------------------
+# Listing folder ImageKit (sumber gambar acak katalog /api/config):
+# - stale-while-revalidate: entry lewat TTL tetap dipakai, refresh di background
+# - single-flight: maksimal 1 fetch berjalan per folder (request lain ikut menunggu
+#   hasil yang sama, atau langsung dapat data lama)
+# - pagination skip/limit → isi folder lengkap (bukan hanya 100 file pertama)
+# - LRU terbatas (jumlah folder + total URL), persist di SQLite (tabel kv)
+#   supaya restart tetap hangat
+# - multi-worker: listing di SQLite dipakai bersama; refresh background hanya oleh
+#   1 proses (lock app/cluster.py), proses lain mengadopsi hasilnya dari DB
+#
+# Request hanya menunggu ImageKit bila folder BELUM PERNAH berhasil di-fetch.
+#
+# ENV:
+#   IMAGEKIT_PRIVATE_KEY=...            (wajib untuk listing)
+#   IMAGEKIT_BASE_URL=https://ik.imagekit.io/xxx   (opsional; untuk normalisasi URL folder)
+#   IMAGEKIT_API_URL=https://api.imagekit.io/v1/files   (opsional; override stand-in lokal)
+#   IMAGEKIT_CACHE_TTL=900              (opsional; detik sebelum di-refresh di background)
+#   IMAGEKIT_IMG_WIDTH=600              (opsional; transform ?tr=w-...)
+#   IMAGEKIT_PER_REQUEST_TIMEOUT=6      (opsional; detik per halaman)
+#   IMAGEKIT_PAGE_SIZE=1000             (opsional; maks 1000 per halaman API)
+#   IMAGEKIT_MAX_FILES=5000             (opsional; batas file per folder)
+#   IMAGEKIT_FOLDER_CACHE_MAX=256       (opsional; maks folder di memori)
+#   IMAGEKIT_CACHE_MAX_URLS=50000       (opsional; maks total URL di memori)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import cluster, httpclient, storage
+from .cache import LRUCache
+
+IMAGEKIT_PRIVATE_KEY = os.getenv("IMAGEKIT_PRIVATE_KEY", "").strip()
+IMAGEKIT_BASE_URL = (os.getenv("IMAGEKIT_BASE_URL", "").rstrip("/"))
+IMAGEKIT_API_URL = os.getenv("IMAGEKIT_API_URL", "https://api.imagekit.io/v1/files")
+IMAGEKIT_CACHE_TTL = int(os.getenv("IMAGEKIT_CACHE_TTL", "900"))
+IMAGEKIT_IMG_WIDTH = int(os.getenv("IMAGEKIT_IMG_WIDTH", "600"))
+IMAGEKIT_PER_REQUEST_TIMEOUT = float(os.getenv("IMAGEKIT_PER_REQUEST_TIMEOUT", "6"))
+IMAGEKIT_PAGE_SIZE = min(1000, int(os.getenv("IMAGEKIT_PAGE_SIZE", "1000")))
+IMAGEKIT_MAX_FILES = int(os.getenv("IMAGEKIT_MAX_FILES", "5000"))
+IMAGEKIT_FOLDER_CACHE_MAX = int(os.getenv("IMAGEKIT_FOLDER_CACHE_MAX", "256"))
+IMAGEKIT_CACHE_MAX_URLS = int(os.getenv("IMAGEKIT_CACHE_MAX_URLS", "50000"))
+IMAGEKIT_RETRY_S = 60  # folder yang gagal di-fetch dicoba lagi setelah ini
+KV_PREFIX = "imagekit:"
+
+httpclient.configure_host(urlsplit(IMAGEKIT_API_URL).hostname or "", timeout=IMAGEKIT_PER_REQUEST_TIMEOUT, retries=2)
+
+# path → {"items": [url...], "versions": {url: versi}, "fetched_at": ts}
+_LISTINGS = LRUCache(
+    "imagekit_listings", max_items=IMAGEKIT_FOLDER_CACHE_MAX,
+    max_bytes=IMAGEKIT_CACHE_MAX_URLS, sizeof=lambda v: max(1, len(v["items"])),
+)
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+_VERSION = 0  # naik setiap isi listing berubah (template /api/config dibangun ulang)
+_LOADED = False
+
+
+def norm_folder_to_path(folder: str) -> str:
+    """Terima path '/M' atau URL penuh '.../M/' → balikan path '/M'."""
+    if not folder:
+        return ""
+    s = folder.strip()
+    if s.startswith("http://") or s.startswith("https://"):
+        if IMAGEKIT_BASE_URL and s.startswith(IMAGEKIT_BASE_URL):
+            s = s[len(IMAGEKIT_BASE_URL):]
+        # buang query/fragment
+        s = s.split("?", 1)[0].split("#", 1)[0]
+    if not s.startswith("/"):
+        s = "/" + s
+    # pastikan tanpa trailing slash agar konsisten di API path query
+    # (ImageKit menerima '/M' atau '/M/', tapi kita konsistenkan)
+    if len(s) > 1 and s.endswith("/"):
+        s = s[:-1]
+    return s
+
+
+def with_transform(url: str) -> str:
+    # tambahkan transform ringan agar cepat (ignorant query aman di ImageKit)
+    # contoh: https://.../file.jpg?tr=w-600,fo-auto
+    return f"{url}?tr=w-{IMAGEKIT_IMG_WIDTH},fo-auto"
+
+
+def version() -> int:
+    return _VERSION
+
+
+def _ensure_loaded() -> None:
+    global _LOADED, _VERSION
+    if _LOADED:
+        return
+    _LOADED = True
+    try:
+        rows = storage.kv_list(KV_PREFIX, IMAGEKIT_FOLDER_CACHE_MAX)
+    except Exception as e:
+        print("[ImageKit] warm start failed:", e)
+        return
+    for key, ent in reversed(list(rows.items())):
+        if ent and ent.get("items"):
+            _LISTINGS.set(key[len(KV_PREFIX):], ent)
+    if rows:
+        _VERSION += 1
+        print(f"[ImageKit] warm start: {len(rows)} folders from DB")
+
+
+def _is_stale(ent: Dict[str, Any]) -> bool:
+    return time.time() - (ent.get("fetched_at") or 0) > IMAGEKIT_CACHE_TTL
+
+
+def _file_version(f: Dict[str, Any]) -> Optional[str]:
+    """Versi isi file (versionInfo / updatedAt) → pendek, aman di URL; berubah saat file diganti."""
+    raw = (f.get("versionInfo") or {}).get("id") or f.get("updatedAt")
+    return hashlib.sha1(str(raw).encode()).hexdigest()[:12] if raw else None
+
+
+async def _fetch_all(path: str) -> Tuple[List[str], Dict[str, str]]:
+    """Semua URL gambar di folder (ikuti pagination skip/limit) + versi per URL."""
+    auth = "Basic " + base64.b64encode(f"{IMAGEKIT_PRIVATE_KEY}:".encode()).decode()
+    items: List[str] = []
+    versions: Dict[str, str] = {}
+    skip = 0
+    while skip < IMAGEKIT_MAX_FILES:
+        limit = min(IMAGEKIT_PAGE_SIZE, IMAGEKIT_MAX_FILES - skip)
+        r = await httpclient.get(
+            IMAGEKIT_API_URL,
+            params={"path": path, "fileType": "image", "skip": skip, "limit": limit},
+            headers={"Authorization": auth},
+        )
+        r.raise_for_status()
+        page = r.json()
+        for f in page:
+            if f.get("fileType") == "image" and f.get("url"):
+                items.append(f["url"])
+                v = _file_version(f)
+                if v:
+                    versions[f["url"]] = v
+        if len(page) < limit:
+            break
+        skip += limit
+    return items, versions
+
+
+def _adopt(path: str, ent: Dict[str, Any], prev: Optional[Dict[str, Any]]) -> List[str]:
+    global _VERSION
+    if not prev or prev.get("items") != ent["items"] or prev.get("versions") != ent.get("versions"):
+        _VERSION += 1
+    _LISTINGS.set(path, ent)
+    return ent["items"]
+
+
+def _shared(path: str) -> Optional[Dict[str, Any]]:
+    """Listing segar yang sudah ditulis proses lain (atau run sebelumnya) di SQLite."""
+    try:
+        ent = storage.kv_get(KV_PREFIX + path)
+    except Exception:
+        return None
+    if ent and ent.get("items") and not _is_stale(ent):
+        return ent
+    return None
+
+
+async def _refresh(path: str) -> List[str]:
+    prev = _LISTINGS.get(path, count=False)
+    shared = _shared(path)
+    if shared and (not prev or shared["fetched_at"] > (prev.get("fetched_at") or 0)):
+        return _adopt(path, shared, prev)
+
+    # refresh background: cukup 1 proses; cold miss tetap fetch sendiri (tidak menunggu)
+    lock = f"imagekit:{path}"
+    token = cluster.try_lock(lock, ttl=IMAGEKIT_PER_REQUEST_TIMEOUT * 4) if prev and prev.get("items") else None
+    if prev and prev.get("items") and not token:
+        # proses lain sedang refresh; cek lagi hasilnya di DB beberapa detik lagi
+        prev["fetched_at"] = time.time() - IMAGEKIT_CACHE_TTL + 5
+        return prev["items"]
+    try:
+        return await _refresh_locked(path, prev)
+    finally:
+        cluster.unlock(lock, token)
+
+
+async def _refresh_locked(path: str, prev: Optional[Dict[str, Any]]) -> List[str]:
+    try:
+        items, vers = await _fetch_all(path)
+    except Exception as e:
+        print(f"[ImageKit] list files error ({path}):", e)
+        if prev and prev.get("items"):
+            # tetap pakai data lama; coba lagi setelah IMAGEKIT_RETRY_S
+            prev["fetched_at"] = time.time() - IMAGEKIT_CACHE_TTL + IMAGEKIT_RETRY_S
+            return prev["items"]
+        _LISTINGS.set(path, {"items": [], "fetched_at": time.time() - IMAGEKIT_CACHE_TTL + IMAGEKIT_RETRY_S})
+        return []
+    ent = {"items": items, "versions": vers, "fetched_at": time.time()}
+    _adopt(path, ent, prev)
+    try:
+        storage.kv_set(KV_PREFIX + path, ent)
+    except Exception as e:
+        print("[ImageKit] persist failed:", e)
+    return items
+
+
+def _start_refresh(path: str) -> asyncio.Task:
+    """Single-flight: 1 task per folder; pemanggil lain memakai task yang sama."""
+    task = _INFLIGHT.get(path)
+    if task is None:
+        task = asyncio.create_task(_refresh(path))
+        _INFLIGHT[path] = task
+        task.add_done_callback(lambda _t, p=path: _INFLIGHT.pop(p, None))
+    return task
+
+
+def peek(path: str) -> Optional[List[str]]:
+    """Listing di memori (tanpa network). Entry basi memicu refresh background."""
+    _ensure_loaded()
+    ent = _LISTINGS.get(path)
+    if ent is None:
+        return None
+    if _is_stale(ent) and IMAGEKIT_PRIVATE_KEY:
+        _start_refresh(path)
+    return ent["items"]
+
+
+def versions(path: str) -> Dict[str, str]:
+    """{url: versi isi} untuk folder (kosong bila belum di-fetch / listing lama)."""
+    ent = _LISTINGS.get(path, count=False)
+    return (ent or {}).get("versions") or {}
+
+
+async def list_files(path: str) -> List[str]:
+    """Daftar URL gambar folder. Hanya menunggu network bila belum pernah di-fetch."""
+    if not IMAGEKIT_PRIVATE_KEY or not path:
+        return []
+    items = peek(path)
+    if items is not None:
+        return items
+    return await asyncio.shield(_start_refresh(path))
+
+
+async def ensure(paths: Iterable[str]) -> None:
+    """Pastikan semua folder punya listing; yang sudah ada tidak menunggu network."""
+    if not IMAGEKIT_PRIVATE_KEY:
+        return
+    missing = [p for p in paths if p and peek(p) is None]
+    if missing:
+        await asyncio.gather(*(list_files(p) for p in missing))
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {**_LISTINGS.stats(), "version": _VERSION, "inflight": len(_INFLIGHT)}
@@ -0,0 +1,178 @@
+# app/linkpool.py
+# ------------------------------------------------------------
+# Pool link undangan sekali pakai (member_limit=1) per grup katalog:
+# - dibuat lebih dulu di background saat sepi (rate limiter idle, outbox kosong)
+# - saat kirim undangan: claim 1 link atomik dari SQLite (0 call Telegram)
+# - link bebas yang terlalu tua di-revoke lalu diganti (rotasi)
+# - grup yang menolak (bot bukan admin) di-skip sementara
+# - level pool per grup tersedia di stats() (/debug/linkpool)
+#
+# Pool kosong → send_invite_link membuat link on-demand seperti dulu.
+#
+# ENV:
+#   LINK_POOL_SIZE=5           (opsional; target link bebas per grup; 0 = nonaktif)
+#   LINK_POOL_MAX_AGE=604800   (opsional; detik sebelum link bebas di-rotasi)
+#   LINK_POOL_INTERVAL=30      (opsional; detik antar putaran top-up)
+#   LINK_POOL_BATCH=3          (opsional; maks link dibuat per grup per putaran)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden
+
+from . import outbox, storage
+from .ratelimit import LIMITER
+
+LINK_POOL_SIZE = int(os.getenv("LINK_POOL_SIZE", "5"))
+LINK_POOL_MAX_AGE = int(os.getenv("LINK_POOL_MAX_AGE", str(7 * 86400)))
+LINK_POOL_INTERVAL = float(os.getenv("LINK_POOL_INTERVAL", "30"))
+LINK_POOL_BATCH = int(os.getenv("LINK_POOL_BATCH", "3"))
+GROUP_BACKOFF_S = 1800  # grup yang menolak create link dicoba lagi setelah ini
+CLAIMED_KEEP_S = 30 * 86400  # riwayat link terpakai disimpan selama ini
+LINK_NAME = "Paid join"
+
+_TASK: Optional[asyncio.Task] = None
+_WAKE: Optional[asyncio.Event] = None
+_GROUPS: List[str] = []
+_BLOCKED_UNTIL: Dict[str, float] = {}
+_STATS: Dict[str, int] = {"claimed": 0, "misses": 0, "created": 0, "revoked": 0, "errors": 0}
+
+
+def _min_created() -> int:
+    return int(time.time()) - LINK_POOL_MAX_AGE
+
+
+def _chat_id(group_id: str):
+    try:
+        return int(group_id)
+    except ValueError:
+        return group_id
+
+
+def claim(group_id: str, invoice_id: Optional[str] = None) -> Optional[str]:
+    """Link siap pakai untuk grup (None → pool kosong, caller buat on-demand)."""
+    if LINK_POOL_SIZE <= 0:
+        return None
+    try:
+        link = storage.pool_claim(str(group_id), invoice_id, _min_created())
+    except Exception as e:
+        print("[linkpool] claim failed:", e)
+        return None
+    if link:
+        _STATS["claimed"] += 1
+    else:
+        _STATS["misses"] += 1
+    if _WAKE is not None:
+        _WAKE.set()  # isi ulang di putaran berikut
+    return link
+
+
+def _quiet() -> bool:
+    return LIMITER.idle() and not outbox.busy()
+
+
+async def _rotate(bot) -> None:
+    """Revoke link bebas yang melewati LINK_POOL_MAX_AGE lalu hapus dari pool."""
+    stale = storage.pool_stale(_min_created(), limit=50)
+    done: List[str] = []
+    for row in stale:
+        if not _quiet():
+            break
+        try:
+            await bot.revoke_chat_invite_link(chat_id=_chat_id(row["group_id"]), invite_link=row["link"])
+            _STATS["revoked"] += 1
+        except (Forbidden, BadRequest) as e:
+            print(f"[linkpool] revoke {row['group_id']} failed (dropping):", e)
+        except Exception as e:
+            _STATS["errors"] += 1
+            print(f"[linkpool] revoke {row['group_id']} failed:", e)
+            continue
+        done.append(row["link"])
+    storage.pool_delete(done)
+
+
+async def _top_up(bot) -> None:
+    levels = storage.pool_levels()
+    now = time.time()
+    for gid in _GROUPS:
+        if _BLOCKED_UNTIL.get(gid, 0) > now:
+            continue
+        need = min(LINK_POOL_BATCH, LINK_POOL_SIZE - levels.get(gid, 0))
+        links: List[str] = []
+        for _ in range(max(0, need)):
+            if not _quiet():
+                break
+            try:
+                obj = await bot.create_chat_invite_link(
+                    chat_id=_chat_id(gid), member_limit=1, creates_join_request=False, name=LINK_NAME,
+                )
+            except (Forbidden, BadRequest) as e:
+                _BLOCKED_UNTIL[gid] = now + GROUP_BACKOFF_S
+                print(f"[linkpool] cannot create links for {gid} (skip {GROUP_BACKOFF_S}s):", e)
+                break
+            except Exception as e:
+                _STATS["errors"] += 1
+                print(f"[linkpool] create link for {gid} failed:", e)
+                break
+            if getattr(obj, "invite_link", None):
+                links.append(obj.invite_link)
+        storage.pool_add(gid, links)
+        _STATS["created"] += len(links)
+
+
+async def _loop(bot) -> None:
+    while True:
+        _WAKE.clear()
+        try:
+            if _quiet():
+                await _rotate(bot)
+                await _top_up(bot)
+            storage.pool_prune_claimed(int(time.time()) - CLAIMED_KEEP_S)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _STATS["errors"] += 1
+            print("[linkpool] maintenance failed:", e)
+        try:
+            await asyncio.wait_for(_WAKE.wait(), LINK_POOL_INTERVAL)
+            await asyncio.sleep(1.0)  # biarkan burst pembayaran lewat dulu
+        except asyncio.TimeoutError:
+            pass
+
+
+def start(bot, group_ids: List[Any]) -> None:
+    """Dipanggil di on_start dengan id grup katalog."""
+    global _TASK, _WAKE
+    if _TASK is not None or LINK_POOL_SIZE <= 0:
+        return
+    _GROUPS[:] = list(dict.fromkeys(str(g) for g in group_ids if str(g)))
+    _WAKE = asyncio.Event()
+    _TASK = asyncio.create_task(_loop(bot))
+    print(f"[linkpool] maintaining {LINK_POOL_SIZE} links x {len(_GROUPS)} groups")
+
+
+async def stop() -> None:
+    global _TASK
+    if _TASK is not None:
+        _TASK.cancel()
+        await asyncio.gather(_TASK, return_exceptions=True)
+        _TASK = None
+
+
+def stats() -> Dict[str, Any]:
+    try:
+        levels = storage.pool_levels()
+    except Exception:
+        levels = {}
+    now = time.time()
+    return {
+        **_STATS,
+        "target": LINK_POOL_SIZE,
+        "levels": {g: levels.get(g, 0) for g in _GROUPS} or levels,
+        "blocked": [g for g, t in _BLOCKED_UNTIL.items() if t > now],
+    }
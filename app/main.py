@@ -1,142 +1,72 @@
 # app/main.py
-import os, json, re, base64, hmac, hashlib, httpx
+import os, sys, json, re, base64, hmac, hashlib, gzip
 import asyncio
+import math
+import time
+_T_IMPORT = time.perf_counter()
 import random
 from typing import Optional, List
 
 from pydantic import BaseModel
 from fastapi import FastAPI, Request, HTTPException, Query
 app = FastAPI()
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
-from telegram import Update, Bot
-from telegram.ext import Application
+from telegram import Update
+from telegram.ext import Application, ExtBot
 from telegram.error import Forbidden, BadRequest
 
 # ⬇️ tambahkan import install_global_menu_and_commands
-from .bot import build_app, register_handlers, send_invite_link, install_global_menu_and_commands
-from . import payments, storage
+from .bot import TELEGRAM_API_URL, build_app, register_handlers, send_invite_link, notify_invite_failed, install_global_menu_and_commands
+from . import admission, assets, chats, cluster, events, gate, httpclient, imagekit, linkpool, metrics, outbox, payments, qris, reconcile, storage, thumbs, timeline, updates
+from .ratelimit import LIMITER
+from .cache import LRUCache
 from copy import deepcopy
 
-# === penting: import fungsi scraper (signature baru: invoice_id & amount)
-from .scraper import (
-    debug_snapshot,
-    debug_fill_snapshot,
-    fetch_gopay_checkout_png,
-    fetch_gopay_qr_hd_png,
-)
+# scraper (Playwright) di-import saat pertama dipakai → boot tidak menunggu import browser
+def _scraper():
+    from . import scraper
+    return scraper
 
 # ------------- ENV -------------
 BOT_TOKEN = os.environ["BOT_TOKEN"]
-bot_check = Bot(BOT_TOKEN)
+bot_check = ExtBot(  # budget Telegram sama dengan bot_app
+    BOT_TOKEN, base_url=f"{TELEGRAM_API_URL}/bot", base_file_url=f"{TELEGRAM_API_URL}/file/bot", rate_limiter=LIMITER,
+)
 BASE_URL = os.environ["BASE_URL"].strip()
 WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
 ENV = os.getenv("ENV", "dev")  # "prod" di Railway untuk mematikan debug endpoints
 
-# was:
-# IMAGEKIT_PUBLIC_KEY = os.getenv("IMAGEKIT_PUBLIC_KEY", "").strip()
-IMAGEKIT_PRIVATE_KEY = os.getenv("IMAGEKIT_PRIVATE_KEY", "").strip()
-IMAGEKIT_BASE_URL   = (os.getenv("IMAGEKIT_BASE_URL", "").rstrip("/"))
-IMAGEKIT_CACHE_TTL = int(os.getenv("IMAGEKIT_CACHE_TTL", "900"))
-IMAGEKIT_IMG_WIDTH = int(os.getenv("IMAGEKIT_IMG_WIDTH", "600"))
-IMAGEKIT_PER_REQUEST_TIMEOUT = float(os.getenv("IMAGEKIT_PER_REQUEST_TIMEOUT", "6"))
-# cache sederhana di memori: { "/M": {"exp": ts, "items": [urls...] } }
-_IMAGEKIT_CACHE: dict[str, dict] = {}
-
-def _split_env(name: str) -> List[str]:
-    v = os.getenv(name, "") or ""
-    return [x.strip() for x in v.split(",") if x.strip()]
-
-ALLOWED_STATUSES = {"member", "administrator", "creator"}
+# ImageKit (listing folder, cache, ENV): lihat app/imagekit.py
+httpclient.configure_host("saweria.co", timeout=20)
 
 async def _is_member_server(user_id: int, chat_id: str) -> int:
     """return 1 joined, 0 not joined, -1 cannot check (no access)"""
-    if not chat_id:
-        return 1
-    try:
-        cm = await bot_check.get_chat_member(chat_id=chat_id, user_id=user_id)
-        return 1 if getattr(cm, "status", "") in ALLOWED_STATUSES else 0
-    except (Forbidden, BadRequest):
-        return -1
-    except Exception:
-        return -1
-
-# ----- di atas gate_status -----
-_NAME_CACHE: dict[str, str] = {}
-
-def _name_from_groups_env(chat_id: str) -> str | None:
-    # pakai nama dari GROUPS (env) bila ada
-    try:
-        for g in GROUPS:
-            if str(g.get("id")) == str(chat_id):
-                nm = str(g.get("name") or g.get("label") or "").strip()
-                if nm:
-                    return nm
-    except Exception:
-        pass
-    return None
+    return await gate.is_member(bot_check, user_id, chat_id)
 
 async def _resolve_titles_server(ids: list[str | int]) -> list[str]:
-    titles: list[str] = []
-    for cid in ids:
-        key = str(cid)
-        if key in _NAME_CACHE:
-            titles.append(_NAME_CACHE[key]); continue
-
-        # 1) nama dari ENV
-        nm = _name_from_groups_env(key)
-        if nm:
-            if len(nm) > 32: nm = nm[:29] + "..."
-            _NAME_CACHE[key] = nm
-            titles.append(nm); continue
-
-        # 2) fallback: get_chat ke Telegram
-        try:
-            chat = await bot_check.get_chat(chat_id=cid)
-            nm = getattr(chat, "title", None) or f"@{getattr(chat, 'username', '')}".strip("@") or key
-        except Exception:
-            nm = key
-        if len(nm) > 32: nm = nm[:29] + "..."
-        _NAME_CACHE[key] = nm
-        titles.append(nm)
-    return titles
+    return await chats.titles(bot_check, ids)
 
 @app.get("/api/gate/status")
 async def gate_status(uid: int = Query(..., description="Telegram user_id")):
-    group_ids   = _split_env("REQUIRED_GROUP_IDS")
-    channel_ids = _split_env("REQUIRED_CHANNEL_IDS")
-    mode        = (os.getenv("REQUIRED_MODE", "ALL") or "ALL").upper()
-    try:
-        min_count = int(os.getenv("REQUIRED_MIN_COUNT", "1"))
-    except:
-        min_count = 1
+    cfg         = gate.load_env()
+    group_ids   = cfg["group_ids"]
+    channel_ids = cfg["channel_ids"]
+    mode        = cfg["mode"]
+    min_count   = cfg["min_count"]
 
     total_required = len(group_ids) + len(channel_ids)
     if total_required == 0:
         return {"passed": True, "ok_count": 0, "total_required": 0}
 
-    ok_count = 0
-    any_cannot = False
-
-    # === NEW: simpan status per item ===
-    mem_groups: list[int] = []   # 1 joined, 0 not, -1 cannot check
-    mem_channels: list[int] = []
-
-    for gid in group_ids:
-        res = await _is_member_server(uid, gid)
-        mem_groups.append(res)
-        if res == 1: ok_count += 1
-        elif res == -1: any_cannot = True
-
-    for cid in channel_ids:
-        res = await _is_member_server(uid, cid)
-        mem_channels.append(res)
-        if res == 1: ok_count += 1
-        elif res == -1: any_cannot = True
-
-    group_titles   = await _resolve_titles_server(group_ids)
-    channel_titles = await _resolve_titles_server(channel_ids)
+    # membership (paralel + cache) dan judul chat di-resolve bersamaan
+    # mem_*: 1 joined, 0 not, -1 cannot check (sejajar index)
+    (ok_count, any_cannot, mem_groups, mem_channels), group_titles, channel_titles = await asyncio.gather(
+        gate.count(bot_check, uid, cfg),
+        _resolve_titles_server(group_ids),
+        _resolve_titles_server(channel_ids),
+    )
 
     # evaluasi pass
     if mode == "ALL":
@@ -152,8 +82,8 @@ async def gate_status(uid: int = Query(..., description="Telegram user_id")):
             "total_required": total_required,
             "mode": mode,
             "min_count": min_count,
-            "group_invites": _split_env("REQUIRED_GROUP_INVITES"),
-            "channel_invites": _split_env("REQUIRED_CHANNEL_INVITES"),
+            "group_invites": cfg["group_links"],
+            "channel_invites": cfg["chan_links"],
             # identitas + judul + STATUS (sejajar index)
             "group_ids": group_ids,
             "channel_ids": channel_ids,
@@ -242,6 +172,7 @@ def _parse_groups_from_any(data):
 # BACA ENV SEKARANG (module scope)
 GROUPS_DATA = _read_env_json("GROUP_IDS_JSON", "[]")
 GROUPS = _parse_groups_from_any(GROUPS_DATA)
+chats.set_catalog_names({g["id"]: g["name"] for g in GROUPS})
 
 try:
     PRICE_IDR = int(os.environ.get("PRICE_IDR", "25000"))
@@ -249,157 +180,96 @@ except Exception:
     PRICE_IDR = 25000
 
 
-# --- Helper ambil gambar random dari folder ImageKit ---
-
-def _norm_folder_to_path(folder: str) -> str:
-    """Terima path '/M' atau URL penuh '.../M/' → balikan path '/M'."""
-    if not folder:
-        return ""
-    s = folder.strip()
-    if s.startswith("http://") or s.startswith("https://"):
-        if IMAGEKIT_BASE_URL and s.startswith(IMAGEKIT_BASE_URL):
-            s = s[len(IMAGEKIT_BASE_URL):]
-        # buang query/fragment
-        s = s.split("?", 1)[0].split("#", 1)[0]
-    if not s.startswith("/"):
-        s = "/" + s
-    # pastikan tanpa trailing slash agar konsisten di API path query
-    # (ImageKit menerima '/M' atau '/M/', tapi kita konsistenkan)
-    if len(s) > 1 and s.endswith("/"):
-        s = s[:-1]
-    return s
-
-async def _imagekit_list_files_by_path(path: str) -> List[str]:
-    """Ambil daftar URL file gambar dari folder pakai API (dengan cache)."""
-    if not IMAGEKIT_PRIVATE_KEY:
-        return []
-
-    # CACHE HIT
-    now = asyncio.get_event_loop().time()
-    ent = _IMAGEKIT_CACHE.get(path)
-    if ent and ent.get("exp", 0) > now and ent.get("items"):
-        return ent["items"]
-
-    # FETCH (limit 100 sudah cukup untuk randomizer)
-    url = "https://api.imagekit.io/v1/files"
-    params = {"path": path, "limit": 100}
-    try:
-        async with httpx.AsyncClient(timeout=IMAGEKIT_PER_REQUEST_TIMEOUT) as client:
-            r = await client.get(
-                url,
-                params=params,
-                headers={
-                    "Authorization": "Basic " + base64.b64encode(f"{IMAGEKIT_PRIVATE_KEY}:".encode()).decode()
-                },
-            )
-        r.raise_for_status()
-        data = r.json()
-        items = [f["url"] for f in data if f.get("fileType") == "image" and f.get("url")]
-        # set cache
-        _IMAGEKIT_CACHE[path] = {"exp": now + IMAGEKIT_CACHE_TTL, "items": items}
-        return items
-    except Exception as e:
-        print("[ImageKit] list files error:", e)
-        # fallback: gunakan cache lama jika masih ada meskipun expired
-        if ent and ent.get("items"):
-            return ent["items"]
-        return []
+# --- Helper gambar katalog (ImageKit → proxy /img) ---
 
+def _catalog_image_url(url: str, version: Optional[str] = None) -> str:
+    """Gambar katalog lewat proxy /img lokal (bila origin diizinkan), else transform ImageKit."""
+    if thumbs.IMG_PROXY and thumbs.allowed(url):
+        return thumbs.proxy_url(url, imagekit.IMAGEKIT_IMG_WIDTH, version=version)
+    return imagekit.with_transform(url)
 
-
-async def _scrape_folder_for_images(url: str) -> List[str]:
-    """
-    Fallback: GET folder URL (HTML indexing) lalu regex semua *.jpg/png/webp.
-    Return: list URL absolut.
-    """
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-        html = resp.text
-        names = re.findall(r'([\w\-\./%]+?\.(?:jpg|jpeg|png|webp))', html, flags=re.I)
-        out = []
-        for n in names:
-            if n.startswith("http"):
-                out.append(n)
-            else:
-                base = url.rstrip("/") + "/"
-                out.append(base + n.lstrip("/"))
-        # deduplicate
-        seen, uniq = set(), []
-        for u in out:
-            if u not in seen:
-                uniq.append(u); seen.add(u)
-        return uniq
-    except Exception as e:
-        print("[ImageScrape] error:", e)
-        return []
-
-async def _pick_random_image_from_folder(folder: str) -> Optional[str]:
-    """Pilih 1 URL gambar secara acak dari folder ImageKit (gunakan transform)."""
-    path = _norm_folder_to_path(folder)
-    if not path:
-        return None
-    files = await _imagekit_list_files_by_path(path)
-    if not files:
-        return None
-    import random
-    url = random.choice(files)
-    # tambahkan transform ringan agar cepat (ignorant query aman di ImageKit)
-    # contoh: https://.../file.jpg?tr=w-600,fo-auto
-    return f"{url}?tr=w-{IMAGEKIT_IMG_WIDTH},fo-auto"
+def _catalog_folders() -> List[str]:
+    """Path folder ImageKit unik dari katalog (urutan stabil)."""
+    folders: List[str] = []
+    for g in GROUPS:
+        fld = str(g.get("image_folder") or "").strip()
+        if fld:
+            p = imagekit.norm_folder_to_path(fld)
+            if p and p not in folders:
+                folders.append(p)
+    return folders
 
 
 # ------------- APP & BOT -------------
-storage.init_db()
-
+# storage.init_db() dijalankan di on_start (bukan saat import)
 bot_app: Application = build_app()
 register_handlers(bot_app)
 
-# >>> helper kirim undangan (idempotent-ish)
-async def _send_invites_for_invoice(inv: dict) -> None:
+# >>> pengiriman undangan: job di tabel invite_outbox, dikerjakan app/outbox.py
+def _norm_chat_id(gid):
     try:
-        groups = json.loads(inv.get("groups_json") or "[]")
+        return int(str(gid))
     except Exception:
-        groups = []
-    if not groups:
-        return
-
-    logs = storage.list_invite_logs(inv["invoice_id"])
-    already = { str(l.get("group_id")) for l in logs if l.get("group_id") }
+        return str(gid)
 
-    for gid in groups:
-        gid_str = str(gid)
-        if gid_str in already:
-            continue
+async def _deliver_invite(user_id: int, group_id: str, invoice_id: str) -> Optional[str]:
+    # link dari pool pre-minted (0 call Telegram); pool kosong → dibuat on-demand.
+    # laju diatur rate limiter global (ratelimit.LIMITER); gagal → outbox retry
+    link = linkpool.claim(group_id, invoice_id)
+    return await send_invite_link(bot_app, user_id, _norm_chat_id(group_id), raise_on_failure=True, invite_link=link)
 
-        # normalisasi id telegram
-        try:
-            gid_norm = int(gid_str)
-        except Exception:
-            gid_norm = gid_str
+async def _invite_dead(user_id: int, group_id: str, invoice_id: str) -> None:
+    await notify_invite_failed(bot_app, user_id, group_id)
 
-        # kirim link
-        try:
-            await send_invite_link(bot_app, inv["user_id"], gid_norm)
-            try:
-                storage.add_invite_log(inv["invoice_id"], gid_str, "(sent)", None)
-            except Exception as e:
-                print("[invite-log] failed to insert success log:", e)
-        except Exception as e:
-            # catat error tanpa menghentikan loop grup lainnya
-            try:
-                storage.add_invite_log(inv["invoice_id"], gid_str, None, str(e))
-            except Exception as e2:
-                print("[invite-log] failed to insert error log:", e2)
+def _require_admin(secret: Optional[str]) -> None:
+    if WEBHOOK_SECRET and secret != WEBHOOK_SECRET:
+        raise HTTPException(403, "Forbidden")
 
-        await asyncio.sleep(0.7)  # throttle ringan
 
 
+# Serve Mini App statics: index + aset ber-hash dari memori (app/assets.py);
+# route ini harus didaftarkan SEBELUM mount StaticFiles di bawah
+def _asset_response(request: Request, a: "assets.Asset") -> Response:
+    headers = {"ETag": a.etag, "Cache-Control": a.cache_control, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), a.etag):
+        return Response(status_code=304, headers=headers)
+    body, enc = a.pick(request.headers.get("accept-encoding"))
+    if enc:
+        headers["Content-Encoding"] = enc
+    return Response(content=body if request.method != "HEAD" else b"", media_type=a.media_type,
+                    headers={**headers, "Content-Length": str(len(body))})
+
+@app.api_route("/webapp/", methods=["GET", "HEAD"])
+@app.api_route("/webapp/index.html", methods=["GET", "HEAD"])
+def webapp_index(request: Request):
+    a = assets.index()
+    if not a:
+        raise HTTPException(404, "Not found")
+    return _asset_response(request, a)
+
+@app.api_route("/assets/{name:path}", methods=["GET", "HEAD"])
+def webapp_asset(request: Request, name: str):
+    a = assets.by_url(name)
+    if not a:
+        raise HTTPException(404, "Not found")
+    return _asset_response(request, a)
 
-# Serve Mini App statics
 app.mount("/webapp", StaticFiles(directory="app/webapp", html=True), name="webapp")
 app.mount("/static", StaticFiles(directory="app/webapp"), name="static")
 
+# ------------- IMAGE PROXY (thumbnail katalog) -------------
+@app.get("/img/{width}/{name}")
+async def img_proxy(request: Request, width: int, name: str, v: Optional[str] = None, s: Optional[str] = None):
+    token, _, fmt = name.rpartition(".")
+    try:
+        body, etag = await thumbs.get(token, width, fmt, v, s)
+    except thumbs.ThumbError as e:
+        raise HTTPException(e.status, e.detail)
+    headers = {**thumbs.cache_headers(v), "ETag": etag}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=thumbs.FORMATS[fmt], headers=headers)
+
 # ------------- TELEGRAM WEBHOOK -------------
 @app.post("/telegram/webhook")
 async def telegram_webhook(request: Request):
@@ -407,20 +277,43 @@ async def telegram_webhook(request: Request):
     if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
         raise HTTPException(403, "Invalid secret")
 
-    data = await request.json()
-    update = Update.de_json(data, bot_app.bot)
-    await bot_app.process_update(update)
-    return JSONResponse({"ok": True})
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Invalid JSON")
+
+    if not updates.running():
+        # belum startup penuh: proses langsung seperti dulu
+        await bot_app.process_update(Update.de_json(data, bot_app.bot))
+        return JSONResponse({"ok": True})
+
+    # fast-ack: handler jalan di worker pool, Telegram tidak menunggu
+    res = updates.enqueue(data)
+    if res == updates.FULL:
+        return JSONResponse({"ok": False, "error": "queue full"}, status_code=503)
+    return JSONResponse({"ok": True, "result": res})
 
 
 # ------------- API: CREATE INVOICE -------------
+# >>> admission control endpoint mahal (app/admission.py) → 429 cepat + Retry-After
+def _too_many(e: "admission.Rejected") -> HTTPException:
+    return HTTPException(429, "Terlalu banyak permintaan, coba lagi sebentar",
+                         headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+def _admit(request: Request, endpoint: str, uid) -> None:
+    ip = admission.client_ip(request.headers, request.client.host if request.client else None)
+    try:
+        admission.check(endpoint, uid, ip)
+    except admission.Rejected as e:
+        raise _too_many(e)
+
 class CreateInvoiceIn(BaseModel):
     user_id: int
     groups: List[str]
     amount: int
 
 @app.post("/api/invoice")
-async def create_invoice(payload: CreateInvoiceIn):
+async def create_invoice(payload: CreateInvoiceIn, request: Request):
     # --- DEBUG LOG (bisa hapus setelah stabil)
     import logging
     logging.info(f"[create_invoice] uid={payload.user_id} groups={payload.groups} amount={payload.amount}")
@@ -442,6 +335,8 @@ async def create_invoice(payload: CreateInvoiceIn):
         if str(gid) not in allowed:
             raise HTTPException(400, f"Invalid group {gid}.")
 
+    _admit(request, "invoice", payload.user_id)
+
     # --- CALL payments.create_invoice
     try:
         inv = await payments.create_invoice(payload.user_id, payload.groups, payload.amount)
@@ -454,30 +349,138 @@ async def create_invoice(payload: CreateInvoiceIn):
 
 
 # ------------- API: CONFIG -------------
+# Katalog diserialisasi SEKALI jadi template (fragmen JSON per grup). Per request
+# hanya memilih gambar acak secara lokal dari listing ImageKit yang sudah di-cache,
+# lalu menggabung fragmen. Dengan ?uid= pilihan di-seed per user → body stabil,
+# jadi bisa di-cache (gzip siap kirim) + ETag/304. Template dibangun ulang hanya
+# bila listing ImageKit berubah (katalog sendiri dibaca sekali dari ENV).
+CONFIG_BODY_CACHE_MAX = int(os.getenv("CONFIG_BODY_CACHE_MAX", "5000"))
+_CONFIG_TPL: dict = {"key": None}
+_CONFIG_BODIES = LRUCache("config_bodies", max_items=CONFIG_BODY_CACHE_MAX)  # (tpl_key, uid) → (raw, gz, etag)
+
+async def _ensure_catalog_listings() -> None:
+    """Tunggu ImageKit hanya untuk folder yang belum pernah di-fetch (sisanya SWR)."""
+    await imagekit.ensure(_catalog_folders())
+
+def _config_template() -> dict:
+    if _CONFIG_TPL.get("key") == imagekit.version():
+        return _CONFIG_TPL
+    groups = []
+    for g in GROUPS:
+        static = {k: v for k, v in g.items() if k != "image"}
+        head = json.dumps(static, ensure_ascii=False)[:-1] + (', "image": ' if static else '"image": ')
+        choices: List[str] = []
+        folder = str(g.get("image_folder") or "").strip()
+        if folder:
+            path = imagekit.norm_folder_to_path(folder)
+            items, vers = imagekit.peek(path) or [], imagekit.versions(path)
+            choices = [_catalog_image_url(u, vers.get(u)) for u in items]
+        default = g.get("image") or ""
+        groups.append((head, choices, thumbs.proxy_url(default, imagekit.IMAGEKIT_IMG_WIDTH) if default else ""))
+    _CONFIG_TPL.clear()
+    _CONFIG_TPL.update({
+        "key": imagekit.version(),
+        "prefix": '{"price_idr": %d, "groups": [' % PRICE_IDR,
+        "groups": groups,
+        "randomized": any(c for _, c, _ in groups),
+    })
+    _CONFIG_BODIES.clear()
+    return _CONFIG_TPL
+
+def _config_body(tpl: dict, uid: Optional[int]) -> tuple[bytes, bytes, str]:
+    cacheable = uid is not None or not tpl["randomized"]
+    ck = (tpl["key"], uid if tpl["randomized"] else None)
+    if cacheable:
+        hit = _CONFIG_BODIES.get(ck)
+        if hit:
+            return hit
+    rng = random.Random(f"{uid}:{tpl['key']}") if uid is not None else random
+    parts = [
+        head + json.dumps(rng.choice(choices) if choices else default, ensure_ascii=False) + "}"
+        for head, choices, default in tpl["groups"]
+    ]
+    raw = (tpl["prefix"] + ",".join(parts) + "]}").encode()
+    ent = (raw, gzip.compress(raw, 6), '"' + hashlib.sha256(raw).hexdigest()[:32] + '"')
+    if cacheable:
+        _CONFIG_BODIES.set(ck, ent)
+    return ent
+
 @app.get("/api/config")
-async def get_config():
+async def get_config(request: Request, uid: Optional[int] = Query(None, description="seed gambar per user (cacheable)")):
     try:
-        result_groups = deepcopy(GROUPS)  # jangan ubah global
-        # buat task paralel untuk set image dari folder
-        async def enrich(g: dict):
-            folder = str(g.get("image_folder") or "").strip()
-            if folder:
-                img = await _pick_random_image_from_folder(folder)
-                if img:
-                    g["image"] = img
-
-        await asyncio.gather(*(enrich(g) for g in result_groups))
-        return {"price_idr": PRICE_IDR, "groups": result_groups}
+        await _ensure_catalog_listings()
+        raw, gz, etag = _config_body(_config_template(), uid)
     except Exception as e:
         print("[config] random image error:", e)
         return {"price_idr": PRICE_IDR, "groups": deepcopy(GROUPS)}
 
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in (request.headers.get("accept-encoding") or "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gz, media_type="application/json", headers=headers)
+    return Response(content=raw, media_type="application/json", headers=headers)
+
 
 
 
 # ------------- API: STATUS & QR IMAGE -------------
 _DATA_URL_RE = re.compile(r"^data:(image/[^;]+);base64,(.+)$")
 PNG_MIN_BYTES = 5_000  # sanity check agar tidak menerima file kecil/invalid
+QR_CACHE_HEADERS = {"Cache-Control": "public, max-age=300"}
+
+def _legacy_png_from_data_url(payload: str) -> Optional[bytes]:
+    """Row lama menyimpan PNG utuh sebagai data URL. STRICT: hanya PNG valid."""
+    m = _DATA_URL_RE.match(payload)
+    if not m:
+        return None
+    mime, b64 = m.groups()
+    if mime.lower() != "image/png":
+        # STRICT: tolak non-PNG (mis. screenshot)
+        return None
+    data = base64.b64decode(b64)
+    if not data or len(data) < PNG_MIN_BYTES:
+        return None
+    return data
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]  # If-None-Match memakai perbandingan lemah
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+def _image_response(request: Request, invoice_id: str, body: bytes, etag: str, fmt: str) -> Response:
+    timeline.mark(invoice_id, "qr_served")  # hanya yang pertama ditulis ke DB
+    headers = {**QR_CACHE_HEADERS, "ETag": etag}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=qris.MEDIA_TYPES[fmt], headers=headers)
+
+async def _qr_response(request: Request, invoice_id: str, payload: str, fmt: str, size: int) -> Response:
+    """Render QR dari payload tersimpan. Data URL legacy dimigrasi ke string QRIS bila bisa."""
+    if not qris.is_payload(payload):
+        png = _legacy_png_from_data_url(payload)
+        if not png:
+            raise HTTPException(404, "QR not available")
+        decoded = await asyncio.to_thread(qris.decode_png, png)
+        if not decoded:
+            if fmt != "png":
+                raise HTTPException(404, "QR not available")
+            body, etag = qris.store_image(invoice_id, fmt, size, png)
+            return _image_response(request, invoice_id, body, etag, fmt)
+        try:
+            storage.update_qris_payload(invoice_id, decoded)
+        except Exception:
+            pass
+        payload = decoded
+    body, etag = await qris.image_for(invoice_id, payload, fmt, size)
+    return _image_response(request, invoice_id, body, etag, fmt)
 
 @app.get("/api/invoice/{invoice_id}/status")
 async def invoice_status(invoice_id: str):
@@ -485,107 +488,178 @@ async def invoice_status(invoice_id: str):
     if not st:
         raise HTTPException(404, "Invoice not found")
 
-    # Fallback auto-kirim undangan saat status sudah PAID
+    # Fallback: invoice PAID lama (sebelum ada outbox) → buat job undangan (idempotent)
     try:
         if (st.get("status") or "").upper() == "PAID":
             logs = storage.list_invite_logs(invoice_id)
-            if not logs:
-                inv = payments.get_invoice(invoice_id)  # berisi user_id & groups_json
-                if inv:
-                    await _send_invites_for_invoice(inv)
+            if not logs and storage.enqueue_invites(invoice_id):
+                outbox.wake()
     except Exception as e:
-        print("[invoice_status] auto-send invites failed:", e)
+        print("[invoice_status] enqueue invites failed:", e)
 
     return st
 
 
+# --- SSE: push perubahan status (pengganti polling 1 detik) ---
+SSE_HEARTBEAT_S = 15
+SSE_MAX_LIFETIME_S = 20 * 60  # batasi umur koneksi; EventSource akan reconnect sendiri
+
+def _sse(ev_id: int, event: str, data: dict) -> str:
+    return f"id: {ev_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/api/invoice/{invoice_id}/events")
+async def invoice_events(invoice_id: str, request: Request, lastEventId: Optional[str] = Query(None)):
+    st = payments.get_status(invoice_id)
+    if not st:
+        raise HTTPException(404, "Invoice not found")
+
+    last_id = request.headers.get("Last-Event-ID") or lastEventId
+    q = events.subscribe(invoice_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            backlog = events.replay(invoice_id, last_id)
+            if backlog is None:
+                # snapshot awal (atau reconnect tanpa riwayat)
+                yield _sse(events.current_id(invoice_id), "status", st)
+                if st["status"] == "PAID":
+                    return
+            else:
+                for ev in backlog:
+                    yield _sse(ev["id"], ev["event"], ev["data"])
+                    if ev["event"] == "status" and ev["data"].get("status") == "PAID":
+                        return
+
+            deadline = asyncio.get_event_loop().time() + SSE_MAX_LIFETIME_S
+            while asyncio.get_event_loop().time() < deadline:
+                if await request.is_disconnected():
+                    return
+                try:
+                    ev = await asyncio.wait_for(q.get(), SSE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(ev["id"], ev["event"], ev["data"])
+                if ev["event"] == "status" and ev["data"].get("status") == "PAID":
+                    return
+        finally:
+            events.unsubscribe(invoice_id, q)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # --- STRICT QR ONLY endpoint ---
+QR_LOCK_TTL = 90  # detik; batas atas 1x generate QR (browser) per invoice
+
+
+async def _wait_for_qr(invoice_id: str, timeout: float, lock: Optional[str] = None) -> Optional[str]:
+    """Tunggu payload QR ditulis coroutine/proses lain (event "qr"; proses lain
+    diteruskan cluster event bridge). Cek DB hanya sekali per event yang masuk;
+    polling kasar hanya bila event proses lain tidak mungkin sampai (bridge
+    mati / lock QR dipegang proses lain)."""
+    waiter = events.subscribe(invoice_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            # cek (ulang) DB setelah subscribe supaya tidak ketinggalan event
+            inv = payments.get_invoice(invoice_id)
+            payload = inv.get("qris_payload") if inv else None
+            remaining = deadline - loop.time()
+            if payload or remaining <= 0:
+                return payload
+            if cluster.needs_polling() or (lock and cluster.held_elsewhere(lock)):
+                remaining = min(remaining, cluster.CLUSTER_EVENT_POLL_S)
+            await events.next_event(waiter, "qr", remaining)
+    finally:
+        events.unsubscribe(invoice_id, waiter)
+
+
 @app.get("/api/qr/{raw_id}")
 async def qr_png(
+    request: Request,
     raw_id: str,
     amount: int | None = Query(None, description="Amount; jika None, ambil dari invoice"),
     wait: int = Query(0, description="Wait seconds for background cache (max 8)"),
     hd: bool = Query(True, description="(ignored; QR selalu HD bila tersedia)"),
+    size: int = Query(qris.QR_DEFAULT_SIZE, description="Ukuran sisi QR (px), dibulatkan"),
 ):
-    # 1) Normalisasi ID: izinkan .../{invoice_id}.png atau .jpg
-    invoice_id = re.sub(r"\.(png|jpg|jpeg)$", "", raw_id, flags=re.I)
-
-    # 2) Ambil invoice dari DB
+    # 1) Normalisasi ID: izinkan .../{invoice_id}.png / .jpg / .svg
+    m = re.match(r"^(.+?)(?:\.(png|jpg|jpeg|svg))?$", raw_id, flags=re.I)
+    invoice_id = m.group(1)
+    fmt = "svg" if (m.group(2) or "").lower() == "svg" else "png"
+    size = qris.normalize_size(size)
+
+    # 2) Cache gambar in-memory (tanpa SQLite / base64) + conditional GET
+    hit = qris.cached_image(invoice_id, fmt, size)
+    if hit:
+        return _image_response(request, invoice_id, hit[0], hit[1], fmt)
+
+    # 3) Ambil invoice dari DB
     inv = payments.get_invoice(invoice_id)
     if not inv:
         raise HTTPException(404, "Invoice not found")
 
-    # 3) Amount
+    # 4) Amount
     amt = inv.get("amount") or amount
     if not isinstance(amt, int) or amt <= 0:
         raise HTTPException(400, "Invalid amount")
 
-    # 4) Jika sudah ada payload di DB → kirim hanya jika PNG valid
+    # 5) Jika sudah ada payload di DB → render lokal (legacy: PNG valid saja)
     payload = inv.get("qris_payload")
     if payload:
-        m = _DATA_URL_RE.match(payload)
-        if not m:
-            raise HTTPException(404, "QR not available")
-        mime, b64 = m.groups()
-        if mime.lower() != "image/png":
-            # STRICT: tolak non-PNG (mis. screenshot)
-            raise HTTPException(404, "QR not available")
-        data = base64.b64decode(b64)
-        if not data or len(data) < PNG_MIN_BYTES:
-            raise HTTPException(404, "QR not available")
-        return Response(
-            content=data,
-            media_type="image/png",
-            headers={"Cache-Control": "public, max-age=300"},
-        )
+        return await _qr_response(request, invoice_id, payload, fmt, size)
 
-    # 5) Opsional: tunggu background writer (tetap ketat ke PNG)
+    # 6) Opsional: tunggu background writer (dibangunkan event "qr", bukan polling DB)
     if wait and isinstance(wait, int) and wait > 0:
-        for _ in range(min(wait, 8)):
-            await asyncio.sleep(1)
-            inv2 = payments.get_invoice(invoice_id)
-            payload2 = inv2.get("qris_payload") if inv2 else None
-            if payload2:
-                m = _DATA_URL_RE.match(payload2)
-                if not m:
-                    break
-                mime, b64 = m.groups()
-                if mime.lower() != "image/png":
-                    break
-                data = base64.b64decode(b64)
-                if not data or len(data) < PNG_MIN_BYTES:
-                    break
-                return Response(
-                    content=data,
-                    media_type="image/png",
-                    headers={"Cache-Control": "public, max-age=300"},
-                )
-
-    # 6) Generate on-demand (HD) + cache ke DB — STRICT: jika gagal → 404
+        payload2 = await _wait_for_qr(invoice_id, min(wait, 8))
+        if payload2:
+            return await _qr_response(request, invoice_id, payload2, fmt, size)
+
+    # 7) Generate on-demand → simpan string QRIS (decode sekali) — STRICT: jika gagal → 404
+    #    single-flight antar proses: worker lain yang sedang generate → tunggu hasilnya
+    #    admission: per uid/IP dulu, slot scraper global hanya untuk pemegang lock
+    _admit(request, "qr", inv.get("user_id"))
+    timeline.mark(invoice_id, "qr_queued")
+    lock = f"qr:{invoice_id}"
+    token = cluster.try_lock(lock, ttl=QR_LOCK_TTL)
+    if not token:
+        payload2 = await _wait_for_qr(invoice_id, QR_LOCK_TTL, lock)
+        if payload2:
+            return await _qr_response(request, invoice_id, payload2, fmt, size)
+        raise HTTPException(404, "QR not available")
     try:
-        png = await fetch_gopay_qr_hd_png(invoice_id=invoice_id, amount=amt)
-        if not png or len(png) < PNG_MIN_BYTES:
+        with admission.scrape_slot("qr"):
+            timeline.mark(invoice_id, "qr_started")
+            cap = await _scraper().fetch_gopay_qr(invoice_id=invoice_id, amount=amt)
+        timeline.mark(invoice_id, "qr_done" if cap else "qr_failed")
+        if not cap:
             raise HTTPException(404, "QR not available")
 
-        # cache ke DB sebagai data URL PNG
-        try:
-            b64 = base64.b64encode(png).decode()
-            storage.update_qris_payload(invoice_id, f"data:image/png;base64,{b64}")
-        except Exception:
-            pass
-
-        return Response(
-            content=png,
-            media_type="image/png",
-            headers={"Cache-Control": "public, max-age=300"},
-        )
+        stored = await payments.save_qr(invoice_id, payload=cap.get("qris"), png=cap.get("png"))
+        if stored and qris.is_payload(stored):
+            return await _qr_response(request, invoice_id, stored, fmt, size)
+        png = cap.get("png")
+        if fmt != "png" or not png or len(png) < PNG_MIN_BYTES:
+            raise HTTPException(404, "QR not available")
+        body, etag = qris.store_image(invoice_id, fmt, size, png)
+        return _image_response(request, invoice_id, body, etag, fmt)
     except HTTPException:
         # biarkan 404 melewati
         raise
+    except admission.Rejected as e:
+        raise _too_many(e)
     except Exception as e:
         print("[qr_png] error:", e)
         # Untuk UX: pakai 404 → frontend treat as gagal & redirect
         raise HTTPException(404, "QR not available")
+    finally:
+        cluster.unlock(lock, token)
 
 
 # ------------- SAWERIA WEBHOOK -------------
@@ -606,8 +680,6 @@ def _verify_saweria_signature(req: Request, raw_body: bytes) -> bool:
     calc = hmac.new(SAWERIA_WEBHOOK_SECRET.encode(), raw_body, hashlib.sha256).hexdigest()
     return hmac.compare_digest(calc, sig_hdr)
 
-INV_RE = re.compile(r"(?:^|\b)INV[:\s]*([0-9a-fA-F-]{36})\b")
-
 @app.post("/api/saweria/webhook")
 async def saweria_webhook(request: Request):
     raw = await request.body()
@@ -637,10 +709,7 @@ async def saweria_webhook(request: Request):
     # Style B (Saweria)
     if not is_paid and str(data.get("type", "")).lower() == "donation":
         is_paid = True
-        msg = str(data.get("message", ""))
-        m = INV_RE.search(msg)
-        if m:
-            invoice_id = m.group(1)
+        invoice_id = payments.invoice_id_from_message(data.get("message"))
 
     if not is_paid:
         return {"ok": True, "ignored": True}
@@ -648,43 +717,130 @@ async def saweria_webhook(request: Request):
     if not invoice_id:
         raise HTTPException(400, "Cannot resolve invoice_id from payload")
 
-    # 4) Tandai PAID dan kirim undangan
+    # 4) Tandai PAID (job undangan ikut tersimpan di transaksi yang sama) → worker kirim
+    timeline.mark(invoice_id, "webhook")
     inv = payments.mark_paid(invoice_id)
     if not inv:
         raise HTTPException(404, "Invoice not found")
 
-    try:
-        groups = json.loads(inv.get("groups_json") or "[]")
-    except Exception:
-        groups = []
-
-    for gid in groups:
-        try:
-            await send_invite_link(bot_app, inv["user_id"], gid)
-            storage.add_invite_log(inv["invoice_id"], gid, "(sent-via-webhook)", None)
-        except Exception as e:
-            storage.add_invite_log(inv["invoice_id"], gid, None, str(e))
-
+    outbox.wake()
     return {"ok": True}
 
 
-# >>> endpoint manual trigger kirim undangan (debug)
+# >>> endpoint manual trigger kirim undangan (debug): buat job yang belum ada + hidupkan DEAD
 @app.post("/api/invoice/{invoice_id}/send-invites")
 async def manual_send_invites(invoice_id: str, secret: Optional[str] = Query(None)):
-    if WEBHOOK_SECRET and secret != WEBHOOK_SECRET:
-        raise HTTPException(403, "Forbidden")
+    _require_admin(secret)
     inv = payments.get_invoice(invoice_id)
     if not inv:
         raise HTTPException(404, "Invoice not found")
-    await _send_invites_for_invoice(inv)
-    return {"ok": True, "invoice_id": invoice_id, "logs": storage.list_invite_logs(invoice_id)}
+    queued = storage.enqueue_invites(invoice_id)
+    revived = outbox.retry(invoice_id=invoice_id)
+    outbox.wake()
+    return {"ok": True, "invoice_id": invoice_id, "queued": queued, "revived": revived,
+            "jobs": storage.list_outbox(invoice_id=invoice_id), "logs": storage.list_invite_logs(invoice_id)}
+
+
+# >>> admin: pantau + retry massal outbox undangan
+@app.get("/api/admin/outbox")
+def admin_outbox(secret: Optional[str] = Query(None), status: Optional[str] = Query(None),
+                 limit: int = Query(100, le=1000)):
+    _require_admin(secret)
+    return {"stats": outbox.stats(), "jobs": storage.list_outbox(status=status, limit=limit)}
+
+class OutboxRetryIn(BaseModel):
+    invoice_id: Optional[str] = None
+    ids: Optional[List[int]] = None
+
+@app.post("/api/admin/outbox/retry")
+def admin_outbox_retry(body: OutboxRetryIn, secret: Optional[str] = Query(None)):
+    """DEAD → PENDING. Tanpa invoice_id/ids = semua job DEAD."""
+    _require_admin(secret)
+    return {"ok": True, "revived": outbox.retry(invoice_id=body.invoice_id, ids=body.ids)}
+
+
+# >>> admin: rekonsiliasi feed donasi Saweria sekarang (webhook hilang → PAID)
+@app.post("/api/admin/reconcile")
+async def admin_reconcile(secret: Optional[str] = Query(None)):
+    _require_admin(secret)
+    if not reconcile.SAWERIA_FEED_URL:
+        raise HTTPException(400, "SAWERIA_FEED_URL belum di-set")
+    try:
+        result = await reconcile.run_once()
+    except Exception as e:
+        raise HTTPException(502, f"feed error: {e}")
+    return {"ok": True, **result, "stats": reconcile.stats()}
+
+
+# >>> timeline latency per invoice + laporan SLO (persentil antar tahap, ms)
+@app.get("/api/admin/invoice/{invoice_id}/timeline")
+def admin_invoice_timeline(invoice_id: str, secret: Optional[str] = Query(None)):
+    _require_admin(secret)
+    tl = timeline.get(invoice_id)
+    if not tl:
+        raise HTTPException(404, "Invoice not found")
+    return tl
 
+@app.get("/api/admin/slo")
+def admin_slo(secret: Optional[str] = Query(None),
+              window: int = Query(86400, ge=60, le=90 * 86400, description="detik ke belakang (created_at)")):
+    _require_admin(secret)
+    return timeline.report(window)
 
-# ------------- HEALTH / DEBUG -------------
+
+# ------------- HEALTH / METRICS / DEBUG -------------
 @app.get("/health")
 def health():
     return {"ok": True}
 
+
+def _runtime_metrics():
+    """Angka yang sudah dihitung modul lain → format Prometheus saat /metrics di-scrape."""
+    caches = [c.stats() for c in LRUCache.all()]
+    for metric, kind, key, help in (
+        ("cache_hits_total", "counter", "hits", "Cache hit per LRU"),
+        ("cache_misses_total", "counter", "misses", "Cache miss per LRU"),
+        ("cache_hit_ratio", "gauge", "hit_ratio", "hits / (hits + misses) sejak start"),
+        ("cache_items", "gauge", "items", "Entry di cache"),
+        ("cache_evictions_total", "counter", "evictions", "Entry dibuang karena batas"),
+    ):
+        yield metric, kind, help, [({"cache": c["name"]}, c[key]) for c in caches]
+    scraper = sys.modules.get("app.scraper")
+    yield "browser_up", "gauge", "Chromium sudah di-launch (1/0)", [({}, int(bool(scraper and scraper._BROWSER)))]
+    up = updates.stats()
+    yield "updates_queue_depth", "gauge", "Update Telegram menunggu worker", [({}, up["depth"])]
+    yield "updates_total", "counter", "Update Telegram per hasil", [
+        ({"result": k}, up[k]) for k in ("received", "processed", "duplicates", "rejected_full", "errors")
+    ]
+    yield "updates_lag_ms", "gauge", "Jeda terima → mulai diproses (EWMA)", [({}, up["lag_avg_ms"])]
+    yield "leader", "gauge", "Proses ini leader cluster (1/0)", [({}, int(cluster.is_leader()))]
+    if cluster.is_leader():
+        q = storage.outbox_stats()
+        yield "invite_outbox_jobs", "gauge", "Job undangan per status", [
+            ({"status": k}, q[k]) for k in ("PENDING", "SENDING", "SENT", "DEAD")
+        ]
+        yield "invite_outbox_oldest_pending_seconds", "gauge", "Umur job PENDING tertua", [({}, q.get("oldest_pending_s", 0))]
+        yield "invite_link_pool_free", "gauge", "Link undangan bebas per grup", [
+            ({"group": g}, n) for g, n in linkpool.stats()["levels"].items()
+        ]
+        rc = reconcile.stats()
+        yield "reconcile_donations_total", "counter", "Donasi feed Saweria per hasil rekonsiliasi", [
+            ({"result": k}, rc[k]) for k in ("paid", "already_paid", "unknown", "underpaid", "unmatched")
+        ]
+        yield "reconcile_errors_total", "counter", "Run rekonsiliasi yang gagal", [({}, rc["errors"])]
+
+
+metrics.register_collector(_runtime_metrics)
+app.add_middleware(metrics.RouteLatencyMiddleware)
+
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request, token: Optional[str] = Query(None)):
+    peer = request.client.host if request.client else None
+    if not metrics.authorized(token, request.headers.get("authorization"), peer):
+        raise HTTPException(403, "Forbidden")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if ENV != "prod":
     @app.get("/debug/invoices")
     def debug_invoices(limit: int = 20):
@@ -694,6 +850,46 @@ if ENV != "prod":
     def debug_invite_logs(invoice_id: str):
         return {"invoice_id": invoice_id, "logs": storage.list_invite_logs(invoice_id)}
 
+    @app.get("/debug/http-clients")
+    def debug_http_clients():
+        return httpclient.stats()
+
+    @app.get("/debug/linkpool")
+    def debug_linkpool():
+        return linkpool.stats()
+
+    @app.get("/debug/reconcile")
+    def debug_reconcile():
+        return reconcile.stats()
+
+    @app.get("/debug/ratelimit")
+    def debug_ratelimit():
+        return LIMITER.snapshot()
+
+    @app.get("/debug/updates")
+    def debug_updates():
+        return updates.stats()
+
+    @app.get("/debug/img-cache")
+    def debug_img_cache():
+        return thumbs.stats()
+
+    @app.get("/debug/cluster")
+    def debug_cluster():
+        return cluster.stats()
+
+    @app.get("/debug/admission")
+    def debug_admission():
+        return admission.stats()
+
+    @app.get("/debug/assets")
+    def debug_assets():
+        return assets.stats()
+
+    @app.get("/debug/startup")
+    def debug_startup():
+        return _BOOT
+
 # ---- DEBUG: tes HTTP fetch langsung (tanpa Chromium) ----
 @app.get("/debug/fetch-saweria")
 async def debug_fetch_saweria():
@@ -701,80 +897,147 @@ async def debug_fetch_saweria():
     if not username:
         raise HTTPException(400, "SAWERIA_USERNAME belum di-set")
     url = f"https://saweria.co/{username}"
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url, headers={
-            "User-Agent": ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                           "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36")
-        })
+    r = await httpclient.get(url, headers={
+        "User-Agent": ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+                       "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+    })
     return {"url": url, "status": r.status_code, "len": len(r.text), "snippet": r.text[:300]}
 
 # ---- DEBUG: ambil PNG dari Chromium (Playwright) ----
 @app.get("/debug/saweria-snap")
 async def debug_saweria_snap():
-    png = await debug_snapshot()
+    png = await _scraper().debug_snapshot()
     if not png:
         raise HTTPException(500, "Gagal snapshot (lihat logs)")
     return Response(content=png, media_type="image/png")
 
 @app.get("/debug/saweria-fill")
 async def debug_saweria_fill(invoice_id: str, amount: int = 25000, method: str = "gopay"):
-    png = await debug_fill_snapshot(invoice_id=invoice_id, amount=amount, method=method)
+    png = await _scraper().debug_fill_snapshot(invoice_id=invoice_id, amount=amount, method=method)
     if not png:
         raise HTTPException(500, "Gagal snapshot setelah pengisian form (lihat logs)")
     return Response(content=png, media_type="image/png")
 
 @app.get("/debug/saweria-pay")
 async def debug_saweria_pay(invoice_id: str, amount: int = 25000):
-    png = await fetch_gopay_checkout_png(invoice_id=invoice_id, amount=amount)
+    png = await _scraper().fetch_gopay_checkout_png(invoice_id=invoice_id, amount=amount)
     if not png:
         raise HTTPException(500, "Gagal menuju halaman pembayaran")
     return Response(content=png, media_type="image/png")
 
 @app.get("/debug/saweria-qr-hd")
 async def debug_saweria_qr_hd(invoice_id: str, amount: int = 25000):
-    png = await fetch_gopay_qr_hd_png(invoice_id=invoice_id, amount=amount)
+    png = await _scraper().fetch_gopay_qr_hd_png(invoice_id=invoice_id, amount=amount)
     if not png:
         raise HTTPException(500, "Gagal ambil QR HD")
     return Response(content=png, media_type="image/png")
 
 # ------------- STARTUP / SHUTDOWN -------------
-@app.on_event("startup")
-async def on_start():
-    await bot_app.initialize()
+BOOT_STEP_TIMEOUT = float(os.getenv("BOOT_STEP_TIMEOUT", "10"))  # detik per langkah bootstrap non-kritis
+PWR_PREWARM = os.getenv("PWR_PREWARM", "1") == "1"  # launch Chromium di background setelah siap
+_BOOT: dict = {}  # fase startup → ms (log + /debug/startup)
+_BG_TASKS: set = set()  # warmup background; referensi ditahan (GC) + di-cancel saat shutdown
 
-    # ⬇️ pasang GLOBAL chat menu & refresh commands (fix tombol beda tiap user)
+
+def _spawn(coro) -> asyncio.Task:
+    t = asyncio.create_task(coro)
+    _BG_TASKS.add(t)
+    t.add_done_callback(_BG_TASKS.discard)
+    return t
+
+
+async def _timed(name: str, aw, timeout: Optional[float] = None, critical: bool = False):
+    """Catat durasi 1 fase startup; langkah non-kritis dibatasi timeout dan tidak menggagalkan boot."""
+    t0 = time.perf_counter()
     try:
-        await install_global_menu_and_commands(bot_app.bot, BASE_URL)
+        if timeout:
+            return await asyncio.wait_for(aw, timeout)
+        return await aw
     except Exception as e:
-        print("[startup] install_global_menu_and_commands failed:", e)
+        if critical:
+            raise
+        kind = "timed out" if isinstance(e, asyncio.TimeoutError) else f"failed: {e}"
+        print(f"[startup] {name} {kind}")
+    finally:
+        _BOOT[name] = round((time.perf_counter() - t0) * 1000, 1)
 
-    if BASE_URL.startswith("https://"):
-        await bot_app.bot.set_webhook(
-            url=f"{BASE_URL}/telegram/webhook",
-            secret_token=WEBHOOK_SECRET or None,
-        )
-    else:
+
+async def _set_webhook():
+    if not BASE_URL.startswith("https://"):
         print("Skipping set_webhook: BASE_URL must start with https://")
+        return
+    await bot_app.bot.set_webhook(
+        url=f"{BASE_URL}/telegram/webhook",
+        secret_token=WEBHOOK_SECRET or None,
+        # chat_member TIDAK dikirim Telegram kecuali diminta eksplisit (index gate)
+        allowed_updates=Update.ALL_TYPES,
+    )
 
+
+async def _warm_catalog():
     # --- prewarm ImageKit folder cache (agar first load cepat) ---
-    try:
-        folders = []
-        for g in GROUPS:
-            fld = str(g.get("image_folder") or "").strip()
-            if fld:
-                p = _norm_folder_to_path(fld)
-                if p not in folders:
-                    folders.append(p)
-        if folders and IMAGEKIT_PRIVATE_KEY:
-            await asyncio.gather(*(_imagekit_list_files_by_path(p) for p in folders))
-            print(f"[startup] Prefetched ImageKit folders: {len(folders)}")
-    except Exception as e:
-        print("[startup] prewarm image folders failed:", e)
+    folders = _catalog_folders()
+    if folders and imagekit.IMAGEKIT_PRIVATE_KEY:
+        await _timed("warm.imagekit", imagekit.ensure(folders), timeout=60)
+    # --- prewarm metadata chat katalog + gate ---
+    gate_cfg = gate.load_env()
+    await _timed("warm.chats", chats.prewarm(
+        bot_check, [g["id"] for g in GROUPS] + gate_cfg["group_ids"] + gate_cfg["channel_ids"]
+    ), timeout=120)
+
 
-    await bot_app.start()
+async def _warm_browser():
+    # import Playwright di thread supaya event loop tetap melayani request
+    mod = await asyncio.to_thread(_scraper)
+    await _timed("warm.browser", mod.prewarm(), timeout=60)
+
+
+async def _leader_start():
+    """Bootstrap bot + job background boros call Telegram (hanya 1 proses/leader)."""
+    # langkah independen → paralel, masing-masing dengan timeout
+    # ⬇️ pasang GLOBAL chat menu & refresh commands (fix tombol beda tiap user)
+    await asyncio.gather(
+        _timed("menu_commands", install_global_menu_and_commands(bot_app.bot, BASE_URL), BOOT_STEP_TIMEOUT),
+        _timed("set_webhook", _set_webhook(), BOOT_STEP_TIMEOUT),
+    )
+    outbox.start(_deliver_invite, _invite_dead)
+    linkpool.start(bot_app.bot, [g["id"] for g in GROUPS])
+    reconcile.start()
+    # warmup non-kritis: background, tidak menahan readiness
+    _spawn(_warm_catalog())
+
+
+async def _leader_stop():
+    await reconcile.stop()
+    await linkpool.stop()
+    await outbox.stop()
+
+
+@app.on_event("startup")
+async def on_start():
+    t0 = time.perf_counter()
+    _BOOT["import"] = round((t0 - _T_IMPORT) * 1000, 1)
+    await _timed("init_db", asyncio.to_thread(storage.init_db), critical=True)
+    await _timed("assets", asyncio.to_thread(assets.build))
+    await _timed("bot.initialize", bot_app.initialize(), critical=True)
+    await _timed("bot.start", bot_app.start(), critical=True)
+    updates.start(bot_app)
+    # proses tunggal = langsung leader; multi-worker → hanya 1 yang bootstrap
+    await _timed("cluster", cluster.start(_leader_start, _leader_stop))
+    cluster.start_event_bridge(payments.get_status)
+    if PWR_PREWARM:
+        _spawn(_warm_browser())
+    _BOOT["ready"] = round((time.perf_counter() - t0) * 1000, 1)
+    print("[startup] ready: " + ", ".join(f"{k}={v}ms" for k, v in _BOOT.items()))
 
 
 @app.on_event("shutdown")
 async def on_stop():
+    for t in list(_BG_TASKS):
+        t.cancel()
+    await asyncio.gather(*_BG_TASKS, return_exceptions=True)
+    await cluster.stop()
+    await updates.stop()
     await bot_app.stop()
     await bot_app.shutdown()
+    await httpclient.close_all()
@@ -0,0 +1,222 @@
+# app/metrics.py
+# ------------------------------------------------------------
+# Registry metrik in-process (format teks Prometheus, tanpa dependency):
+# - Counter / Gauge / Histogram dengan label (tuple nilai, urutan tetap)
+# - collector: fungsi yang dipanggil saat /metrics di-scrape untuk angka
+#   yang sudah ada di modul lain (cache, outbox, pool link, queue update)
+# - ASGI middleware: latency per route FastAPI (template path, bukan URL mentah)
+# - timed(): decorator durasi + error per fungsi (dipakai storage.py)
+#
+# Murah untuk prod: observe = 1x bisect + 3 penjumlahan, tanpa lock
+# (single event loop). Semua angka per proses (multi-worker → per worker).
+#
+# ENV:
+#   METRICS_TOKEN=...          (wajib ?token= / Bearer bila di-set; tanpa token,
+#                               ENV=prod hanya melayani scrape dari localhost)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import functools
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+METRICS_PUBLIC = os.getenv("ENV", "dev") != "prod"  # tanpa token: dev terbuka, prod localhost saja
+LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+# detik; cukup rapat di bawah 100ms (route/SQLite) dan lebar sampai scraper (~60s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+# collector → [(name, type, help, [(labels, value), ...]), ...]
+Sample = Tuple[Dict[str, Any], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+_METRICS: List["_Metric"] = []
+_COLLECTORS: List[Callable[[], Iterable[Family]]] = []
+
+
+def _esc(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._series: Dict[tuple, Any] = {}
+        _METRICS.append(self)
+
+    def _labels(self, values: tuple) -> Dict[str, Any]:
+        return dict(zip(self.labelnames, values))
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, v in list(self._series.items()):
+            out.append(f"{self.name}{_fmt_labels(self._labels(values))} {_fmt_value(v)}")
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: Any) -> None:
+        self._series[labels] = value
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels: Any, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: Any) -> None:
+        s = self._series.get(labels)
+        if s is None:
+            # [count per bucket (non-kumulatif) ..., +Inf], sum, count
+            s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, n) in list(self._series.items()):
+            base = self._labels(values)
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_fmt_labels({**base, 'le': _fmt_value(le)})} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(base)} {total!r}")
+            out.append(f"{self.name}_count{_fmt_labels(base)} {n}")
+        return out
+
+
+def register_collector(fn: Callable[[], Iterable[Family]]) -> None:
+    _COLLECTORS.append(fn)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines.extend(m.render())
+    for fn in _COLLECTORS:
+        try:
+            families = list(fn())
+        except Exception as e:
+            print("[metrics] collector failed:", e)
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, v in samples:
+                if v is not None:
+                    lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+    return "\n".join(lines) + "\n"
+
+
+def authorized(token: Optional[str], authorization: Optional[str], peer: Optional[str] = None) -> bool:
+    """peer = IP socket (bukan X-Forwarded-For; header itu bisa dipalsukan)."""
+    if not METRICS_TOKEN:
+        return METRICS_PUBLIC or peer in LOOPBACK
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization[7:]
+    return token == METRICS_TOKEN
+
+
+# ---------- metrik hot path (dipakai lintas modul) ----------
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Waktu sampai header respons dikirim, per route", ("method", "route", "status"),
+)
+SCRAPER_RUNS = Histogram("scraper_run_seconds", "Durasi satu run scraper Playwright", ("kind", "outcome"))
+SCRAPER_INFLIGHT = Gauge("scraper_inflight", "Run scraper (generate QR) yang sedang berjalan")
+SCRAPER_INFLIGHT.set(0)
+TG_LATENCY = Histogram("telegram_api_seconds", "Latency call Bot API (termasuk antri rate limiter)", ("method",))
+TG_ERRORS = Counter("telegram_api_errors_total", "Call Bot API yang gagal", ("method", "error"))
+DB_LATENCY = Histogram("sqlite_call_seconds", "Durasi fungsi storage (SQLite)", ("fn",), buckets=DB_BUCKETS)
+DB_ERRORS = Counter("sqlite_errors_total", "Fungsi storage yang raise", ("fn",))
+
+
+def timed(hist: Histogram, errors: Optional[Counter] = None, label: Optional[str] = None):
+    """Decorator fungsi sync: durasi → hist{label}, exception → errors{label}."""
+    def deco(fn):
+        name = label or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(name)
+                raise
+            finally:
+                hist.observe(time.perf_counter() - t0, name)
+        return wrapper
+    return deco
+
+
+class RouteLatencyMiddleware:
+    """ASGI murni (tanpa BaseHTTPMiddleware): SSE/streaming tidak ikut di-buffer."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        started = False
+
+        def _observe(status: int) -> None:
+            # route diisi router FastAPI setelah match → label = template path;
+            # StaticFiles (mount) → root_path mount-nya, mis. "/webapp"
+            route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "(unmatched)"
+            HTTP_LATENCY.observe(time.perf_counter() - t0, scope["method"], route, status)
+
+        async def _send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                _observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except Exception:
+            if not started:
+                _observe(500)
+            raise
@@ -0,0 +1,158 @@
+# app/outbox.py
+# ------------------------------------------------------------
+# Worker pengiriman undangan dari tabel invite_outbox (SQLite):
+# - job dibuat storage.update_invoice_status(..., "PAID") dalam transaksi yang sama
+# - worker claim job jatuh tempo (atomik, dengan lease) → kirim → SENT
+# - gagal sementara → retry dengan backoff eksponensial
+# - gagal permanen / melewati OUTBOX_MAX_ATTEMPTS → DEAD (user diberi tahu)
+# - DEAD bisa dihidupkan lagi lewat retry() (endpoint admin)
+#
+# Restart di tengah kirim aman: job SENDING yang lease-nya habis diambil ulang.
+# stop() memberi job yang sedang jalan OUTBOX_STOP_GRACE_S untuk selesai, sisanya
+# di-cancel (tetap SENDING → diambil ulang setelah lease habis).
+#
+# ENV:
+#   OUTBOX_WORKERS=4           (opsional; job diproses bersamaan)
+#   OUTBOX_MAX_ATTEMPTS=6      (opsional; sebelum DEAD)
+#   OUTBOX_BACKOFF_S=5         (opsional; detik, dikali 2^(attempt-1), maks 600)
+#   OUTBOX_LEASE_S=120         (opsional; detik sebelum job SENDING dianggap macet)
+#   OUTBOX_POLL_S=2            (opsional; interval cek job jatuh tempo)
+#   OUTBOX_STOP_GRACE_S=5      (opsional; detik menunggu job berjalan saat stop)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from telegram.error import BadRequest, Forbidden
+
+from . import storage
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_S = float(os.getenv("OUTBOX_BACKOFF_S", "5"))
+OUTBOX_BACKOFF_MAX_S = 600
+OUTBOX_LEASE_S = int(os.getenv("OUTBOX_LEASE_S", "120"))
+OUTBOX_POLL_S = float(os.getenv("OUTBOX_POLL_S", "2"))
+OUTBOX_STOP_GRACE_S = float(os.getenv("OUTBOX_STOP_GRACE_S", "5"))
+
+# deliver(user_id, group_id, invoice_id) → link undangan yang dikirim; raise bila gagal
+# on_dead(user_id, group_id, invoice_id) → beri tahu user
+Deliver = Callable[[int, str, str], Awaitable[Any]]
+
+_WAKE: Optional[asyncio.Event] = None
+_TASKS: List[asyncio.Task] = []
+_RUNNING: Set[asyncio.Task] = set()  # _process yang sedang jalan
+_STATS: Dict[str, int] = {"sent": 0, "failed": 0, "dead": 0, "in_flight": 0}
+
+
+def _backoff(attempts: int) -> int:
+    return int(min(OUTBOX_BACKOFF_MAX_S, OUTBOX_BACKOFF_S * (2 ** max(0, attempts - 1))))
+
+
+def _permanent(e: Exception) -> bool:
+    """Bot diblokir user / chat tidak ada → retry tidak akan menolong."""
+    if isinstance(e, Forbidden):
+        return True
+    return isinstance(e, BadRequest) and "not found" in str(e).lower()
+
+
+async def _process(job: Dict[str, Any], deliver: Deliver, on_dead: Optional[Deliver]) -> None:
+    _STATS["in_flight"] += 1
+    try:
+        link = await deliver(job["user_id"], job["group_id"], job["invoice_id"])
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"
+        dead = _permanent(e) or job["attempts"] >= OUTBOX_MAX_ATTEMPTS
+        storage.outbox_fail(job["id"], err, None if dead else int(time.time()) + _backoff(job["attempts"]))
+        storage.add_invite_log(job["invoice_id"], job["group_id"], None, err)
+        if dead:
+            _STATS["dead"] += 1
+            print(f"[outbox] job {job['id']} DEAD after {job['attempts']} attempts: {err}")
+            if on_dead:
+                try:
+                    await on_dead(job["user_id"], job["group_id"], job["invoice_id"])
+                except Exception as e2:
+                    print("[outbox] on_dead failed:", e2)
+        else:
+            _STATS["failed"] += 1
+        return
+    finally:
+        _STATS["in_flight"] -= 1
+    storage.outbox_done(job["id"])
+    storage.add_invite_log(job["invoice_id"], job["group_id"], link or "(sent)", None)
+    _STATS["sent"] += 1
+
+
+async def _loop(deliver: Deliver, on_dead: Optional[Deliver]) -> None:
+    running = _RUNNING
+    while True:
+        _WAKE.clear()
+        free = OUTBOX_WORKERS - len(running)
+        jobs: List[Dict[str, Any]] = []
+        if free > 0:
+            try:
+                jobs = storage.claim_outbox(free, OUTBOX_LEASE_S)
+            except Exception as e:
+                print("[outbox] claim failed:", e)
+        for job in jobs:
+            t = asyncio.create_task(_process(job, deliver, on_dead))
+            running.add(t)
+            t.add_done_callback(running.discard)
+        if running and len(running) >= OUTBOX_WORKERS:
+            # semua slot terpakai; claim lagi begitu ada yang selesai
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        try:
+            await asyncio.wait_for(_WAKE.wait(), OUTBOX_POLL_S)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start(deliver: Deliver, on_dead: Optional[Deliver] = None) -> None:
+    """Dipanggil di on_start (setelah bot siap)."""
+    global _WAKE
+    if _TASKS:
+        return
+    _WAKE = asyncio.Event()
+    _TASKS.append(asyncio.create_task(_loop(deliver, on_dead)))
+    print(f"[outbox] started ({OUTBOX_WORKERS} workers)")
+
+
+async def stop() -> None:
+    for t in _TASKS:
+        t.cancel()
+    await asyncio.gather(*_TASKS, return_exceptions=True)
+    _TASKS.clear()
+    running = list(_RUNNING)
+    if running:
+        _, pending = await asyncio.wait(running, timeout=OUTBOX_STOP_GRACE_S)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if pending:
+            print(f"[outbox] cancelled {len(pending)} in-flight jobs (retried after lease)")
+
+
+def wake() -> None:
+    """Bangunkan worker sekarang (mis. tepat setelah invoice ditandai PAID)."""
+    if _WAKE is not None:
+        _WAKE.set()
+
+
+def retry(invoice_id: Optional[str] = None, ids: Optional[List[int]] = None) -> int:
+    n = storage.outbox_retry(invoice_id=invoice_id, ids=ids)
+    if n:
+        wake()
+    return n
+
+
+def busy() -> bool:
+    return _STATS["in_flight"] > 0
+
+
+def stats() -> Dict[str, Any]:
+    return {"queue": storage.outbox_stats(), "workers": OUTBOX_WORKERS, **_STATS}
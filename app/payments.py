@@ -5,17 +5,17 @@
 # - membaca status
 # - menandai PAID
 # - (opsional) generate QR HD di background dan cache ke DB
+#   (yang disimpan: string QRIS hasil decode; fallback data URL PNG)
 # ------------------------------------------------------------
 
 from __future__ import annotations
 
 import asyncio
 import base64
-import json, time, uuid
+import json, re, time, uuid
 from typing import Any, Dict, List, Optional
 
-from . import storage
-from .scraper import fetch_gopay_qr_hd_png
+from . import events, qris, storage, timeline
 
 
 # ---------- util: panggil fungsi storage yang mungkin beda nama ----------
@@ -98,12 +98,8 @@ def get_invoice(invoice_id: str) -> Optional[Dict[str, Any]]:
     return _storage_get_invoice(invoice_id)
 
 
-def get_status(invoice_id: str) -> Optional[Dict[str, Any]]:
-    inv = _storage_get_invoice(invoice_id)
-    if not inv:
-        return None
-
-    # Normalisasi field agar stabil untuk API /api/invoice/{id}/status
+def _status_from_row(invoice_id: str, inv: Dict[str, Any]) -> Dict[str, Any]:
+    # Normalisasi field agar stabil untuk API /api/invoice/{id}/status (+ SSE)
     status = (inv.get("status") or "PENDING").upper()
     payload = inv.get("qris_payload") or inv.get("qr_payload")
 
@@ -115,29 +111,95 @@ def get_status(invoice_id: str) -> Optional[Dict[str, Any]]:
     }
 
 
+def get_status(invoice_id: str) -> Optional[Dict[str, Any]]:
+    inv = _storage_get_invoice(invoice_id)
+    if not inv:
+        return None
+    return _status_from_row(invoice_id, inv)
+
+
 def mark_paid(invoice_id: str) -> Optional[Dict[str, Any]]:
     updated = _storage_update_status(invoice_id, "PAID")
     # kalau storage tidak mengembalikan row terbaru, coba ambil lagi
-    return updated or _storage_get_invoice(invoice_id)
+    inv = updated or _storage_get_invoice(invoice_id)
+    if inv:
+        events.publish(invoice_id, "status", _status_from_row(invoice_id, inv))
+    return inv
+
+
+# pesan donasi Saweria berisi "INV:<uuid>" (diisi scraper saat generate QR)
+INV_RE = re.compile(r"(?:^|\b)INV[:\s]*([0-9a-fA-F-]{36})\b")
+
+
+def invoice_id_from_message(msg: Any) -> Optional[str]:
+    m = INV_RE.search(str(msg or ""))
+    return m.group(1) if m else None
+
+
+def paid_amount(d: Dict[str, Any]) -> Optional[int]:
+    """Nominal donasi (webhook / feed Saweria); None bila tidak ada di payload."""
+    for key in ("amount_raw", "amount"):
+        try:
+            return int(float(d[key]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def underpaid(inv: Dict[str, Any], paid: Optional[int]) -> bool:
+    """Aturan nominal yang sama untuk webhook dan rekonsiliasi: nominal yang
+    diketahui harus >= nominal invoice (tanpa nominal → dipercaya)."""
+    want = inv.get("amount")
+    return paid is not None and bool(want) and paid < int(want)
 
 
 def list_invoices(limit: int = 20) -> List[Dict[str, Any]]:
     return _storage_list_invoices(limit)
 
 
+# ---------- simpan QR hasil scrape ----------
+async def save_qr(invoice_id: str, *, payload: Optional[str] = None, png: Optional[bytes] = None) -> Optional[str]:
+    """
+    Simpan string QRIS saja. Bila belum ada string (mis. QR tertangkap sebagai PNG),
+    decode PNG sekali lalu verifikasi. Bila decoder tidak tersedia / gagal →
+    simpan PNG asli sebagai data URL (legacy).
+    Return: nilai yang tersimpan di kolom qris_payload (None bila gagal simpan).
+    Decode (OpenCV) + render (PIL) jalan di thread, tidak memblok event loop.
+    """
+    if not qris.is_valid_payload(payload) and png:
+        payload = await asyncio.to_thread(qris.decode_png, png)
+    if not qris.is_valid_payload(payload):
+        if not png:
+            return None
+        print(f"[payments] QRIS decode failed for {invoice_id}; storing PNG data URL")
+        payload = "data:image/png;base64," + base64.b64encode(png).decode()
+    try:
+        _storage_update_qr_payload(invoice_id, payload)
+    except Exception as e:
+        print("[payments] update qris_payload failed:", e)
+        return None
+    try:
+        await qris.prime(invoice_id, payload)
+    except Exception as e:
+        print("[payments] prime QR cache failed:", e)
+    events.publish(invoice_id, "qr", {"invoice_id": invoice_id, "has_qr": True})
+    return payload
+
+
 # ---------- background QR prewarm ----------
 async def _bg_generate_qr(invoice_id: str, amount: int) -> None:
     """
-    Ambil QR HD via scraper dan simpan sebagai data URL ke DB.
+    Ambil QR via scraper dan simpan string QRIS-nya ke DB.
     Supaya /api/qr/{id} bisa cepat melayani request berikutnya.
     """
+    from .scraper import fetch_gopay_qr  # lazy: Playwright tidak di-import saat boot
     try:
-        message = f"INV:{invoice_id}"
-        png = await fetch_gopay_qr_hd_png(amount, message)
-        if not png:
+        timeline.mark(invoice_id, "qr_started")
+        cap = await fetch_gopay_qr(invoice_id=invoice_id, amount=amount)
+        timeline.mark(invoice_id, "qr_done" if cap else "qr_failed")
+        if not cap:
             return
-        b64 = base64.b64encode(png).decode()
-        _storage_update_qr_payload(invoice_id, f"data:image/png;base64,{b64}")
+        await save_qr(invoice_id, payload=cap.get("qris"), png=cap.get("png"))
     except Exception:
         # diamkan; logging sudah cukup dari layer scraper
         return
@@ -0,0 +1,263 @@
+# app/qris.py
+# ------------------------------------------------------------
+# Helper QRIS:
+# - decode string QRIS dari PNG hasil scrape (cukup SEKALI per invoice)
+# - verifikasi format EMV (TLV) + CRC16 pada tag 63
+# - render ulang QR (PNG / SVG) sesuai ukuran yang diminta (di-cache)
+#
+# Decoder QR bersifat opsional (opencv-python-headless atau pyzbar).
+# Bila tidak tersedia, decode_png() -> None dan caller fallback ke PNG asli.
+# QRCodeDetector sering gagal di QR tajam besar (≥512px, nearest-scaled) →
+# retry di salinan yang diperkecil (~QR_DECODE_RETRY_PX, INTER_AREA), lalu
+# dengan QRCodeDetectorAruco (opencv ≥ 4.8) sebelum menyerah.
+# Cek: python bench/bench_qr.py (round-trip render → decode, termasuk 720px).
+#
+# Semua akses cache gambar (_IMAGES, LRUCache tanpa lock) di event loop;
+# hanya render() (PIL) yang dijalankan di thread (lihat image_for/prime).
+#
+# ENV:
+#   QR_DEFAULT_SIZE=720        (opsional; px)
+#   QR_RENDER_CACHE_SIZE=256   (opsional; jumlah varian render di memori)
+#   QR_IMAGE_CACHE_MB=32       (opsional; LRU bytes gambar per invoice + ETag)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import os
+from functools import lru_cache
+from typing import Optional
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+
+from .cache import LRUCache
+
+# decoder (opencv utama, pyzbar cadangan) di-import saat decode pertama:
+# opencv+numpy ≈ 100ms+ import, tidak perlu menahan startup
+_DECODERS: Optional[tuple] = None
+
+
+def _decoders() -> tuple:
+    global _DECODERS
+    if _DECODERS is None:
+        try:
+            import cv2  # type: ignore
+            import numpy as np  # type: ignore
+        except Exception:  # pragma: no cover - dependency opsional
+            cv2 = np = None
+        try:
+            from pyzbar import pyzbar  # type: ignore
+        except Exception:  # pragma: no cover - dependency opsional
+            pyzbar = None
+        _DECODERS = (cv2, np, pyzbar)
+    return _DECODERS
+
+
+def can_decode() -> bool:
+    cv2, _, pyzbar = _decoders()
+    return cv2 is not None or pyzbar is not None
+
+QR_MIN_SIZE = 128
+QR_MAX_SIZE = 2048
+QR_SIZE_STEP = 64  # bulatkan ukuran supaya varian cache tidak meledak
+QR_BORDER = 4
+QR_DEFAULT_SIZE = int(os.getenv("QR_DEFAULT_SIZE", "720"))
+QR_RENDER_CACHE_SIZE = int(os.getenv("QR_RENDER_CACHE_SIZE", "256"))
+QR_DECODE_RETRY_PX = 360  # sisi salinan diperkecil untuk retry decode opencv
+QR_IMAGE_CACHE_BYTES = int(float(os.getenv("QR_IMAGE_CACHE_MB", "32")) * 1024 * 1024)
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+# ---------- verifikasi ----------
+def _crc16_ccitt(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if (crc & 0x8000) else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def is_valid_payload(payload: Optional[str]) -> bool:
+    """Cek struktur TLV EMV-QR + CRC (tag 63 wajib paling akhir)."""
+    if not payload or not payload.startswith("000201"):
+        return False
+    i, n = 0, len(payload)
+    while i < n:
+        if i + 4 > n:
+            return False
+        tag, ln = payload[i:i + 2], payload[i + 2:i + 4]
+        if not (tag.isdigit() and ln.isdigit()):
+            return False
+        end = i + 4 + int(ln)
+        if end > n:
+            return False
+        if tag == "63":
+            if end != n or int(ln) != 4:
+                return False
+            expected = f"{_crc16_ccitt(payload[:i + 4].encode('ascii', 'replace')):04X}"
+            return payload[i + 4:end].upper() == expected
+        i = end
+    return False
+
+
+def is_payload(value: Optional[str]) -> bool:
+    """True bila value di DB berupa string QRIS (bukan data URL legacy)."""
+    return bool(value) and not value.startswith("data:")
+
+
+# ---------- decode ----------
+def _cv2_variants(cv2, img) -> list:
+    """Gambar asli + salinan diperkecil (bila lebih besar dari QR_DECODE_RETRY_PX)."""
+    h, w = img.shape[:2]
+    if max(h, w) <= QR_DECODE_RETRY_PX:
+        return [img]
+    s = QR_DECODE_RETRY_PX / max(h, w)
+    return [img, cv2.resize(img, (max(1, round(w * s)), max(1, round(h * s))), interpolation=cv2.INTER_AREA)]
+
+
+def _cv2_decode(cv2, img) -> Optional[str]:
+    detectors = [cv2.QRCodeDetector()]
+    if hasattr(cv2, "QRCodeDetectorAruco"):
+        detectors.append(cv2.QRCodeDetectorAruco())
+    variants = _cv2_variants(cv2, img)
+    for detector in detectors:
+        for candidate in variants:
+            text, _, _ = detector.detectAndDecode(candidate)
+            if text:
+                return text
+    return None
+
+
+def decode_png(png: bytes) -> Optional[str]:
+    """Decode string QRIS dari bytes PNG. None bila gagal / decoder tidak ada."""
+    if not png:
+        return None
+    text: Optional[str] = None
+    cv2, np, pyzbar = _decoders()
+    try:
+        if cv2 is not None:
+            img = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                text = _cv2_decode(cv2, img)
+        if not text and pyzbar is not None:
+            from PIL import Image
+            found = pyzbar.decode(Image.open(io.BytesIO(png)))
+            if found:
+                text = found[0].data.decode("utf-8", "replace")
+    except Exception as e:
+        print("[qris] decode error:", e)
+        return None
+    text = (text or "").strip()
+    return text if is_valid_payload(text) else None
+
+
+# ---------- render ----------
+def normalize_size(size: Optional[int]) -> int:
+    s = int(size or QR_DEFAULT_SIZE)
+    s = max(QR_MIN_SIZE, min(QR_MAX_SIZE, s))
+    return (s + QR_SIZE_STEP - 1) // QR_SIZE_STEP * QR_SIZE_STEP
+
+
+def _matrix(payload: str) -> list[list[bool]]:
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=QR_BORDER, box_size=1)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.get_matrix()  # sudah termasuk border
+
+
+def _render_png(payload: str, size: int) -> bytes:
+    from PIL import Image
+    matrix = _matrix(payload)
+    n = len(matrix)
+    img = Image.new("1", (n, n), 1)
+    px = img.load()
+    for y, row in enumerate(matrix):
+        for x, dark in enumerate(row):
+            if dark:
+                px[x, y] = 0
+    # kelipatan bulat per modul → tepi tetap tajam
+    scale = max(1, size // n)
+    img = img.resize((n * scale, n * scale), Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def _render_svg(payload: str, size: int) -> bytes:
+    matrix = _matrix(payload)
+    n = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < n:
+            if row[x]:
+                start = x
+                while x < n and row[x]:
+                    x += 1
+                path.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        f'<rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    )
+    return svg.encode()
+
+
+@lru_cache(maxsize=QR_RENDER_CACHE_SIZE)
+def render(payload: str, fmt: str = "png", size: int = QR_DEFAULT_SIZE) -> bytes:
+    """Render QR dari string QRIS. Hasil di-cache per (payload, fmt, size)."""
+    if fmt == "svg":
+        return _render_svg(payload, size)
+    return _render_png(payload, size)
+
+
+# ---------- cache gambar per invoice (tanpa SQLite / base64 saat hit) ----------
+# key: (invoice_id, fmt, size) → (body, etag)
+_IMAGES = LRUCache(
+    "qr_images", max_items=8192, max_bytes=QR_IMAGE_CACHE_BYTES, sizeof=lambda v: len(v[0])
+)
+
+
+def etag_for(body: bytes) -> str:
+    """ETag kuat (hash konten)."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def cached_image(invoice_id: str, fmt: str, size: int) -> Optional[tuple[bytes, str]]:
+    return _IMAGES.get((invoice_id, fmt, size))
+
+
+def store_image(invoice_id: str, fmt: str, size: int, body: bytes) -> tuple[bytes, str]:
+    ent = (body, etag_for(body))
+    _IMAGES.set((invoice_id, fmt, size), ent)
+    return ent
+
+
+async def image_for(invoice_id: str, payload: str, fmt: str, size: int) -> tuple[bytes, str]:
+    """Render (atau ambil cache) gambar QR untuk invoice + simpan ke LRU.
+    Render PIL di thread; get/set _IMAGES tetap di event loop."""
+    hit = cached_image(invoice_id, fmt, size)
+    if hit:
+        return hit
+    body = await asyncio.to_thread(render, payload, fmt, size)
+    return store_image(invoice_id, fmt, size, body)
+
+
+async def prime(invoice_id: str, payload: str) -> None:
+    """Dipanggil saat QR disimpan: siapkan varian default supaya hit pertama cepat."""
+    _IMAGES.pop_where(lambda k: k[0] == invoice_id)
+    if is_valid_payload(payload):
+        await image_for(invoice_id, payload, "png", normalize_size(QR_DEFAULT_SIZE))
+
+
+def image_cache_stats() -> dict:
+    return _IMAGES.stats()
@@ -0,0 +1,187 @@
+# app/ratelimit.py
+# ------------------------------------------------------------
+# Rate limiter global untuk SEMUA call Bot API (bot_app.bot + bot_check):
+# - token bucket global (default 30 req/detik, batas broadcast Telegram)
+#   untuk method tulis (send/edit/copy/forward/createChatInviteLink/...)
+# - method baca (getChatMember/getChat/...) punya budget sendiri, sehingga
+#   gate/cek member yang ramai tidak menghabiskan jatah kirim pesan
+# - token bucket per chat untuk method kirim pesan:
+#     private chat ≈ 1 msg/detik (burst kecil), grup ≈ 20 msg/menit
+# - RetryAfter dari Telegram → SEMUA request berhenti sampai waktunya habis,
+#   lalu request yang kena di-retry (maks TG_MAX_RETRIES)
+#
+# Dipasang lewat Application.builder().rate_limiter(LIMITER) dan
+# ExtBot(..., rate_limiter=LIMITER) — satu instance, satu budget.
+#
+# ENV:
+#   TG_GLOBAL_RATE=30          (opsional; request/detik, method tulis)
+#   TG_READ_RATE=30            (opsional; request/detik, method get*)
+#   TG_PRIVATE_RATE=1          (opsional; pesan/detik per private chat)
+#   TG_PRIVATE_BURST=3         (opsional)
+#   TG_GROUP_RATE_PER_MIN=20   (opsional; pesan/menit per grup/channel)
+#   TG_MAX_RETRIES=2           (opsional; retry setelah RetryAfter)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from . import metrics
+from .cache import LRUCache
+
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_READ_RATE = float(os.getenv("TG_READ_RATE", "30"))
+TG_PRIVATE_RATE = float(os.getenv("TG_PRIVATE_RATE", "1"))
+TG_PRIVATE_BURST = float(os.getenv("TG_PRIVATE_BURST", "3"))
+TG_GROUP_RATE = float(os.getenv("TG_GROUP_RATE_PER_MIN", "20")) / 60.0
+TG_GROUP_BURST = 3.0
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "2"))
+
+# method yang tidak dihitung (setup / bukan ke chat)
+EXEMPT = {"getMe", "getUpdates", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+
+
+def _is_read(endpoint: str) -> bool:
+    """getChatMember/getChat/getFile/... → budget baca, bukan budget kirim."""
+    return endpoint.startswith("get")
+
+
+def _is_per_chat(endpoint: str) -> bool:
+    """Method yang memunculkan pesan di chat → kena limit per chat."""
+    return endpoint.startswith(("send", "copyMessage", "forwardMessage"))
+
+
+class TokenBucket:
+    """Bucket berbasis reservasi: reserve() langsung ambil token, return detik tunggu."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now: float) -> float:
+        """Non-blocking (admission): ambil token bila ada → 0, else detik sampai tersedia."""
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    def __init__(self):
+        self._global = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self._reads = TokenBucket(TG_READ_RATE, TG_READ_RATE)
+        self._chats = LRUCache("tg_chat_buckets", max_items=20_000)
+        self._paused_until = 0.0
+        self.stats: Dict[str, Any] = {
+            "requests": 0, "throttled": 0, "wait_s_total": 0.0, "retry_after": 0,
+            "retry_after_s_total": 0.0, "gave_up": 0, "by_method": {},
+        }
+
+    async def initialize(self) -> None:
+        pass  # dipakai bersama beberapa bot; tidak ada resource yang perlu dibuka
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        key = str(chat_id)
+        b = self._chats.get(key, count=False)
+        if b is None:
+            private = not key.startswith("-") and not key.startswith("@")
+            b = TokenBucket(TG_PRIVATE_RATE, TG_PRIVATE_BURST) if private else TokenBucket(TG_GROUP_RATE, TG_GROUP_BURST)
+            self._chats.set(key, b)
+        return b
+
+    async def _acquire(self, endpoint: str, chat_id: Any) -> None:
+        now = time.monotonic()
+        wait = (self._reads if _is_read(endpoint) else self._global).reserve(now)
+        if chat_id is not None and _is_per_chat(endpoint):
+            wait = max(wait, self._chat_bucket(chat_id).reserve(now))
+        if wait > 0:
+            self.stats["throttled"] += 1
+            self.stats["wait_s_total"] = round(self.stats["wait_s_total"] + wait, 3)
+            await asyncio.sleep(wait)
+        # jeda global karena RetryAfter (bisa muncul saat kita menunggu)
+        while self._paused_until > time.monotonic():
+            await asyncio.sleep(self._paused_until - time.monotonic())
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        t0 = time.perf_counter()
+        try:
+            return await self._call(callback, args, kwargs, endpoint, data, rate_limit_args)
+        except Exception as e:
+            metrics.TG_ERRORS.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            metrics.TG_LATENCY.observe(time.perf_counter() - t0, endpoint)
+
+    async def _call(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in EXEMPT:
+            return await callback(*args, **kwargs)
+        max_retries = TG_MAX_RETRIES if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+        by_method = self.stats["by_method"]
+        by_method[endpoint] = by_method.get(endpoint, 0) + 1
+        attempt = 0
+        while True:
+            await self._acquire(endpoint, chat_id)
+            self.stats["requests"] += 1
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                raw = getattr(e, "retry_after", 1) or 1
+                delay = float(raw.total_seconds() if hasattr(raw, "total_seconds") else raw)
+                self.stats["retry_after"] += 1
+                self.stats["retry_after_s_total"] = round(self.stats["retry_after_s_total"] + delay, 3)
+                # flood control Telegram berlaku untuk bot → jeda SEMUA request
+                self._paused_until = max(self._paused_until, time.monotonic() + delay + 0.1)
+                print(f"[ratelimit] RetryAfter {delay}s on {endpoint} (chat {chat_id})")
+                if attempt >= max_retries:
+                    self.stats["gave_up"] += 1
+                    raise
+                attempt += 1
+
+    def idle(self, min_headroom: float = 0.8) -> bool:
+        """True bila tidak sedang dijeda dan bucket global hampir penuh (periode sepi)."""
+        now = time.monotonic()
+        if self._paused_until > now:
+            return False
+        g = self._global
+        tokens = min(g.burst, g.tokens + (now - g.ts) * g.rate)
+        return tokens >= g.burst * min_headroom
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            "global_tokens": round(self._global.tokens, 2),
+            "read_tokens": round(self._reads.tokens, 2),
+            "tracked_chats": len(self._chats),
+        }
+
+
+LIMITER = TelegramRateLimiter()
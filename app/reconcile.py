@@ -0,0 +1,212 @@
+# app/reconcile.py
+# ------------------------------------------------------------
+# Rekonsiliasi pembayaran dengan feed donasi Saweria (jaring pengaman bila
+# webhook hilang/ditolak → invoice tidak selamanya PENDING):
+# - tiap RECONCILE_INTERVAL detik ambil donasi terbaru per halaman
+#   (terbaru dulu) dari feed dashboard yang ter-autentikasi
+# - cocokkan pesan "INV:<uuid>" ke invoice yang belum PAID, nominal minimal
+#   sebesar invoice (payments.underpaid) → tandai PAID lewat jalur yang sama
+#   dengan webhook
+#   (payments.mark_paid: job undangan di transaksi yang sama → outbox.wake)
+# - watermark (waktu donasi terbaru yang sudah diproses) di SQLite (tabel kv);
+#   run berikutnya berhenti paging begitu lewat watermark - RECONCILE_OVERLAP_S
+#   (overlap aman: mark_paid idempoten, invoice PAID di-skip)
+# - lebih dari RECONCILE_MAX_PAGES halaman baru → watermark TIDAK maju; run
+#   berikutnya melanjutkan dari halaman berikutnya (resume_page) sampai
+#   watermark tercapai, baru watermark dinaikkan ke donasi terbaru yang dilihat
+# - hanya leader cluster yang menjalankan (lihat app/main.py _leader_start)
+#
+# Bentuk feed yang diterima: list donasi, atau {"data": [...]} /
+# {"data": {"donations": [...]}}; tiap donasi punya id, message, amount
+# (atau amount_raw) dan created_at (epoch detik/ms atau ISO-8601).
+#
+# ENV:
+#   SAWERIA_FEED_URL=https://backend.saweria.co/donations   (kosong = nonaktif)
+#   SAWERIA_FEED_AUTH=...          (opsional; nilai header Authorization dashboard)
+#   RECONCILE_INTERVAL=60          (opsional; detik antar run)
+#   RECONCILE_PAGE_SIZE=50         (opsional; donasi per halaman)
+#   RECONCILE_MAX_PAGES=10         (opsional; batas halaman per run)
+#   RECONCILE_OVERLAP_S=300        (opsional; donasi telat masuk feed tetap terbaca)
+#   RECONCILE_LOOKBACK_S=86400     (opsional; jangkauan run pertama tanpa watermark)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from . import httpclient, outbox, payments, storage, timeline
+
+SAWERIA_FEED_URL = os.getenv("SAWERIA_FEED_URL", "").strip()
+SAWERIA_FEED_AUTH = os.getenv("SAWERIA_FEED_AUTH", "").strip()
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "60"))
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "50"))
+RECONCILE_MAX_PAGES = int(os.getenv("RECONCILE_MAX_PAGES", "10"))
+RECONCILE_OVERLAP_S = int(os.getenv("RECONCILE_OVERLAP_S", "300"))
+RECONCILE_LOOKBACK_S = int(os.getenv("RECONCILE_LOOKBACK_S", "86400"))
+KV_WATERMARK = "reconcile:watermark"
+
+if SAWERIA_FEED_URL:
+    httpclient.configure_host(urlsplit(SAWERIA_FEED_URL).hostname or "", timeout=15, retries=2)
+
+_TASK: Optional[asyncio.Task] = None
+_WAKE: Optional[asyncio.Event] = None
+_LOCK = asyncio.Lock()
+_STATS: Dict[str, Any] = {
+    "runs": 0, "donations": 0, "paid": 0, "already_paid": 0, "unknown": 0,
+    "underpaid": 0, "unmatched": 0, "errors": 0, "last_run_at": None, "last_error": None,
+}
+
+
+def _ts(v: Any) -> Optional[float]:
+    """created_at feed → epoch detik (None bila tidak terbaca)."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)) or str(v).isdigit():
+        x = float(v)
+        return x / 1000 if x > 1e11 else x
+    try:
+        dt = datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _donations(body: Any) -> List[Dict[str, Any]]:
+    data = body.get("data", body) if isinstance(body, dict) else body
+    if isinstance(data, dict):
+        data = data.get("donations") or data.get("items") or []
+    return [d for d in (data or []) if isinstance(d, dict)]
+
+
+async def _fetch_page(page: int) -> List[Dict[str, Any]]:
+    headers = {"Accept": "application/json"}
+    if SAWERIA_FEED_AUTH:
+        headers["Authorization"] = SAWERIA_FEED_AUTH
+    r = await httpclient.get(
+        SAWERIA_FEED_URL, params={"page": page, "page_size": RECONCILE_PAGE_SIZE}, headers=headers,
+    )
+    r.raise_for_status()
+    return _donations(r.json())
+
+
+async def _fetch_new(since: float, first_page: int = 1) -> tuple:
+    """Donasi dengan created_at >= since mulai first_page (paging sampai lewat
+    since) → (list, halaman lanjutan bila terpotong else None)."""
+    out: List[Dict[str, Any]] = []
+    for page in range(first_page, first_page + RECONCILE_MAX_PAGES):
+        batch = await _fetch_page(page)
+        for d in batch:
+            ts = _ts(d.get("created_at"))
+            if ts is not None and ts < since:
+                return out, None
+            out.append(d)
+        if len(batch) < RECONCILE_PAGE_SIZE:
+            return out, None
+    return out, first_page + RECONCILE_MAX_PAGES
+
+
+def _apply(d: Dict[str, Any]) -> str:
+    """Satu donasi → hasil ("paid", "already_paid", "unknown", "underpaid", "unmatched")."""
+    invoice_id = payments.invoice_id_from_message(d.get("message"))
+    if not invoice_id:
+        return "unmatched"
+    inv = payments.get_invoice(invoice_id)
+    if not inv:
+        return "unknown"
+    if (inv.get("status") or "").upper() == "PAID":
+        return "already_paid"
+    got = payments.paid_amount(d)
+    if payments.underpaid(inv, got):
+        print(f"[reconcile] {invoice_id}: donation {d.get('id')} Rp{got} < invoice Rp{inv.get('amount')}, skip")
+        return "underpaid"
+    timeline.mark(invoice_id, "reconciled")
+    payments.mark_paid(invoice_id)
+    print(f"[reconcile] {invoice_id} PAID from donation {d.get('id')} (webhook missed)")
+    return "paid"
+
+
+async def run_once() -> Dict[str, Any]:
+    """Satu putaran rekonsiliasi; dipanggil loop leader atau endpoint admin."""
+    if not SAWERIA_FEED_URL:
+        return {"enabled": False}
+    async with _LOCK:
+        wm = storage.kv_get(KV_WATERMARK) or {}
+        wm_ts = float(wm.get("ts") or time.time() - RECONCILE_LOOKBACK_S)
+        resume = int(wm.get("resume_page") or 1)
+        items, next_page = await _fetch_new(wm_ts - RECONCILE_OVERLAP_S, resume)
+        truncated = next_page is not None
+        result: Dict[str, int] = {}
+        for d in reversed(items):  # terlama dulu; di loop (events.publish tidak thread-safe)
+            key = _apply(d)
+            result[key] = result.get(key, 0) + 1
+            _STATS[key] += 1
+        if result.get("paid"):
+            outbox.wake()
+        seen = [t for t in (_ts(d.get("created_at")) for d in items) if t is not None]
+        # terbaru yang dilihat sejak backlog ini dimulai (halaman 1 run pertama)
+        newest = max(seen + [float(wm.get("pending_ts") or 0)], default=0) or None
+        if truncated:
+            # donasi antara watermark dan halaman terakhir belum terbaca:
+            # watermark tetap, run berikutnya lanjut dari next_page
+            storage.kv_set(KV_WATERMARK, {
+                "ts": wm.get("ts") or wm_ts, "resume_page": next_page, "pending_ts": newest, "at": int(time.time()),
+            })
+            print(f"[reconcile] more than {RECONCILE_MAX_PAGES} pages of new donations; resuming at page {next_page}")
+        elif resume > 1 or (newest is not None and newest > wm_ts):
+            wm_ts = max(wm_ts, newest or 0)
+            storage.kv_set(KV_WATERMARK, {"ts": wm_ts, "at": int(time.time())})
+        _STATS["runs"] += 1
+        _STATS["donations"] += len(items)
+        _STATS["last_run_at"] = int(time.time())
+        return {"donations": len(items), "truncated": truncated, "watermark": wm_ts, **result}
+
+
+async def _loop() -> None:
+    while True:
+        _WAKE.clear()
+        try:
+            await run_once()
+            _STATS["last_error"] = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _STATS["errors"] += 1
+            _STATS["last_error"] = f"{type(e).__name__}: {e}"[:200]
+            print("[reconcile] run failed:", e)
+        try:
+            await asyncio.wait_for(_WAKE.wait(), RECONCILE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start() -> None:
+    """Dipanggil leader; tanpa SAWERIA_FEED_URL tidak melakukan apa-apa."""
+    global _TASK, _WAKE
+    if _TASK is not None or not SAWERIA_FEED_URL:
+        return
+    _WAKE = asyncio.Event()
+    _TASK = asyncio.create_task(_loop())
+    print(f"[reconcile] polling {SAWERIA_FEED_URL} every {RECONCILE_INTERVAL:g}s")
+
+
+async def stop() -> None:
+    global _TASK
+    if _TASK is not None:
+        _TASK.cancel()
+        await asyncio.gather(_TASK, return_exceptions=True)
+        _TASK = None
+
+
+def stats() -> Dict[str, Any]:
+    try:
+        wm = storage.kv_get(KV_WATERMARK)
+    except Exception:
+        wm = None
+    return {**_STATS, "enabled": bool(SAWERIA_FEED_URL), "running": _TASK is not None, "watermark": wm}
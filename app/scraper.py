@@ -4,28 +4,36 @@
 #  - Isi form (amount, name/email random, message=INV:<invoice_id>)
 #  - Pilih GoPay (tanpa submit) agar UI siap
 #  - Klik "Kirim Dukungan"
-#  - Cari <img> QR (src berisi '/qr-code' atau mengandung 'qr')
-#  - Unduh bytes PNG via context.request (share cookie)
+#  - Tangkap QR dari response jaringan (PNG QR / JSON string QRIS)
+#    begitu tiba; selesai saat payload valid pertama tertangkap
+#  - Fallback DOM: cari <img> QR (src berisi '/qr-code' atau 'qr')
+#    lalu unduh bytes PNG via context.request (share cookie)
 #  - Jika TIDAK menemukan PNG QR valid -> return None (JANGAN screenshot)
 #
 # ENV:
 #   SAWERIA_USERNAME
+#   SAWERIA_BASE_URL=https://saweria.co   (opsional; stand-in lokal untuk bench)
 #   PWR_HEADLESS=1|0           (opsional; default 1)
 #   PWR_NAV_TIMEOUT_MS=45000   (opsional)
 # ------------------------------------------------------------
 
 from __future__ import annotations
-import os, re, uuid, base64
+import os, re, uuid, base64, asyncio, time
 from typing import Optional
 from urllib.parse import urljoin
 from playwright.async_api import async_playwright, Page, Frame, Error as PWError, TimeoutError as PWTimeoutError
 
+from . import metrics
+from .qris import QR_MAX_SIZE, can_decode, decode_png, is_valid_payload, render
+
 SAWERIA_USERNAME = os.getenv("SAWERIA_USERNAME", "").strip()
-PROFILE_URL = f"https://saweria.co/{SAWERIA_USERNAME}" if SAWERIA_USERNAME else None
+SAWERIA_BASE_URL = os.getenv("SAWERIA_BASE_URL", "https://saweria.co").rstrip("/")
+PROFILE_URL = f"{SAWERIA_BASE_URL}/{SAWERIA_USERNAME}" if SAWERIA_USERNAME else None
 
 HEADLESS = os.getenv("PWR_HEADLESS", "1").strip() not in ("0", "false", "False")
 NAV_TIMEOUT_MS = int(os.getenv("PWR_NAV_TIMEOUT_MS", "45000"))
 QR_WAIT_TIMEOUT_MS = 20000
+NETWORK_GRACE_S = 2.0  # tunggu response QR yang masih di jalan setelah DOM gagal
 MIN_PNG_BYTES = 5_000  # sanity check ukuran file PNG minimal
 
 # Paksa event input/change supaya binding reaktif di halaman terpicu
@@ -36,24 +44,42 @@ _PLAY = None
 _BROWSER = None
 
 
+_LAUNCH_LOCK: Optional[asyncio.Lock] = None
+
+
 async def _get_browser():
     """Start playwright+browser sekali, reuse di panggilan berikutnya."""
-    global _PLAY, _BROWSER
-    if _PLAY is None:
-        _PLAY = await async_playwright().start()
-    if _BROWSER is None:
-        _BROWSER = await _PLAY.chromium.launch(
-            headless=HEADLESS,
-            args=[
-                "--no-sandbox",
-                "--disable-gpu",
-                "--disable-dev-shm-usage",
-                "--disable-blink-features=AutomationControlled",
-            ],
-        )
+    global _PLAY, _BROWSER, _LAUNCH_LOCK
+    if _BROWSER is not None:
+        return _BROWSER
+    if _LAUNCH_LOCK is None:
+        _LAUNCH_LOCK = asyncio.Lock()
+    # prewarm + request pertama bisa bersamaan → cukup 1 Chromium
+    async with _LAUNCH_LOCK:
+        if _PLAY is None:
+            _PLAY = await async_playwright().start()
+        if _BROWSER is None:
+            _BROWSER = await _PLAY.chromium.launch(
+                headless=HEADLESS,
+                args=[
+                    "--no-sandbox",
+                    "--disable-gpu",
+                    "--disable-dev-shm-usage",
+                    "--disable-blink-features=AutomationControlled",
+                ],
+            )
     return _BROWSER
 
 
+async def prewarm() -> None:
+    """Launch Chromium di background setelah app siap (QR pertama tidak menunggu launch)."""
+    try:
+        await _get_browser()
+        print("[scraper] browser ready")
+    except Exception as e:
+        print("[scraper] browser prewarm failed:", e)
+
+
 async def _new_context():
     browser = await _get_browser()
     return await browser.new_context(
@@ -338,17 +364,175 @@ async def _click_donate_and_get_checkout_page(page: Page, context):
     return {"page": page, "frame": None}
 
 
-# ---------- entrypoint: STRICT QR PNG ONLY ----------
-async def fetch_gopay_qr_hd_png(*, invoice_id: str, amount: int) -> Optional[bytes]:
+# ---------- network capture: QR langsung dari response (tanpa download ulang) ----------
+_QR_JSON_KEYS = ("qr_string", "qris", "qr_code", "qrString", "qr")
+
+
+def _find_qris_in_json(data, depth: int = 0) -> Optional[str]:
+    """Cari string QRIS valid di JSON API pembayaran (prioritaskan key qr_*)."""
+    if depth > 6:
+        return None
+    if isinstance(data, str):
+        s = data.strip()
+        return s if is_valid_payload(s) else None
+    if isinstance(data, dict):
+        keys = sorted(data.keys(), key=lambda k: 0 if str(k) in _QR_JSON_KEYS else 1)
+        for k in keys:
+            found = _find_qris_in_json(data[k], depth + 1)
+            if found:
+                return found
+    elif isinstance(data, list):
+        for v in data[:50]:
+            found = _find_qris_in_json(v, depth + 1)
+            if found:
+                return found
+    return None
+
+
+def _attach_qr_capture(context) -> asyncio.Future:
     """
-    Alur ketat: isi form -> klik 'Kirim Dukungan' -> cari <img> QR.
-    HANYA return bytes PNG QR valid. Jika gagal atau tidak PNG -> None.
+    Pasang listener 'response' di level context (semua tab & frame).
+    Future selesai begitu ada PNG QR valid atau JSON berisi string QRIS.
+    Result: {"png": bytes|None, "qris": str|None, "source": "..."}
+    """
+    captured: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def _on_response(resp):
+        if captured.done():
+            return
+        try:
+            url = (resp.url or "").lower()
+            ctype = (resp.headers.get("content-type") or "").lower()
+            if "image/png" in ctype and "qr" in url:
+                data = await resp.body()
+                if not data or len(data) < MIN_PNG_BYTES or captured.done():
+                    return
+                # decode OpenCV di thread; PNG yang tidak ter-decode bukan QR → tunggu
+                # respons lain / fallback DOM (kecuali decoder memang tidak terpasang)
+                payload = await asyncio.to_thread(decode_png, data)
+                if captured.done() or (not is_valid_payload(payload) and can_decode()):
+                    return
+                print(f"[scraper] QR PNG captured from network ({len(data)} bytes):", url[:120])
+                captured.set_result({"png": data, "qris": payload, "source": "network-png"})
+            elif "json" in ctype and any(k in url for k in ["pay", "donat", "qr", "checkout", "transaction"]):
+                payload = _find_qris_in_json(await resp.json())
+                if payload and not captured.done():
+                    print("[scraper] QRIS string captured from API JSON:", url[:120])
+                    captured.set_result({"png": None, "qris": payload, "source": "network-json"})
+        except Exception:
+            pass  # response tanpa body (redirect) / sudah di-dispose
+
+    context.on("response", _on_response)
+    return captured
+
+
+# ---------- DOM path (fallback): cari <img> QR lalu ambil bytes ----------
+async def _read_qr_from_dom(page: Page, context) -> Optional[dict]:
+    # 2) klik "Kirim Dukungan" -> checkout target
+    target = await _click_donate_and_get_checkout_page(page, context)
+    node: Page | Frame = target["frame"] if target["frame"] else (target["page"] or page)
+
+    # 3) tunggu <img> QR terlihat
+    sel_qr_img = 'img.qr-image, img.qr-image--with-wrapper, img[alt*="qr-code" i], img[src*="/qr-code"], [data-testid="qrcode"] img, [class*="qrcode" i] img, img[alt*="QRIS" i]'
+    try:
+        img = node.locator(sel_qr_img).first
+        await img.wait_for(state="visible", timeout=QR_WAIT_TIMEOUT_MS)
+    except PWTimeoutError:
+        print("[scraper] QR IMG not visible in first pass; scan frames…")
+        # coba scan frame lain
+        img = None
+        frames = node.page.frames if hasattr(node, "page") and node.page else page.frames
+        for fr in frames:
+            url = (fr.url or "").lower()
+            if any(k in url for k in ["gopay", "qris", "midtrans", "snap", "checkout", "pay"]):
+                loc = fr.locator(sel_qr_img).first
+                try:
+                    await loc.wait_for(state="visible", timeout=3000)
+                    img = loc
+                    break
+                except Exception:
+                    pass
+        if img is None:
+            return None  # STRICT: tidak ada IMG QR -> gagal
+
+    # 4) ambil src IMG
+    src = await img.get_attribute("src")  # gunakan attribute langsung
+    if not src:
+        return None
+    src_l = src.lower()
+    if ("/qr-code" not in src_l) and ("qr" not in src_l):
+        # bukan sumber QR yang valid
+        return None
+
+    # 5) data URL?
+    if src.startswith("data:image/"):
+        try:
+            header, b64 = src.split(",", 1)
+            data = base64.b64decode(b64)
+        except Exception:
+            return None
+        if data and len(data) >= MIN_PNG_BYTES:
+            return {"png": data, "qris": await asyncio.to_thread(decode_png, data), "source": "dom-data-url"}
+        return None
+
+    # 6) absolutkan & download dengan headers wajar (jika response tidak tertangkap)
+    base_url = node.url if hasattr(node, "url") else page.url
+    abs_url = urljoin(base_url, src)
+    try:
+        r = await context.request.get(
+            abs_url,
+            headers={
+                "Referer": base_url,
+                "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+            },
+            timeout=15000,
+        )
+        if not r.ok:
+            print("[scraper] WARN: img request not ok", r.status)
+            return None
+        ctype = (r.headers.get("content-type") or "").lower()
+        if "image/png" not in ctype:
+            print("[scraper] WARN: content-type is not image/png:", ctype)
+            return None
+        data = await r.body()
+        if not data or len(data) < MIN_PNG_BYTES:
+            print("[scraper] WARN: PNG too small:", len(data) if data else 0)
+            return None
+        return {"png": data, "qris": await asyncio.to_thread(decode_png, data), "source": "dom-download"}
+    except Exception as e:
+        print("[scraper] WARN: fetch img error:", e)
+        return None
+
+
+# ---------- entrypoint: STRICT QR ONLY ----------
+async def fetch_gopay_qr(*, invoice_id: str, amount: int) -> Optional[dict]:
+    """fetch QR + metrik (scraper_run_seconds{outcome}, scraper_inflight)."""
+    metrics.SCRAPER_INFLIGHT.inc()
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        cap = await _fetch_gopay_qr(invoice_id=invoice_id, amount=amount)
+        outcome = "ok" if cap else "none"
+        return cap
+    finally:
+        metrics.SCRAPER_INFLIGHT.dec()
+        metrics.SCRAPER_RUNS.observe(time.perf_counter() - t0, "gopay_qr", outcome)
+
+
+async def _fetch_gopay_qr(*, invoice_id: str, amount: int) -> Optional[dict]:
+    """
+    Alur ketat: isi form -> klik 'Kirim Dukungan' -> tangkap QR.
+    Response jaringan (PNG QR / JSON berisi string QRIS) dipantau sejak awal;
+    selesai begitu payload valid tertangkap. Jalur DOM <img> tetap jadi fallback.
+    Return: {"png": bytes|None, "qris": str|None, "source": str} atau None.
     """
     if not PROFILE_URL:
         print("[scraper] ERROR: SAWERIA_USERNAME belum di-set")
         return None
 
     context = await _new_context()
+    captured = _attach_qr_capture(context)
+    dom_task: Optional[asyncio.Task] = None
     page = await context.new_page()
     try:
         # 1) profil + isi form (message=INV:<invoice_id>) + pilih GoPay
@@ -357,99 +541,47 @@ async def fetch_gopay_qr_hd_png(*, invoice_id: str, amount: int) -> Optional[byt
         await page.mouse.wheel(0, 500)
         await _fill_without_submit(page, amount, invoice_id, "gopay")
 
-        # 2) klik "Kirim Dukungan" -> checkout target
-        target = await _click_donate_and_get_checkout_page(page, context)
-        node: Page | Frame = target["frame"] if target["frame"] else (target["page"] or page)
-
-        # 3) tunggu <img> QR terlihat
-        sel_qr_img = 'img.qr-image, img.qr-image--with-wrapper, img[alt*="qr-code" i], img[src*="/qr-code"], [data-testid="qrcode"] img, [class*="qrcode" i] img, img[alt*="QRIS" i]'
-        try:
-            img = node.locator(sel_qr_img).first
-            await img.wait_for(state="visible", timeout=QR_WAIT_TIMEOUT_MS)
-        except PWTimeoutError:
-            print("[scraper] QR IMG not visible in first pass; scan frames…")
-            # coba scan frame lain
-            img = None
-            frames = node.page.frames if hasattr(node, "page") and node.page else page.frames
-            for fr in frames:
-                url = (fr.url or "").lower()
-                if any(k in url for k in ["gopay", "qris", "midtrans", "snap", "checkout", "pay"]):
-                    loc = fr.locator(sel_qr_img).first
-                    try:
-                        await loc.wait_for(state="visible", timeout=3000)
-                        img = loc
-                        break
-                    except Exception:
-                        pass
-            if img is None:
-                await context.close()
-                return None  # STRICT: tidak ada IMG QR -> gagal
-
-        # 4) ambil src IMG
-        src = await img.get_attribute("src")  # gunakan attribute langsung
-        if not src:
-            await context.close()
-            return None
-        src_l = src.lower()
-        if ("/qr-code" not in src_l) and ("qr" not in src_l):
-            # bukan sumber QR yang valid
-            await context.close()
-            return None
-
-        # 5) data URL?
-        if src.startswith("data:image/"):
+        # 2..6) checkout via DOM, berlomba dengan capture jaringan
+        dom_task = asyncio.ensure_future(_read_qr_from_dom(page, context))
+        await asyncio.wait({captured, dom_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not captured.done() and dom_task.done():
+            dom_res = None if dom_task.exception() else dom_task.result()
+            if dom_res:
+                return dom_res
+            # DOM gagal: beri sedikit waktu untuk response yang masih di jalan
             try:
-                header, b64 = src.split(",", 1)
-                data = base64.b64decode(b64)
-                if data and len(data) >= MIN_PNG_BYTES:
-                    await context.close()
-                    return data
-                await context.close()
+                await asyncio.wait_for(asyncio.shield(captured), NETWORK_GRACE_S)
+            except asyncio.TimeoutError:
                 return None
-            except Exception:
-                await context.close()
-                return None
-
-        # 6) absolutkan & download dengan headers wajar
-        base_url = node.url if hasattr(node, "url") else page.url
-        abs_url = urljoin(base_url, src)
-        try:
-            r = await context.request.get(
-                abs_url,
-                headers={
-                    "Referer": base_url,
-                    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-                },
-                timeout=15000,
-            )
-            if not r.ok:
-                print("[scraper] WARN: img request not ok", r.status)
-                await context.close()
-                return None
-            ctype = (r.headers.get("content-type") or "").lower()
-            if "image/png" not in ctype:
-                print("[scraper] WARN: content-type is not image/png:", ctype)
-                await context.close()
-                return None
-            data = await r.body()
-            if not data or len(data) < MIN_PNG_BYTES:
-                print("[scraper] WARN: PNG too small:", len(data) if data else 0)
-                await context.close()
-                return None
-            await context.close()
-            return data
-        except Exception as e:
-            print("[scraper] WARN: fetch img error:", e)
-            await context.close()
-            return None
+        return captured.result()
 
     except Exception as e:
-        print("[scraper] error(fetch_gopay_qr_hd_png):", e)
+        print("[scraper] error(fetch_gopay_qr):", e)
+        return None
+    finally:
+        if dom_task and not dom_task.done():
+            dom_task.cancel()
+        if not captured.done():
+            captured.cancel()
         try:
             await context.close()
         except Exception:
             pass
+
+
+async def fetch_gopay_qr_hd_png(*, invoice_id: str, amount: int) -> Optional[bytes]:
+    """
+    Kompatibilitas: HANYA return bytes PNG QR valid. Bila yang tertangkap
+    hanya string QRIS, PNG dirender lokal. Jika gagal -> None.
+    """
+    cap = await fetch_gopay_qr(invoice_id=invoice_id, amount=amount)
+    if not cap:
         return None
+    if cap.get("png"):
+        return cap["png"]
+    if cap.get("qris"):
+        return render(cap["qris"], "png", QR_MAX_SIZE)
+    return None
 
 
 # ---------- entrypoints tambahan (DEBUG ONLY – tidak dipakai produksi) ----------
@@ -4,6 +4,15 @@
 # Table:
 # - invoices(invoice_id, user_id, amount, groups_json, status, qris_payload, paid_at, created_at)
 # - invite_logs(id, invoice_id, group_id, invite_link, error, created_at)
+# - memberships(chat_id, user_id, status, source, updated_at)  ← index gate
+# - chat_meta(chat_id, title, username, type, member_count, updated_at)
+# - kv(key, value, updated_at)  ← cache kecil yang perlu awet (listing ImageKit dsb.)
+# - invite_outbox(id, invoice_id, user_id, group_id, status, attempts, next_attempt_at,
+#                 last_error, created_at, updated_at)  ← job kirim undangan (1 per grup)
+# - invite_link_pool(link, group_id, created_at, claimed_at, invoice_id)  ← link sekali pakai siap pakai
+# - leases(name, owner, expires_at)  ← leader election + lock antar proses (app/cluster.py)
+#
+# Journal WAL + busy_timeout: aman dipakai beberapa proses uvicorn sekaligus.
 # ------------------------------------------------------------
 
 from __future__ import annotations
@@ -15,16 +24,23 @@ import uuid
 import time
 from typing import Any, Dict, List, Optional
 
+from . import metrics
+
 DB_PATH = os.getenv("DB_PATH", "/data/app.db")
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# durasi + error per query (sqlite_call_seconds{fn}); dipasang eksplisit per fungsi
+# (bukan init_db, bukan pembungkus seperti mark_paid → tidak terhitung dua kali)
+_db_timed = metrics.timed(metrics.DB_LATENCY, metrics.DB_ERRORS)
 
 # ---------- koneksi ----------
 def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
     return conn
 
 def _conn():
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
 
 def _table_has_column(conn, table: str, col: str) -> bool:
     cur = conn.execute(f'PRAGMA table_info("{table}")')
@@ -33,6 +49,8 @@ def _table_has_column(conn, table: str, col: str) -> bool:
 def init_db():
     conn = _conn()
     cur = conn.cursor()
+    # WAL: pembaca tidak memblok penulis (multi-worker); setting ini persisten di file DB
+    cur.execute("PRAGMA journal_mode=WAL")
 
     # invoices (biarkan seperti yang sudah ada di projectmu)
     cur.execute("""
@@ -59,6 +77,80 @@ def init_db():
     )
     """)
 
+    # memberships: index lokal dari update chat_member (source='event')
+    # + hasil positif get_chat_member (source='api')
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS memberships (
+      chat_id    TEXT,
+      user_id    INTEGER,
+      status     TEXT,
+      source     TEXT,
+      updated_at INTEGER,
+      PRIMARY KEY (chat_id, user_id)
+    )
+    """)
+
+    # chat_meta: cache metadata chat (judul dsb.) supaya restart tetap hangat
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chat_meta (
+      chat_id      TEXT PRIMARY KEY,
+      title        TEXT,
+      username     TEXT,
+      type         TEXT,
+      member_count INTEGER,
+      updated_at   INTEGER
+    )
+    """)
+
+    # kv: nilai JSON sederhana per key (prefix = namespace, mis. "imagekit:/M")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS kv (
+      key        TEXT PRIMARY KEY,
+      value      TEXT,
+      updated_at INTEGER
+    )
+    """)
+
+    # invite_outbox: diisi DALAM transaksi yang sama dengan status PAID,
+    # dikerjakan worker app/outbox.py (PENDING → SENDING → SENT / DEAD)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS invite_outbox (
+      id              INTEGER PRIMARY KEY AUTOINCREMENT,
+      invoice_id      TEXT,
+      user_id         INTEGER,
+      group_id        TEXT,
+      status          TEXT DEFAULT 'PENDING',
+      attempts        INTEGER DEFAULT 0,
+      next_attempt_at INTEGER,
+      last_error      TEXT,
+      created_at      INTEGER,
+      updated_at      INTEGER,
+      UNIQUE (invoice_id, group_id)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON invite_outbox (status, next_attempt_at)")
+
+    # invite_link_pool: link member_limit=1 yang dibuat lebih dulu (app/linkpool.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS invite_link_pool (
+      link       TEXT PRIMARY KEY,
+      group_id   TEXT,
+      created_at INTEGER,
+      claimed_at INTEGER,
+      invoice_id TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_linkpool_free ON invite_link_pool (group_id, claimed_at, created_at)")
+
+    # leases: pemilik + waktu habis (leader election / single-flight antar proses)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+      name       TEXT PRIMARY KEY,
+      owner      TEXT,
+      expires_at REAL
+    )
+    """)
+
     # 🔧 migrasi ringan: tambahkan created_at bila belum ada (opsional)
     if not _table_has_column(conn, "invite_logs", "created_at"):
         try:
@@ -66,6 +158,18 @@ def init_db():
         except Exception:
             pass  # abaikan kalau SQLite lama tidak bisa; fungsi add_invite_log akan menyesuaikan
 
+    # 🔧 migrasi ringan invoices: created_at/paid_at (dipakai create/update sejak lama,
+    # tapi tidak ada di CREATE TABLE) + timeline (lihat app/timeline.py)
+    for col, typ in (("created_at", "INTEGER"), ("paid_at", "INTEGER"), ("timeline", "TEXT")):
+        if not _table_has_column(conn, "invoices", col):
+            try:
+                cur.execute(f'ALTER TABLE invoices ADD COLUMN {col} {typ}')
+            except sqlite3.OperationalError as e:
+                # worker lain (multi-proses) menambahkan kolom yang sama duluan
+                if "duplicate column" not in str(e).lower():
+                    raise
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_invoices_created ON invoices (created_at)")
+
     conn.commit()
     conn.close()
 
@@ -74,23 +178,66 @@ def init_db():
 def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
     return {k: row[k] for k in row.keys()}
 
+# ---------- timeline invoice ----------
+# kolom invoices.timeline = "event@epoch_ms;" di-append (tanpa baca-ubah-tulis),
+# detail opsional: "invite_sent:-100123@1700000000123;"
+def _tl(event: str, ts: Optional[float] = None) -> str:
+    return f"{event}@{int((ts or time.time()) * 1000)};"
+
+@_db_timed
+def timeline_append(invoice_id: str, event: str, once: bool = False) -> None:
+    """once=True → hanya bila event (nama persis) belum tercatat."""
+    conn = _get_conn()
+    if once:
+        conn.execute("""
+            UPDATE invoices SET timeline = COALESCE(timeline, '') || ?
+             WHERE invoice_id=? AND instr(';' || COALESCE(timeline, ''), ?) = 0
+        """, (_tl(event), invoice_id, f";{event}@"))
+    else:
+        conn.execute("UPDATE invoices SET timeline = COALESCE(timeline, '') || ? WHERE invoice_id=?",
+                     (_tl(event), invoice_id))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def get_timeline(invoice_id: str) -> Optional[Dict[str, Any]]:
+    conn = _get_conn()
+    row = conn.execute("SELECT invoice_id, status, created_at, timeline FROM invoices WHERE invoice_id=?",
+                       (invoice_id,)).fetchone()
+    conn.close()
+    return _row_to_dict(row) if row else None
+
+@_db_timed
+def list_timelines(created_since: int, limit: int = 50000) -> List[str]:
+    conn = _get_conn()
+    rows = conn.execute("""
+        SELECT timeline FROM invoices
+         WHERE created_at >= ? AND timeline IS NOT NULL
+         ORDER BY created_at DESC LIMIT ?
+    """, (created_since, limit)).fetchall()
+    conn.close()
+    return [r["timeline"] for r in rows]
+
 # ---------- invoices ----------
+@_db_timed
 def create_invoice(user_id: int, groups: List[str], amount: int) -> Dict[str, Any]:
     invoice_id = str(uuid.uuid4())
     groups_json = json.dumps(groups, ensure_ascii=False)
-    now = int(time.time())
+    ts = time.time()
+    now = int(ts)
     conn = _get_conn()
     cur = conn.cursor()
     cur.execute("""
-        INSERT INTO invoices (invoice_id, user_id, amount, groups_json, status, created_at)
-        VALUES (?, ?, ?, ?, 'PENDING', ?)
-    """, (invoice_id, user_id, amount, groups_json, now))
+        INSERT INTO invoices (invoice_id, user_id, amount, groups_json, status, created_at, timeline)
+        VALUES (?, ?, ?, ?, 'PENDING', ?, ?)
+    """, (invoice_id, user_id, amount, groups_json, now, _tl("created", ts)))
     conn.commit()
     cur.execute("SELECT * FROM invoices WHERE invoice_id = ?", (invoice_id,))
     row = cur.fetchone()
     conn.close()
     return _row_to_dict(row)
 
+@_db_timed
 def get_invoice(invoice_id: str) -> Optional[Dict[str, Any]]:
     conn = _get_conn()
     cur = conn.cursor()
@@ -99,6 +246,7 @@ def get_invoice(invoice_id: str) -> Optional[Dict[str, Any]]:
     conn.close()
     return _row_to_dict(row) if row else None
 
+@_db_timed
 def list_invoices(limit: int = 20) -> List[Dict[str, Any]]:
     conn = _get_conn()
     cur = conn.cursor()
@@ -107,13 +255,20 @@ def list_invoices(limit: int = 20) -> List[Dict[str, Any]]:
     conn.close()
     return [_row_to_dict(r) for r in rows]
 
+@_db_timed
 def update_invoice_status(invoice_id: str, status: str) -> Optional[Dict[str, Any]]:
     status = status.upper()
     now = int(time.time()) if status == "PAID" else None
     conn = _get_conn()
     cur = conn.cursor()
     if status == "PAID":
-        cur.execute("UPDATE invoices SET status='PAID', paid_at=? WHERE invoice_id=?", (now, invoice_id))
+        # paid_at + event "paid" hanya pada transisi pertama (webhook dobel tidak menggeser)
+        cur.execute("""
+            UPDATE invoices SET status='PAID', paid_at=?, timeline = COALESCE(timeline, '') || ?
+             WHERE invoice_id=? AND COALESCE(status, '') != 'PAID'
+        """, (now, _tl("paid"), invoice_id))
+        # job undangan ikut commit bersama status PAID (tidak hilang saat restart)
+        _enqueue_invites(cur, invoice_id, now)
     else:
         cur.execute("UPDATE invoices SET status=? WHERE invoice_id=?", (status, invoice_id))
     conn.commit()
@@ -125,6 +280,7 @@ def update_invoice_status(invoice_id: str, status: str) -> Optional[Dict[str, An
 def mark_paid(invoice_id: str) -> Optional[Dict[str, Any]]:
     return update_invoice_status(invoice_id, "PAID")
 
+@_db_timed
 def update_qris_payload(invoice_id: str, data_url: str) -> None:
     conn = _get_conn()
     cur = conn.cursor()
@@ -133,6 +289,7 @@ def update_qris_payload(invoice_id: str, data_url: str) -> None:
     conn.close()
 
 # ---------- invite logs ----------
+@_db_timed
 def add_invite_log(invoice_id: str, group_id: str, invite_link: str | None, error: str | None):
     conn = _conn()
     cur  = conn.cursor()
@@ -149,10 +306,15 @@ def add_invite_log(invoice_id: str, group_id: str, invite_link: str | None, erro
             INSERT INTO invite_logs (invoice_id, group_id, invite_link, error)
             VALUES (?,?,?,?)
         """, (invoice_id, str(group_id), invite_link, error))
+    # timeline: tiap undangan terkirim / gagal (transaksi yang sama)
+    event = f"invite_failed:{group_id}" if error else f"invite_sent:{group_id}"
+    cur.execute("UPDATE invoices SET timeline = COALESCE(timeline, '') || ? WHERE invoice_id=?",
+                (_tl(event), invoice_id))
     conn.commit()
     conn.close()
 
 
+@_db_timed
 def list_invite_logs(invoice_id: str):
     conn = _conn()
     cur  = conn.cursor()
@@ -179,3 +341,325 @@ def list_invite_logs(invoice_id: str):
             item["created_at"] = r[4]
         items.append(item)
     return items
+
+
+# ---------- membership index ----------
+@_db_timed
+def upsert_membership(chat_id: str, user_id: int, status: str, source: str) -> None:
+    conn = _get_conn()
+    conn.execute("""
+        INSERT INTO memberships (chat_id, user_id, status, source, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(chat_id, user_id) DO UPDATE SET
+          status=excluded.status, source=excluded.source, updated_at=excluded.updated_at
+    """, (str(chat_id), int(user_id), status, source, int(time.time())))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def get_memberships(user_id: int, chat_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return {chat_id: row} untuk chat yang ada di index (1 query)."""
+    if not chat_ids:
+        return {}
+    conn = _get_conn()
+    cur = conn.cursor()
+    marks = ",".join("?" for _ in chat_ids)
+    cur.execute(
+        f"SELECT * FROM memberships WHERE user_id=? AND chat_id IN ({marks})",
+        (int(user_id), *[str(c) for c in chat_ids]),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {r["chat_id"]: _row_to_dict(r) for r in rows}
+
+
+# ---------- chat metadata ----------
+@_db_timed
+def upsert_chat_meta(items: List[Dict[str, Any]]) -> None:
+    if not items:
+        return
+    conn = _get_conn()
+    conn.executemany("""
+        INSERT INTO chat_meta (chat_id, title, username, type, member_count, updated_at)
+        VALUES (:chat_id, :title, :username, :type, :member_count, :updated_at)
+        ON CONFLICT(chat_id) DO UPDATE SET
+          title=excluded.title, username=excluded.username, type=excluded.type,
+          member_count=COALESCE(excluded.member_count, chat_meta.member_count),
+          updated_at=excluded.updated_at
+    """, items)
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def get_chat_meta(chat_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not chat_ids:
+        return {}
+    conn = _get_conn()
+    marks = ",".join("?" for _ in chat_ids)
+    rows = conn.execute(f"SELECT * FROM chat_meta WHERE chat_id IN ({marks})", [str(c) for c in chat_ids]).fetchall()
+    conn.close()
+    return {r["chat_id"]: _row_to_dict(r) for r in rows}
+
+@_db_timed
+def list_chat_meta(limit: int = 5000) -> List[Dict[str, Any]]:
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM chat_meta ORDER BY updated_at DESC LIMIT ?", (limit,))
+    rows = cur.fetchall()
+    conn.close()
+    return [_row_to_dict(r) for r in rows]
+
+
+# ---------- kv ----------
+@_db_timed
+def kv_set(key: str, value: Any) -> None:
+    conn = _get_conn()
+    conn.execute("""
+        INSERT INTO kv (key, value, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+    """, (key, json.dumps(value), int(time.time())))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def kv_get(key: str, default: Any = None) -> Any:
+    conn = _get_conn()
+    row = conn.execute("SELECT value FROM kv WHERE key=?", (key,)).fetchone()
+    conn.close()
+    return json.loads(row["value"]) if row else default
+
+@_db_timed
+def kv_list(prefix: str, limit: int = 1000) -> Dict[str, Any]:
+    """Return {key: value} untuk key berawalan prefix (paling baru dulu)."""
+    conn = _get_conn()
+    cur = conn.execute(
+        "SELECT key, value FROM kv WHERE key >= ? AND key < ? ORDER BY updated_at DESC LIMIT ?",
+        (prefix, prefix + "\uffff", limit),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {r["key"]: json.loads(r["value"]) for r in rows}
+
+
+# ---------- invite outbox ----------
+def _enqueue_invites(cur, invoice_id: str, now: int) -> int:
+    row = cur.execute("SELECT user_id, groups_json FROM invoices WHERE invoice_id=?", (invoice_id,)).fetchone()
+    if not row:
+        return 0
+    try:
+        groups = json.loads(row[1] or "[]")
+    except Exception:
+        groups = []
+    cur.executemany("""
+        INSERT OR IGNORE INTO invite_outbox
+          (invoice_id, user_id, group_id, status, attempts, next_attempt_at, created_at, updated_at)
+        VALUES (?, ?, ?, 'PENDING', 0, ?, ?, ?)
+    """, [(invoice_id, row[0], str(g), now, now, now) for g in groups])
+    return cur.rowcount
+
+@_db_timed
+def enqueue_invites(invoice_id: str) -> int:
+    """Idempotent (UNIQUE invoice_id+group_id). Untuk invoice PAID lama tanpa job."""
+    conn = _get_conn()
+    n = _enqueue_invites(conn.cursor(), invoice_id, int(time.time()))
+    conn.commit()
+    conn.close()
+    return n
+
+@_db_timed
+def claim_outbox(limit: int, lease_s: int) -> List[Dict[str, Any]]:
+    """
+    Ambil job yang jatuh tempo secara atomik → SENDING dengan lease.
+    SENDING yang lease-nya habis (proses mati di tengah kirim) ikut diambil ulang.
+    """
+    now = int(time.time())
+    conn = _get_conn()
+    cur = conn.execute("""
+        UPDATE invite_outbox
+           SET status='SENDING', attempts=attempts+1, next_attempt_at=?, updated_at=?
+         WHERE id IN (
+           SELECT id FROM invite_outbox
+            WHERE status IN ('PENDING','SENDING') AND next_attempt_at <= ?
+            ORDER BY next_attempt_at LIMIT ?)
+        RETURNING *
+    """, (now + lease_s, now, now, limit))
+    rows = [_row_to_dict(r) for r in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return rows
+
+@_db_timed
+def outbox_done(job_id: int) -> None:
+    now = int(time.time())
+    conn = _get_conn()
+    conn.execute("UPDATE invite_outbox SET status='SENT', last_error=NULL, updated_at=? WHERE id=?", (now, job_id))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def outbox_fail(job_id: int, error: str, retry_at: Optional[int]) -> None:
+    """retry_at=None → DEAD (dead-letter; hanya bisa dihidupkan lewat outbox_retry)."""
+    now = int(time.time())
+    conn = _get_conn()
+    if retry_at is None:
+        conn.execute("UPDATE invite_outbox SET status='DEAD', last_error=?, updated_at=? WHERE id=?",
+                     (error[:500], now, job_id))
+    else:
+        conn.execute("""UPDATE invite_outbox SET status='PENDING', last_error=?, next_attempt_at=?, updated_at=?
+                        WHERE id=?""", (error[:500], retry_at, now, job_id))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def outbox_retry(invoice_id: Optional[str] = None, ids: Optional[List[int]] = None) -> int:
+    """DEAD → PENDING (attempts direset). Tanpa filter = semua DEAD."""
+    now = int(time.time())
+    sql = "UPDATE invite_outbox SET status='PENDING', attempts=0, next_attempt_at=?, updated_at=? WHERE status='DEAD'"
+    args: List[Any] = [now, now]
+    if invoice_id:
+        sql += " AND invoice_id=?"
+        args.append(invoice_id)
+    if ids:
+        sql += f" AND id IN ({','.join('?' for _ in ids)})"
+        args.extend(int(i) for i in ids)
+    conn = _get_conn()
+    n = conn.execute(sql, args).rowcount
+    conn.commit()
+    conn.close()
+    return n
+
+@_db_timed
+def list_outbox(status: Optional[str] = None, invoice_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    sql, args = "SELECT * FROM invite_outbox WHERE 1=1", []
+    if status:
+        sql += " AND status=?"
+        args.append(status.upper())
+    if invoice_id:
+        sql += " AND invoice_id=?"
+        args.append(invoice_id)
+    sql += " ORDER BY id DESC LIMIT ?"
+    args.append(limit)
+    conn = _get_conn()
+    rows = conn.execute(sql, args).fetchall()
+    conn.close()
+    return [_row_to_dict(r) for r in rows]
+
+@_db_timed
+def outbox_stats() -> Dict[str, Any]:
+    conn = _get_conn()
+    rows = conn.execute("""
+        SELECT status, COUNT(*) AS n, MIN(created_at) AS oldest FROM invite_outbox GROUP BY status
+    """).fetchall()
+    conn.close()
+    now = int(time.time())
+    out: Dict[str, Any] = {"PENDING": 0, "SENDING": 0, "SENT": 0, "DEAD": 0}
+    for r in rows:
+        out[r["status"]] = r["n"]
+        if r["status"] == "PENDING" and r["oldest"]:
+            out["oldest_pending_s"] = now - r["oldest"]
+    return out
+
+
+# ---------- invite link pool ----------
+@_db_timed
+def pool_add(group_id: str, links: List[str]) -> None:
+    if not links:
+        return
+    now = int(time.time())
+    conn = _get_conn()
+    conn.executemany("INSERT OR IGNORE INTO invite_link_pool (link, group_id, created_at) VALUES (?, ?, ?)",
+                     [(l, str(group_id), now) for l in links])
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def pool_claim(group_id: str, invoice_id: Optional[str], min_created_at: int) -> Optional[str]:
+    """
+    Ambil 1 link bebas secara atomik. Retry untuk invoice+grup yang sama
+    mendapat link yang sama (tidak membuang link).
+    """
+    now = int(time.time())
+    conn = _get_conn()
+    if invoice_id:
+        row = conn.execute("SELECT link FROM invite_link_pool WHERE group_id=? AND invoice_id=?",
+                           (str(group_id), invoice_id)).fetchone()
+        if row:
+            conn.close()
+            return row["link"]
+    row = conn.execute("""
+        UPDATE invite_link_pool SET claimed_at=?, invoice_id=?
+         WHERE link = (
+           SELECT link FROM invite_link_pool
+            WHERE group_id=? AND claimed_at IS NULL AND created_at >= ?
+            ORDER BY created_at LIMIT 1)
+        RETURNING link
+    """, (now, invoice_id, str(group_id), min_created_at)).fetchone()
+    conn.commit()
+    conn.close()
+    return row["link"] if row else None
+
+@_db_timed
+def pool_levels() -> Dict[str, int]:
+    """{group_id: jumlah link bebas}."""
+    conn = _get_conn()
+    rows = conn.execute("""SELECT group_id, COUNT(*) AS n FROM invite_link_pool
+                           WHERE claimed_at IS NULL GROUP BY group_id""").fetchall()
+    conn.close()
+    return {r["group_id"]: r["n"] for r in rows}
+
+@_db_timed
+def pool_stale(created_before: int, limit: int = 100) -> List[Dict[str, Any]]:
+    conn = _get_conn()
+    rows = conn.execute("""SELECT link, group_id FROM invite_link_pool
+                           WHERE claimed_at IS NULL AND created_at < ? LIMIT ?""",
+                        (created_before, limit)).fetchall()
+    conn.close()
+    return [_row_to_dict(r) for r in rows]
+
+@_db_timed
+def pool_delete(links: List[str]) -> None:
+    if not links:
+        return
+    conn = _get_conn()
+    conn.executemany("DELETE FROM invite_link_pool WHERE link=?", [(l,) for l in links])
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def pool_prune_claimed(claimed_before: int) -> int:
+    conn = _get_conn()
+    n = conn.execute("DELETE FROM invite_link_pool WHERE claimed_at IS NOT NULL AND claimed_at < ?",
+                     (claimed_before,)).rowcount
+    conn.commit()
+    conn.close()
+    return n
+
+
+# ---------- leases ----------
+@_db_timed
+def lease_acquire(name: str, owner: str, ttl: float) -> bool:
+    """Ambil / perpanjang lease. True bila owner sekarang pemegangnya."""
+    now = time.time()
+    conn = _get_conn()
+    n = conn.execute("""
+        INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+         WHERE leases.owner=excluded.owner OR leases.expires_at < ?
+    """, (name, owner, now + ttl, now)).rowcount
+    conn.commit()
+    conn.close()
+    return n == 1
+
+@_db_timed
+def lease_release(name: str, owner: str) -> None:
+    conn = _get_conn()
+    conn.execute("DELETE FROM leases WHERE name=? AND owner=?", (name, owner))
+    conn.commit()
+    conn.close()
+
+@_db_timed
+def lease_owner(name: str) -> Optional[str]:
+    conn = _get_conn()
+    row = conn.execute("SELECT owner FROM leases WHERE name=? AND expires_at >= ?", (name, time.time())).fetchone()
+    conn.close()
+    return row["owner"] if row else None
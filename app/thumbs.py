@@ -0,0 +1,300 @@
+# app/thumbs.py
+# ------------------------------------------------------------
+# Proxy thumbnail lokal untuk gambar katalog (/img/{width}/{token}.{webp|jpg}?v=&s=):
+# - token = URL sumber (base64url); hanya host di IMG_PROXY_ORIGINS yang dilayani
+# - s = HMAC(token|v) dari proxy_url(); tanpa tanda tangan valid → 404 sebelum
+#   fetch origin (v / token acak tidak bisa memaksa download, render, tulis disk)
+# - v = versi isi sumber (ImageKit versionInfo/updatedAt, lihat imagekit.versions);
+#   file diganti → versi baru → URL baru, jadi URL ber-versi aman "immutable"
+# - tanpa versi (mis. gambar default katalog): sumber di-fetch ulang paling
+#   lama tiap IMG_UNVERSIONED_TTL dan browser merevalidasi (tanpa immutable)
+# - sumber di-fetch sekali per versi (disimpan di disk; streaming, berhenti
+#   begitu lewat IMG_MAX_SOURCE_MB), varian lebar/format dibuat dari situ
+# - resize + encode pakai Pillow di thread (tidak memblok event loop)
+# - cache disk dengan batas ukuran (buang file paling lama tidak dipakai)
+#
+# ENV:
+#   IMG_PROXY=1                    (opsional; 0 = pakai URL ImageKit + ?tr= seperti dulu)
+#   IMG_PROXY_ORIGINS=ik.imagekit.io   (opsional; host sumber yang diizinkan, koma)
+#   IMG_CACHE_DIR=/data/img-cache  (opsional)
+#   IMG_CACHE_MAX_MB=512           (opsional; batas total cache disk)
+#   IMG_WIDTHS=320,600,960         (opsional; lebar yang tersedia, lainnya dibulatkan)
+#   IMG_MAX_SOURCE_MB=15           (opsional; batas ukuran gambar sumber)
+#   IMG_UNVERSIONED_TTL=86400      (opsional; detik, umur cache sumber tanpa versi)
+#   IMG_URL_SECRET=...             (opsional; kunci HMAC URL, default turunan BOT_TOKEN)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import io
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import httpclient
+
+IMG_PROXY = os.getenv("IMG_PROXY", "1") == "1"
+IMG_CACHE_DIR = os.getenv("IMG_CACHE_DIR", "/data/img-cache")
+IMG_CACHE_MAX_BYTES = int(float(os.getenv("IMG_CACHE_MAX_MB", "512")) * 1024 * 1024)
+IMG_MAX_SOURCE_BYTES = int(float(os.getenv("IMG_MAX_SOURCE_MB", "15")) * 1024 * 1024)
+IMG_WIDTHS = sorted(int(w) for w in (os.getenv("IMG_WIDTHS", "320,600,960") or "600").split(",") if w.strip())
+IMG_UNVERSIONED_TTL = int(os.getenv("IMG_UNVERSIONED_TTL", "86400"))
+IMG_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}  # URL ber-versi
+IMG_UNVERSIONED_HEADERS = {"Cache-Control": f"public, max-age={min(IMG_UNVERSIONED_TTL, 3600)}"}
+_VERSION_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_URL_KEY = (os.getenv("IMG_URL_SECRET") or hashlib.sha256(("img:" + os.getenv("BOT_TOKEN", "")).encode()).hexdigest()).encode()
+
+FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+class ThumbError(Exception):
+    """Error dengan status HTTP untuk endpoint /img."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _origins() -> set:
+    hosts = {h.strip().lower() for h in os.getenv("IMG_PROXY_ORIGINS", "ik.imagekit.io").split(",") if h.strip()}
+    base = urlsplit(os.getenv("IMAGEKIT_BASE_URL", "")).hostname
+    if base:
+        hosts.add(base.lower())
+    return hosts
+
+
+_ALLOWED = _origins()
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+_STATS = {"hits": 0, "misses": 0, "source_fetches": 0, "errors": 0, "evicted_files": 0}
+_DISK = {"bytes": -1}  # -1 = belum di-scan
+_DISK_LOCK = threading.Lock()  # _write/_evict jalan di banyak thread to_thread
+
+
+# ---------- URL ----------
+def snap_width(width: int) -> int:
+    for w in IMG_WIDTHS:
+        if width <= w:
+            return w
+    return IMG_WIDTHS[-1]
+
+
+def allowed(src: str) -> bool:
+    parts = urlsplit(src)
+    return parts.scheme in ("http", "https") and (parts.hostname or "").lower() in _ALLOWED
+
+
+def _sign(token: str, version: Optional[str]) -> str:
+    return hmac.new(_URL_KEY, f"{token}|{version or ''}".encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def proxy_url(src: str, width: int, fmt: str = "webp", version: Optional[str] = None) -> str:
+    """URL /img (bertanda tangan) untuk src; src di luar allowlist (atau proxy mati) apa adanya."""
+    if not IMG_PROXY or not src or not allowed(src):
+        return src
+    token = base64.urlsafe_b64encode(src.encode()).decode().rstrip("=")
+    url = f"/img/{snap_width(width)}/{token}.{fmt}?"
+    return url + (f"v={version}&" if version else "") + f"s={_sign(token, version)}"
+
+
+def cache_headers(version: Optional[str]) -> Dict[str, str]:
+    return IMG_CACHE_HEADERS if version else IMG_UNVERSIONED_HEADERS
+
+
+def decode_token(token: str) -> str:
+    try:
+        src = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ThumbError(400, "bad token")
+    if not allowed(src):
+        raise ThumbError(403, "origin not allowed")
+    return src
+
+
+# ---------- disk cache ----------
+def _path(kind: str, key: str, ext: str) -> str:
+    h = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(IMG_CACHE_DIR, kind, h[:2], f"{h[2:34]}.{ext}")
+
+
+def _read_touch(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mtime = terakhir dipakai (dasar eviction)
+        return data
+    except OSError:
+        return None
+
+
+def _scan() -> List[Tuple[float, int, str]]:
+    files = []
+    for root, _dirs, names in os.walk(IMG_CACHE_DIR):
+        for n in names:
+            p = os.path.join(root, n)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+    return files
+
+
+def _evict() -> None:
+    """Buang file paling lama tidak dipakai sampai total <= 90% batas."""
+    files = sorted(_scan())
+    total = sum(sz for _, sz, _ in files)
+    target = int(IMG_CACHE_MAX_BYTES * 0.9)
+    for _mt, sz, p in files:
+        if total <= target:
+            break
+        try:
+            os.remove(p)
+            total -= sz
+            _STATS["evicted_files"] += 1
+        except OSError:
+            pass
+    _DISK["bytes"] = total
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    with _DISK_LOCK:
+        try:
+            old = os.path.getsize(path)  # timpa file yang sama → jangan dihitung dua kali
+        except OSError:
+            old = 0
+        os.replace(tmp, path)  # atomic: pembaca tidak pernah melihat file setengah jadi
+        if _DISK["bytes"] < 0:
+            _DISK["bytes"] = sum(sz for _, sz, _ in _scan())
+        else:
+            _DISK["bytes"] += len(data) - old
+        if _DISK["bytes"] > IMG_CACHE_MAX_BYTES:
+            _evict()
+
+
+# ---------- render ----------
+def _render(source: bytes, width: int, fmt: str) -> bytes:
+    from PIL import Image, ImageOps
+    img = Image.open(io.BytesIO(source))
+    img = ImageOps.exif_transpose(img)
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    buf = io.BytesIO()
+    if fmt == "webp":
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        img.save(buf, format="WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+async def _download(src: str) -> bytes:
+    """GET streaming; putus begitu body melewati IMG_MAX_SOURCE_BYTES."""
+    try:
+        r = await httpclient.get(src, stream=True)
+    except Exception as e:
+        raise ThumbError(502, f"origin fetch failed: {e}")
+    try:
+        if r.status_code != 200:
+            raise ThumbError(502, f"origin status {r.status_code}")
+        if int(r.headers.get("content-length") or 0) > IMG_MAX_SOURCE_BYTES:
+            raise ThumbError(413, "source too large")
+        buf = bytearray()
+        async for chunk in r.aiter_bytes():
+            buf += chunk
+            if len(buf) > IMG_MAX_SOURCE_BYTES:
+                raise ThumbError(413, "source too large")
+        return bytes(buf)
+    except ThumbError:
+        raise
+    except Exception as e:
+        raise ThumbError(502, f"origin read failed: {e}")
+    finally:
+        await r.aclose()
+
+
+async def _source(src: str, skey: str) -> bytes:
+    path = _path("src", skey, "bin")
+    data = await asyncio.to_thread(_read_touch, path)
+    if data is not None:
+        return data
+    _STATS["source_fetches"] += 1
+    data = await _download(src)
+    await asyncio.to_thread(_write, path, data)
+    return data
+
+
+async def _build(src: str, skey: str, width: int, fmt: str, path: str) -> bytes:
+    source = await _single_flight("src:" + skey, _source(src, skey))
+    try:
+        body = await asyncio.to_thread(_render, source, width, fmt)
+    except Exception as e:
+        raise ThumbError(415, f"cannot decode image: {e}")
+    await asyncio.to_thread(_write, path, body)
+    return body
+
+
+async def _single_flight(key: str, coro) -> bytes:
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(coro)
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _t: _INFLIGHT.pop(key, None))
+    else:
+        coro.close()
+    return await asyncio.shield(task)
+
+
+async def get(
+    token: str, width: int, fmt: str, version: Optional[str] = None, sig: Optional[str] = None,
+) -> Tuple[bytes, str]:
+    """Return (body, etag). Raise ThumbError untuk input tidak valid / origin gagal."""
+    if fmt not in FORMATS:
+        raise ThumbError(404, "unsupported format")
+    if width not in IMG_WIDTHS:
+        raise ThumbError(404, "unsupported width")
+    if version is not None and not _VERSION_RE.fullmatch(version):
+        raise ThumbError(400, "bad version")
+    if not hmac.compare_digest(sig or "", _sign(token, version)):
+        raise ThumbError(404, "bad signature")
+    src = decode_token(token)
+    # sumber tanpa versi: kunci berganti tiap IMG_UNVERSIONED_TTL → di-fetch ulang
+    # (file lama tersingkir sendiri oleh eviction LRU)
+    skey = f"{src}|v={version}" if version else f"{src}|t={int(time.time() // max(1, IMG_UNVERSIONED_TTL))}"
+    key = f"{skey}|{width}|{fmt}"
+    etag = '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+    path = _path("out", key, fmt)
+    body = await asyncio.to_thread(_read_touch, path)
+    if body is not None:
+        _STATS["hits"] += 1
+        return body, etag
+    _STATS["misses"] += 1
+    try:
+        body = await _single_flight(key, _build(src, skey, width, fmt, path))
+    except ThumbError:
+        _STATS["errors"] += 1
+        raise
+    return body, etag
+
+
+def stats() -> Dict[str, object]:
+    return {**_STATS, "disk_bytes": _DISK["bytes"], "max_bytes": IMG_CACHE_MAX_BYTES,
+            "inflight": len(_INFLIGHT), "enabled": IMG_PROXY, "widths": IMG_WIDTHS,
+            "ts": int(time.time())}
@@ -0,0 +1,134 @@
+# app/timeline.py
+# ------------------------------------------------------------
+# Timeline latency per invoice (kolom invoices.timeline, "event@epoch_ms;"):
+#   created       → invoice dibuat (storage.create_invoice)
+#   qr_queued     → /api/qr pertama yang perlu generate (payload belum ada)
+#   qr_started    → scraper mulai (pemegang lock generate)
+#   qr_done / qr_failed
+#   qr_served     → gambar QR pertama terkirim ke user
+#   webhook       → webhook Saweria untuk invoice ini diterima
+#   reconciled    → PAID dari feed donasi (app/reconcile.py; webhook tidak datang)
+#   paid          → status PAID (transaksi yang sama dengan outbox)
+#   invite_sent:<group> / invite_failed:<group>  (storage.add_invite_log)
+#
+# mark() = 1 UPDATE append (tanpa baca); event "once" di-dedupe di memori dulu
+# supaya hot path (/api/qr) tidak menulis DB tiap request.
+# report(window) → persentil durasi antar tahap untuk invoice dalam window.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import storage
+from .cache import LRUCache
+
+# event yang cukup dicatat sekali per invoice
+ONCE = {"qr_queued", "qr_started", "qr_done", "qr_served", "webhook", "reconciled"}
+
+# (nama tahap, event awal, event akhir); "invites_done" = undangan terkirim TERAKHIR
+STAGES: List[Tuple[str, str, str]] = [
+    ("created_to_qr_served", "created", "qr_served"),
+    ("qr_queued_to_qr_served", "qr_queued", "qr_served"),
+    ("qr_scrape", "qr_started", "qr_done"),
+    ("created_to_paid", "created", "paid"),
+    ("webhook_to_paid", "webhook", "paid"),
+    ("paid_to_first_invite", "paid", "invite_sent"),
+    ("paid_to_invites_done", "paid", "invites_done"),
+    ("created_to_invites_done", "created", "invites_done"),
+]
+PERCENTILES = (50, 90, 95, 99)
+REPORT_MAX_INVOICES = 50_000
+
+_MARKED = LRUCache("timeline_once", max_items=50_000)  # (invoice_id, event) sudah ditulis
+
+
+def mark(invoice_id: str, event: str) -> None:
+    """Catat event; tidak pernah raise (observability tidak boleh mengganggu alur bayar)."""
+    once = event in ONCE
+    if once:
+        key = (invoice_id, event)
+        if _MARKED.get(key, count=False):
+            return
+        _MARKED.set(key, True)
+    try:
+        storage.timeline_append(invoice_id, event, once=once)
+    except Exception as e:
+        print(f"[timeline] mark {event} failed:", e)
+
+
+def parse(raw: Optional[str]) -> List[Tuple[str, Optional[str], int]]:
+    """'invite_sent:-100@1700000000123;' → [("invite_sent", "-100", 1700000000123)]"""
+    out = []
+    for tok in (raw or "").split(";"):
+        name, _, ms = tok.rpartition("@")
+        if not name or not ms.isdigit():
+            continue
+        event, _, detail = name.partition(":")
+        out.append((event, detail or None, int(ms)))
+    return out
+
+
+def _firsts(events: List[Tuple[str, Optional[str], int]]) -> Dict[str, int]:
+    first: Dict[str, int] = {}
+    for event, _, ms in events:
+        first.setdefault(event, ms)
+    # selesai = setiap grup yang pernah dicoba akhirnya terkirim (retry sukses tetap dihitung)
+    sent = {d: ms for event, d, ms in events if event == "invite_sent"}
+    tried = {d for event, d, _ in events if event in ("invite_sent", "invite_failed")}
+    if sent and set(sent) == tried:
+        first["invites_done"] = max(sent.values())
+    return first
+
+
+def get(invoice_id: str) -> Optional[Dict[str, Any]]:
+    row = storage.get_timeline(invoice_id)
+    if not row:
+        return None
+    events = parse(row.get("timeline"))
+    t0 = events[0][2] if events else None
+    return {
+        "invoice_id": row["invoice_id"],
+        "status": row.get("status"),
+        "events": [
+            {"event": e, "detail": d, "at_ms": ms, "since_created_ms": ms - t0}
+            for e, d, ms in events
+        ],
+        "stages_ms": _stage_durations(_firsts(events)),
+    }
+
+
+def _stage_durations(first: Dict[str, int]) -> Dict[str, int]:
+    return {
+        name: first[b] - first[a]
+        for name, a, b in STAGES
+        if a in first and b in first and first[b] >= first[a]
+    }
+
+
+def _pct(sorted_vals: List[int], p: float) -> int:
+    # nearest-rank
+    return sorted_vals[max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)]
+
+
+def report(window_s: int) -> Dict[str, Any]:
+    """Persentil (ms) per tahap untuk invoice yang dibuat dalam window_s detik terakhir."""
+    rows = storage.list_timelines(int(time.time()) - window_s, REPORT_MAX_INVOICES)
+    samples: Dict[str, List[int]] = {name: [] for name, _, _ in STAGES}
+    for raw in rows:
+        for name, ms in _stage_durations(_firsts(parse(raw))).items():
+            samples[name].append(ms)
+    stages = {}
+    for name, vals in samples.items():
+        if not vals:
+            stages[name] = {"count": 0}
+            continue
+        vals.sort()
+        stages[name] = {
+            "count": len(vals),
+            **{f"p{p}": _pct(vals, p) for p in PERCENTILES},
+            "max": vals[-1],
+        }
+    return {"window_s": window_s, "invoices": len(rows), "stages_ms": stages}
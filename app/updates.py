@@ -0,0 +1,121 @@
+# app/updates.py
+# ------------------------------------------------------------
+# Antrian update Telegram (webhook fast-ack):
+# - webhook hanya validasi secret + enqueue → langsung 200 ke Telegram
+# - worker pool terbatas memanggil application.process_update di background
+# - update_id yang dikirim ulang Telegram (redelivery) di-dedupe
+# - antrian penuh → webhook balas 503 (Telegram akan kirim ulang nanti)
+# - statistik: kedalaman antrian, lag (terima → mulai diproses), error
+#
+# ENV:
+#   UPDATE_WORKERS=8           (opsional; jumlah worker)
+#   UPDATE_QUEUE_MAX=1000      (opsional; maks update menunggu)
+#   UPDATE_DEDUPE_TTL=3600     (opsional; detik update_id diingat)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+
+from .cache import LRUCache
+
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+UPDATE_QUEUE_MAX = int(os.getenv("UPDATE_QUEUE_MAX", "1000"))
+UPDATE_DEDUPE_TTL = float(os.getenv("UPDATE_DEDUPE_TTL", "3600"))
+STOP_DRAIN_S = 10.0  # saat shutdown: beri waktu antrian habis dulu
+
+QUEUED, DUPLICATE, FULL = "queued", "duplicate", "full"
+
+_SEEN = LRUCache("update_ids", max_items=20_000, ttl=UPDATE_DEDUPE_TTL)
+_QUEUE: Optional[asyncio.Queue] = None
+_WORKERS: List[asyncio.Task] = []
+_APP = None
+_STATS: Dict[str, Any] = {
+    "received": 0, "processed": 0, "duplicates": 0, "rejected_full": 0, "errors": 0,
+    "lag_last_ms": 0.0, "lag_max_ms": 0.0, "lag_avg_ms": 0.0, "busy": 0,
+}
+
+
+def _observe_lag(lag_ms: float) -> None:
+    _STATS["lag_last_ms"] = round(lag_ms, 1)
+    _STATS["lag_max_ms"] = round(max(_STATS["lag_max_ms"], lag_ms), 1)
+    # EWMA supaya angka rata-rata mengikuti kondisi terbaru
+    _STATS["lag_avg_ms"] = round(_STATS["lag_avg_ms"] * 0.9 + lag_ms * 0.1, 1)
+
+
+async def _worker(n: int) -> None:
+    while True:
+        received_at, data = await _QUEUE.get()
+        _observe_lag((time.monotonic() - received_at) * 1000)
+        _STATS["busy"] += 1
+        try:
+            update = Update.de_json(data, _APP.bot)
+            await _APP.process_update(update)
+            _STATS["processed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _STATS["errors"] += 1
+            print(f"[updates] worker {n} failed on update {data.get('update_id')}:", e)
+        finally:
+            _STATS["busy"] -= 1
+            _QUEUE.task_done()
+
+
+def start(application) -> None:
+    """Dipanggil di on_start setelah application.start()."""
+    global _QUEUE, _APP
+    if _WORKERS:
+        return
+    _APP = application
+    _QUEUE = asyncio.Queue(maxsize=UPDATE_QUEUE_MAX)
+    _WORKERS.extend(asyncio.create_task(_worker(i)) for i in range(UPDATE_WORKERS))
+    print(f"[updates] {UPDATE_WORKERS} workers, queue max {UPDATE_QUEUE_MAX}")
+
+
+async def stop() -> None:
+    """Tunggu antrian habis (maks STOP_DRAIN_S), lalu hentikan worker."""
+    if _QUEUE is not None and _WORKERS:
+        try:
+            await asyncio.wait_for(_QUEUE.join(), STOP_DRAIN_S)
+        except asyncio.TimeoutError:
+            print(f"[updates] shutdown with {_QUEUE.qsize()} updates still queued")
+    for t in _WORKERS:
+        t.cancel()
+    await asyncio.gather(*_WORKERS, return_exceptions=True)
+    _WORKERS.clear()
+
+
+def enqueue(data: Dict[str, Any]) -> str:
+    """Return QUEUED / DUPLICATE / FULL. Tidak pernah menunggu handler."""
+    _STATS["received"] += 1
+    uid = data.get("update_id")
+    if uid is not None and _SEEN.get(uid) is not None:
+        _STATS["duplicates"] += 1
+        return DUPLICATE
+    try:
+        _QUEUE.put_nowait((time.monotonic(), data))
+    except asyncio.QueueFull:
+        _STATS["rejected_full"] += 1
+        return FULL  # tidak ditandai "seen" → redelivery Telegram tetap diproses
+    if uid is not None:
+        _SEEN.set(uid, True)
+    return QUEUED
+
+
+def running() -> bool:
+    return bool(_WORKERS)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_STATS,
+        "depth": _QUEUE.qsize() if _QUEUE is not None else 0,
+        "max": UPDATE_QUEUE_MAX,
+        "workers": len(_WORKERS),
+    }
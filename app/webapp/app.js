@@ -28,6 +28,8 @@ function showEmpty(message) {
 // Normalisasi transform ImageKit agar tidak dobel '?'
 function withTransform(url, tr = 'w-600,fo-auto') {
   if (!url) return url;
+  // thumbnail dari proxy lokal /img sudah di-resize server
+  if (url.startsWith('/img/')) return url;
   // kalau sudah ada ?tr=, biarkan saja
   if (/\btr=/.test(url)) return url;
   return url.includes('?') ? `${url}&tr=${tr}` : `${url}?tr=${tr}`;
@@ -88,7 +90,9 @@ if (!window.__UID__) {
 /* ---------------- Boot (idempotent) ---------------- */
 async function initUI() {
   try {
-    const r = await fetch('/api/config', { cache: 'no-store' });
+    // ?uid → gambar acak stabil per user (respon bisa di-cache); no-cache → revalidasi ETag (304)
+    const q = window.__UID__ ? `?uid=${encodeURIComponent(window.__UID__)}` : '';
+    const r = await fetch(`/api/config${q}`, { cache: 'no-cache' });
     if (!r.ok) throw new Error(`HTTP ${r.status}`);
     const cfg = await r.json();
     console.log('[config]', cfg);
@@ -466,6 +470,21 @@ function showPaymentExpired() {
   document.getElementById('btnBackOrder')?.addEventListener('click', hideQRModal);
 }
 
+// GET QR; 429 → tunggu Retry-After (1..30 dtk) lalu coba lagi sampai deadline.
+// Return object URL gambar, atau null bila gagal / elemen sudah hilang.
+async function loadQrWithRetry(url, imgEl, deadlineMs) {
+  while (Date.now() < deadlineMs && imgEl.isConnected) {
+    let res = null;
+    try { res = await fetch(url, { cache: 'no-store' }); } catch { }
+    if (res && res.ok) return URL.createObjectURL(await res.blob());
+    if (!res || res.status !== 429) return null;
+    const retryAfter = parseFloat(res.headers.get('Retry-After')) || 5;
+    const waitMs = Math.min(Math.max(retryAfter, 1), 30) * 1000;
+    await new Promise((r) => setTimeout(r, Math.min(waitMs, Math.max(0, deadlineMs - Date.now()))));
+  }
+  return null;
+}
+
 async function onPay(){
   const selected = getSelectedIds();
   const selectedNames = getSelectedGroupNames(selected);   // <— ambil nama2nya
@@ -501,7 +520,7 @@ async function onPay(){
       <div style="height:6px;background:#222;border-radius:6px;overflow:hidden;margin:8px 0 14px">
         <div id="qrProg" style="height:100%;width:0%;background:#fff3;border-radius:6px"></div>
       </div>
-      <img id="qrImg" alt="QR" src="${qrPngUrl}" style="max-width:100%;display:block;margin:0 auto;border-radius:10px;border:1px solid #ffffff1a">
+      <img id="qrImg" alt="QR" style="max-width:100%;display:block;margin:0 auto;border-radius:10px;border:1px solid #ffffff1a">
       <button class="close" id="closeModal">Tutup</button>
     </div>
   `);
@@ -515,28 +534,70 @@ async function onPay(){
   if (qrImg) {
     const onReady = () => { stopQrCountdown(); startPayCountdown(900); };
     const onError = () => { stopQrCountdown(); showPaymentLoadFailed(selectedNames); };
-    if (qrImg.complete && qrImg.naturalWidth > 10) onReady();
-    else {
-      qrImg.addEventListener('load', onReady, { once:true });
-      qrImg.addEventListener('error', onError, { once:true });
-    }
+    qrImg.addEventListener('load', onReady, { once:true });
+    qrImg.addEventListener('error', onError, { once:true });
+    // fetch (bukan <img src>) supaya 429 + Retry-After (slot scraper penuh) di-retry
+    loadQrWithRetry(qrPngUrl, qrImg, Date.now() + 180 * 1000).then((src) => {
+      if (!qrImg.isConnected) return;  // modal ditutup / sudah gagal karena countdown
+      if (src) qrImg.src = src; else onError();
+    });
   }
 
-  const statusUrl = `${window.location.origin}/api/invoice/${inv.invoice_id}/status`;
-  let t = setInterval(async ()=>{
+  watchInvoiceStatus(inv.invoice_id, () => {
+    hideQRModal();
+    tg?.close?.();
+  });
+}
+
+// ===== Status invoice: SSE (push) + fallback polling =====
+let __statusStream = null;
+
+function stopStatusWatch() {
+  if (__statusStream) { try { __statusStream.close(); } catch { } __statusStream = null; }
+  if (__statusPollTimer) { clearInterval(__statusPollTimer); __statusPollTimer = null; }
+}
+
+function startStatusPolling(invoiceId, onPaid) {
+  const statusUrl = `${window.location.origin}/api/invoice/${invoiceId}/status`;
+  if (__statusPollTimer) clearInterval(__statusPollTimer);
+  __statusPollTimer = setInterval(async ()=>{
     try{
       const r = await fetch(statusUrl);
       if(!r.ok) return;
       const s = await r.json();
       if (s.status === "PAID"){
-        clearInterval(t);
-        hideQRModal(); 
-        tg?.close?.();
+        stopStatusWatch();
+        onPaid?.();
       }
     }catch{}
   }, 2000);
 }
 
+function watchInvoiceStatus(invoiceId, onPaid) {
+  stopStatusWatch();
+  if (typeof EventSource === 'undefined') return startStatusPolling(invoiceId, onPaid);
+
+  // EventSource reconnect otomatis (kirim Last-Event-ID); kalau gagal terus → polling
+  let failures = 0;
+  const es = new EventSource(`${window.location.origin}/api/invoice/${invoiceId}/events`);
+  __statusStream = es;
+  es.addEventListener('status', (e) => {
+    failures = 0;
+    try {
+      const s = JSON.parse(e.data);
+      if (s.status === "PAID") { stopStatusWatch(); onPaid?.(); }
+    } catch { }
+  });
+  es.addEventListener('error', () => {
+    failures += 1;
+    if (es.readyState === EventSource.CLOSED || failures >= 3) {
+      try { es.close(); } catch { }
+      if (__statusStream === es) __statusStream = null;
+      startStatusPolling(invoiceId, onPaid);
+    }
+  });
+}
+
 
 function showQRModal(html) {
   const m = document.getElementById('qr');
@@ -547,7 +608,7 @@ function showQRModal(html) {
 function hideQRModal() {
   stopQrCountdown();
   stopPayCountdown();
-  if (__statusPollTimer) { clearInterval(__statusPollTimer); __statusPollTimer = null; }
+  stopStatusWatch();
   const m = document.getElementById('qr');
   m.hidden = true;
   m.innerHTML = '';
@@ -0,0 +1,38 @@
+# bench/_common.py
+# ------------------------------------------------------------
+# Helper bersama skrip bench: port bebas + server stand-in (FastAPI di
+# uvicorn, thread daemon) yang ditunggu sampai menerima koneksi.
+# Dipakai: from _common import free_port, serve   (bench/ ada di sys.path
+# saat skrip dijalankan sebagai python bench/bench_x.py)
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import socket
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port: int, what: str, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{what} did not start")
+
+
+def serve(app, port: int, what: str) -> None:
+    """Jalankan app ASGI stand-in di 127.0.0.1:port (thread daemon)."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    wait_port(port, what)
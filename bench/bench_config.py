@@ -0,0 +1,127 @@
+# bench/bench_config.py
+# ------------------------------------------------------------
+# Benchmark requests/sec untuk GET /api/config (in-process, tanpa jaringan):
+# - stand-in ImageKit lokal (listing folder) via IMAGEKIT_API_URL
+# - katalog sintetis N grup, masing-masing punya image_folder
+# - client httpx + ASGITransport, konkurensi C selama D detik
+#
+# Contoh (bandingkan 2 revisi dengan perintah yang sama):
+#   python bench/bench_config.py --groups 24 --concurrency 32 --seconds 5
+#   python bench/bench_config.py --uid --etag     # mode cache per-uid + 304
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from _common import free_port, serve
+
+
+def _start_fake_imagekit(port: int, files_per_folder: int) -> None:
+    """Stand-in minimal API ImageKit: GET /v1/files?path=/X&skip=&limit=."""
+    from fastapi import FastAPI, Query
+
+    fake = FastAPI()
+
+    @fake.get("/v1/files")
+    def files(path: str, skip: int = Query(0), limit: int = Query(100)):
+        end = min(files_per_folder, skip + limit)
+        return [
+            {"fileType": "image", "url": f"https://ik.example.test{path}/img_{i:04d}.jpg"}
+            for i in range(skip, end)
+        ]
+
+    serve(fake, port, "fake imagekit")
+
+
+def _setup_env(args) -> None:
+    port = free_port()
+    _start_fake_imagekit(port, args.files)
+    groups = [
+        {"id": f"-100{i:06d}", "name": f"Group {i}", "desc": "x" * 120, "image_folder": f"/F{i % args.folders}"}
+        for i in range(args.groups)
+    ]
+    os.environ.update(
+        BOT_TOKEN="123456:bench",
+        BASE_URL="http://127.0.0.1",
+        DB_PATH=os.path.join(tempfile.mkdtemp(), "bench.db"),
+        IMAGEKIT_PRIVATE_KEY="bench",
+        IMAGEKIT_API_URL=f"http://127.0.0.1:{port}/v1/files",
+        GROUP_IDS_JSON=json.dumps(groups),
+        ENV="bench",
+    )
+
+
+async def _run(args) -> dict:
+    import httpx
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from app import storage
+    from app.main import app
+
+    storage.init_db()  # ASGITransport tidak menjalankan lifespan/startup
+
+    transport = httpx.ASGITransport(app=app)
+    lat: list[float] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # warmup: isi cache listing ImageKit
+        for _ in range(3):
+            (await client.get("/api/config")).raise_for_status()
+
+        stop = time.perf_counter() + args.seconds
+        statuses: dict[int, int] = {}
+
+        async def worker(wid: int):
+            etag = None
+            params = {"uid": 1000 + wid} if args.uid else None
+            while time.perf_counter() < stop:
+                headers = {"Accept-Encoding": "gzip"}
+                if args.etag and etag:
+                    headers["If-None-Match"] = etag
+                t0 = time.perf_counter()
+                r = await client.get("/api/config", params=params, headers=headers)
+                lat.append(time.perf_counter() - t0)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+                etag = r.headers.get("etag") or etag
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3)
+    return {
+        "bench": "api_config",
+        "groups": args.groups,
+        "concurrency": args.concurrency,
+        "uid": args.uid,
+        "etag": args.etag,
+        "requests": len(lat),
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "statuses": statuses,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--groups", type=int, default=24)
+    ap.add_argument("--folders", type=int, default=8)
+    ap.add_argument("--files", type=int, default=100, help="gambar per folder di stand-in")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--uid", action="store_true", help="kirim ?uid= (respon di-cache per user)")
+    ap.add_argument("--etag", action="store_true", help="kirim If-None-Match dari respon sebelumnya")
+    args = ap.parse_args()
+    _setup_env(args)
+    print(json.dumps(asyncio.run(_run(args))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# bench/bench_e2e.py
+# ------------------------------------------------------------
+# Load test alur beli end-to-end dengan stand-in lokal (tanpa Telegram/Saweria asli):
+# - app dijalankan sebagai proses uvicorn terpisah (startup/shutdown asli, worker
+#   outbox/linkpool/updates ikut jalan), diarahkan ke stand-in via
+#   TELEGRAM_API_URL dan SAWERIA_BASE_URL
+# - fake Bot API: getMe, getChatMember, getChat, createChatInviteLink, sendMessage,
+#   setWebhook, ... (latency tambahan opsional); sendMessage dicatat per chat
+# - fake Saweria: halaman profil + form donasi (dipakai scraper Playwright),
+#   POST /api/donations → JSON berisi string QRIS, lalu pengirim webhook donasi;
+#   GET /api/feed = feed donasi masuk (terbaru dulu, dibaca app/reconcile.py);
+#   --drop-webhooks → sebagian webhook "hilang", PAID harus datang dari rekonsiliasi
+# - user simulasi datang dengan laju Poisson (--rate/detik), tiap user:
+#     config → gate → invoice → qr → status → webhook → paid (polling) → invites
+#
+# Output JSON: throughput, persentil latency per tahap, error rate, jumlah call
+# Telegram per method. --baseline + --max-regression → exit 1 bila regresi.
+#
+# Contoh:
+#   python bench/bench_e2e.py --users 50 --rate 5 --save bench/e2e_base.json
+#   python bench/bench_e2e.py --users 50 --rate 5 --baseline bench/e2e_base.json
+#   python bench/bench_e2e.py --no-qr ...       # tanpa Chromium (lewati tahap QR)
+#   python bench/bench_e2e.py --no-qr --drop-webhooks 0.3   # uji jalur rekonsiliasi
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import HTMLResponse
+
+from _common import free_port, serve
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STAGES = ("config", "gate", "invoice", "qr", "status", "webhook", "paid", "invites", "flow")
+SAWERIA_USER = "benchuser"
+GATE_GROUP = "-1009000001"
+NOISE_FLOOR_MS = 5.0  # selisih p95 di bawah ini tidak dihitung regresi
+
+
+# ---------- fake Bot API ----------
+def _start_fake_telegram(port: int, latency_ms: float, member_ratio: float) -> dict:
+    fake = FastAPI()
+    state = {"calls": {}, "messages": {}}
+    bot_user = {"id": 4242, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+    seq = {"msg": 0}
+
+    def _link(chat_id, revoked=False):
+        return {
+            "invite_link": f"https://t.me/+{uuid.uuid4().hex[:16]}", "creator": bot_user,
+            "creates_join_request": False, "is_primary": False, "is_revoked": revoked, "member_limit": 1,
+        }
+
+    @fake.post("/bot{token}/{method}")
+    async def api(token: str, method: str, request: Request):
+        form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+        state["calls"][method] = state["calls"].get(method, 0) + 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        chat_id = form.get("chat_id")
+        if method == "getMe":
+            result = bot_user
+        elif method == "getChatMember":
+            status = "member" if random.random() < member_ratio else "left"
+            result = {"status": status, "user": {"id": int(form.get("user_id", 0)), "is_bot": False, "first_name": "u"}}
+        elif method == "getChat":
+            result = {"id": int(chat_id), "type": "supergroup", "title": f"Group {chat_id}",
+                      "accent_color_id": 0, "max_reaction_count": 11}
+        elif method == "getChatMemberCount":
+            result = 100
+        elif method in ("createChatInviteLink", "revokeChatInviteLink"):
+            result = _link(chat_id, revoked=method == "revokeChatInviteLink")
+        elif method == "exportChatInviteLink":
+            result = _link(chat_id)["invite_link"]
+        elif method in ("sendMessage", "sendPhoto"):
+            seq["msg"] += 1
+            state["messages"].setdefault(str(chat_id), []).append((time.perf_counter(), form.get("text", "")))
+            result = {"message_id": seq["msg"], "date": int(time.time()),
+                      "chat": {"id": int(chat_id), "type": "private"}, "text": form.get("text", "")}
+        else:  # setWebhook, setMyCommands, setChatMenuButton, deleteMyCommands, ...
+            result = True
+        return {"ok": True, "result": result}
+
+    serve(fake, port, "fake telegram")
+    return state
+
+
+# ---------- fake Saweria ----------
+def _qris_payload(ref: str) -> str:
+    """String QRIS sintetis yang valid (TLV EMV + CRC16) per donasi."""
+    from app.qris import _crc16_ccitt
+    tlv = lambda tag, v: f"{tag}{len(v):02d}{v}"
+    body = (
+        tlv("00", "01") + tlv("01", "12") + tlv("26", tlv("00", "ID.CO.BENCH.WWW"))
+        + tlv("58", "ID") + tlv("59", "BENCH MERCHANT") + tlv("60", "JAKARTA")
+        + tlv("62", tlv("05", ref)) + "6304"
+    )
+    return body + f"{_crc16_ccitt(body.encode('ascii')):04X}"
+
+
+_PROFILE_HTML = """<!doctype html><html><body>
+<form onsubmit="return false">
+  <input name="amount" type="number" placeholder="Ketik jumlah dukungan">
+  <input name="name" type="text" placeholder="Dari">
+  <input name="email" type="email">
+  <input name="message" placeholder="Pesan">
+  <label><input type="checkbox"> Umur 17 tahun ke atas</label>
+  <label><input type="checkbox"> Saya menyetujui syarat</label>
+  <label><input type="checkbox"> Baca kebijakan privasi</label>
+  <label><input type="checkbox"> Setuju ketentuan layanan</label>
+  <p>Metode pembayaran</p>
+  <button type="button" data-testid="gopay-button" onclick="pick()">GoPay</button>
+  <div id="jd">Jumlah Dukungan: Rp0</div><div id="tot">Total: Rp0</div>
+  <button type="button" data-testid="donate-button" onclick="donate()">Kirim Dukungan</button>
+  <div id="qr"></div>
+</form>
+<script>
+const amt = () => parseInt(document.querySelector('[name=amount]').value || '0');
+const fmt = n => n.toString().replace(/\\B(?=(\\d{3})+(?!\\d))/g, '.');
+document.querySelector('[name=amount]').addEventListener('input',
+  () => { document.getElementById('jd').textContent = 'Jumlah Dukungan: Rp' + fmt(amt()); });
+function pick() { document.getElementById('tot').textContent = 'Total: Rp' + fmt(amt()); }
+async function donate() {
+  const r = await fetch('/api/donations', {method: 'POST', headers: {'content-type': 'application/json'},
+    body: JSON.stringify({amount: amt(), message: document.querySelector('[name=message]').value})});
+  const j = await r.json();
+  document.getElementById('qr').innerHTML = '<img alt="qr-code" src="/qr-code/' + j.data.id + '.png">';
+}
+</script></body></html>"""
+
+
+def _start_fake_saweria(port: int) -> dict:
+    fake = FastAPI()
+    state = {"profile": 0, "donations": 0, "payloads": {}, "feed": [], "feed_reads": 0, "dropped": 0}
+
+    @fake.get(f"/{SAWERIA_USER}")
+    def profile():
+        state["profile"] += 1
+        return HTMLResponse(_PROFILE_HTML)
+
+    @fake.post("/api/donations")
+    async def donations(request: Request):
+        body = await request.json()
+        state["donations"] += 1
+        did = uuid.uuid4().hex[:12]
+        state["payloads"][did] = _qris_payload(did)
+        return {"data": {"id": did, "amount": body.get("amount"), "qr_string": state["payloads"][did]}}
+
+    @fake.get("/qr-code/{name}")
+    def qr_png(name: str):
+        from app.qris import render
+        payload = state["payloads"].get(name.split(".")[0])
+        if not payload:
+            return Response(status_code=404)
+        return Response(render(payload, "png", 512), media_type="image/png")
+
+    @fake.get("/api/feed")
+    def feed(page: int = 1, page_size: int = 50):
+        state["feed_reads"] += 1
+        newest_first = state["feed"][::-1]
+        return {"data": {"donations": newest_first[(page - 1) * page_size:page * page_size]}}
+
+    serve(fake, port, "fake saweria")
+    return state
+
+
+async def _send_donation_webhook(client, saweria: dict, invoice_id: str, amount: int, drop: float):
+    """Donasi masuk feed, lalu webhook ala Saweria (pesan INV:<id>); sebagian bisa "hilang"."""
+    donation = {
+        "id": uuid.uuid4().hex[:12], "amount_raw": amount, "donator_name": "Budi",
+        "message": f"INV:{invoice_id}", "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    saweria["feed"].append(donation)
+    if random.random() < drop:
+        saweria["dropped"] += 1
+        return None
+    return await client.post("/api/saweria/webhook", json={"type": "donation", **donation})
+
+
+# ---------- app ----------
+def _start_app(args, port: int, tg_port: int, saweria_port: int, groups: list) -> tuple:
+    tmp = tempfile.mkdtemp(prefix="bench_e2e_")
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:bench",
+        "BASE_URL": f"http://127.0.0.1:{port}",
+        "DB_PATH": os.path.join(tmp, "bench.db"),
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{tg_port}",
+        "SAWERIA_USERNAME": SAWERIA_USER,
+        "SAWERIA_BASE_URL": f"http://127.0.0.1:{saweria_port}",
+        "SAWERIA_FEED_URL": f"http://127.0.0.1:{saweria_port}/api/feed",
+        "RECONCILE_INTERVAL": "1" if args.drop_webhooks else "60",
+        "GROUP_IDS_JSON": json.dumps(groups),
+        "REQUIRED_GROUP_IDS": GATE_GROUP,
+        "WEBHOOK_SECRET": "bench",
+        "PWR_PREWARM": "1" if args.qr else "0",
+        "ADMISSION": "0",  # semua user simulasi dari 1 IP; uji admission via --env ADMISSION=1
+        "ENV": "bench",
+    }
+    for kv in args.env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+    log_path = os.path.join(tmp, "app.log")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=open(log_path, "w"), stderr=subprocess.STDOUT,
+    )
+    return proc, log_path
+
+
+async def _wait_ready(client, proc, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("app not ready")
+
+
+# ---------- user simulasi ----------
+class StageError(Exception):
+    pass
+
+
+async def _user(i: int, client, args, groups: list, tg: dict, saweria: dict, res: dict) -> None:
+    uid = 7_000_000 + i
+    buy = [g["id"] for g in random.sample(groups, args.groups_per_user)]
+    t_flow = time.perf_counter()
+
+    async def stage(name, fn):
+        t0 = time.perf_counter()
+        try:
+            out = await asyncio.wait_for(fn(), args.timeout)
+        except Exception as e:
+            res[name]["errors"] += 1
+            key = f"{name}: {type(e).__name__}: {str(e)[:80]}"
+            res["_errors"][key] = res["_errors"].get(key, 0) + 1
+            raise StageError(name) from e
+        res[name]["lat"].append(time.perf_counter() - t0)
+        return out
+
+    async def ok(method, url, **kw):
+        r = await client.request(method, url, **kw)
+        res["_http"] += 1
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code}")
+        return r
+
+    try:
+        await stage("config", lambda: ok("GET", "/api/config", params={"uid": uid}))
+        gate = (await stage("gate", lambda: ok("GET", "/api/gate/status", params={"uid": uid}))).json()
+        if not gate.get("passed"):
+            res["_gate_blocked"] += 1
+            return
+        inv = (await stage("invoice", lambda: ok("POST", "/api/invoice", json={
+            "user_id": uid, "groups": buy, "amount": args.amount,
+        }))).json()
+        iid = inv["invoice_id"]
+        if args.qr:
+            await stage("qr", lambda: ok("GET", f"/api/qr/{iid}.png"))
+        await stage("status", lambda: ok("GET", f"/api/invoice/{iid}/status"))
+        await asyncio.sleep(args.pay_delay)  # user membayar
+
+        t_paid = time.perf_counter()
+        await stage("webhook", lambda: _send_donation_webhook(client, saweria, iid, args.amount, args.drop_webhooks))
+
+        async def poll_paid():
+            while True:
+                st = (await ok("GET", f"/api/invoice/{iid}/status")).json()
+                if st.get("status") == "PAID":
+                    return
+                await asyncio.sleep(args.poll_ms / 1000)
+
+        async def wait_invites():
+            while True:
+                got = [t for t, text in tg["messages"].get(str(uid), []) if t >= t_paid and "t.me/" in text]
+                if len(got) >= len(buy):
+                    return
+                await asyncio.sleep(0.02)
+
+        t0 = time.perf_counter()
+        await stage("paid", poll_paid)
+        res["paid"]["lat"][-1] = time.perf_counter() - t_paid  # webhook terkirim → PAID terlihat
+        await stage("invites", wait_invites)
+        res["invites"]["lat"][-1] = time.perf_counter() - t_paid  # webhook terkirim → semua undangan masuk
+        res["flow"]["lat"].append(time.perf_counter() - t_flow)
+    except StageError:
+        res["flow"]["errors"] += 1
+
+
+def _pct(vals: list, p: float) -> float:
+    return round(vals[max(0, math.ceil(p / 100 * len(vals)) - 1)] * 1000, 2)
+
+
+def _summarize(res: dict, elapsed: float, args) -> dict:
+    stages = {}
+    for name in STAGES:
+        lat = sorted(res[name]["lat"])
+        n, err = len(lat), res[name]["errors"]
+        s = {"count": n, "errors": err, "error_rate": round(err / (n + err), 4) if n + err else 0.0}
+        if lat:
+            s.update(p50_ms=_pct(lat, 50), p95_ms=_pct(lat, 95), p99_ms=_pct(lat, 99), max_ms=round(lat[-1] * 1000, 2))
+        stages[name] = s
+    return {
+        "bench": "e2e",
+        "users": args.users,
+        "rate": args.rate,
+        "qr": args.qr,
+        "groups_per_user": args.groups_per_user,
+        "elapsed_s": round(elapsed, 2),
+        "completed": stages["flow"]["count"],
+        "flows_per_s": round(stages["flow"]["count"] / elapsed, 2) if elapsed else 0.0,
+        "http_rps": round(res["_http"] / elapsed, 1) if elapsed else 0.0,
+        "gate_blocked": res["_gate_blocked"],
+        "stages": stages,
+        "errors": res["_errors"],
+    }
+
+
+def _regressions(cur: dict, base: dict, max_regression: float, max_error_rate: float) -> list:
+    out = []
+    for name, s in cur["stages"].items():
+        if s["error_rate"] > max_error_rate:
+            out.append(f"{name}: error_rate {s['error_rate']} > {max_error_rate}")
+        b = (base.get("stages") or {}).get(name) or {}
+        if "p95_ms" in s and "p95_ms" in b:
+            limit = b["p95_ms"] * (1 + max_regression)
+            if s["p95_ms"] > limit and s["p95_ms"] - b["p95_ms"] > NOISE_FLOOR_MS:
+                out.append(f"{name}: p95 {s['p95_ms']}ms > {round(limit, 2)}ms (baseline {b['p95_ms']}ms)")
+    return out
+
+
+async def _run(args) -> dict:
+    import httpx
+    sys.path.insert(0, ROOT)
+    tg_port, sw_port, app_port = free_port(), free_port(), free_port()
+    groups = [{"id": f"-100{8000000 + i}", "name": f"Group {i}", "desc": "bench"} for i in range(args.groups)]
+    tg = _start_fake_telegram(tg_port, args.tg_latency_ms, args.member_ratio)
+    saweria = _start_fake_saweria(sw_port)
+    proc, log_path = _start_app(args, app_port, tg_port, sw_port, groups)
+
+    res = {name: {"lat": [], "errors": 0} for name in STAGES}
+    res.update(_http=0, _gate_blocked=0, _errors={})
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=args.timeout) as client:
+            await _wait_ready(client, proc)
+            t0 = time.perf_counter()
+            tasks = []
+            for i in range(args.users):
+                tasks.append(asyncio.create_task(_user(i, client, args, groups, tg, saweria, res)))
+                await asyncio.sleep(random.expovariate(args.rate))  # kedatangan Poisson
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - t0
+    except Exception:
+        print(f"[bench] app log: {log_path}", file=sys.stderr)
+        raise
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    out = _summarize(res, elapsed, args)
+    out["telegram_calls"] = dict(sorted(tg["calls"].items()))
+    out["saweria"] = {
+        "profile_loads": saweria["profile"], "donations": saweria["donations"],
+        "webhooks_dropped": saweria["dropped"], "feed_reads": saweria["feed_reads"],
+    }
+    out["app_log"] = log_path
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Load test alur beli end-to-end (stand-in lokal)")
+    ap.add_argument("--users", type=int, default=50, help="jumlah user simulasi")
+    ap.add_argument("--rate", type=float, default=5.0, help="kedatangan user per detik (Poisson)")
+    ap.add_argument("--groups", type=int, default=12, help="grup di katalog")
+    ap.add_argument("--groups-per-user", type=int, default=1)
+    ap.add_argument("--amount", type=int, default=25000)
+    ap.add_argument("--qr", action=argparse.BooleanOptionalAction, default=True,
+                    help="tahap QR lewat scraper (butuh Chromium Playwright)")
+    ap.add_argument("--pay-delay", type=float, default=0.5, help="detik antara QR tampil dan webhook")
+    ap.add_argument("--drop-webhooks", type=float, default=0.0,
+                    help="peluang webhook tidak dikirim (PAID lewat rekonsiliasi feed)")
+    ap.add_argument("--poll-ms", type=float, default=250, help="interval polling status setelah bayar")
+    ap.add_argument("--tg-latency-ms", type=float, default=30, help="latency tambahan fake Bot API")
+    ap.add_argument("--member-ratio", type=float, default=1.0, help="peluang user lolos gate")
+    ap.add_argument("--connections", type=int, default=200)
+    ap.add_argument("--timeout", type=float, default=90.0, help="detik per tahap")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VAL", help="ENV tambahan untuk app")
+    ap.add_argument("--save", help="simpan hasil JSON (jadi baseline run berikutnya)")
+    ap.add_argument("--baseline", help="JSON hasil run sebelumnya untuk dibandingkan")
+    ap.add_argument("--max-regression", type=float, default=0.20, help="kenaikan p95 per tahap yang ditoleransi")
+    ap.add_argument("--max-error-rate", type=float, default=0.01, help="error rate maksimum per tahap")
+    args = ap.parse_args()
+    if args.groups_per_user > args.groups:
+        ap.error("--groups-per-user > --groups")
+
+    out = asyncio.run(_run(args))
+    print(json.dumps(out, indent=2))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(out, f, indent=2)
+
+    base = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+    problems = _regressions(out, base, args.max_regression, args.max_error_rate)
+    if problems:
+        print("REGRESSION:\n  " + "\n  ".join(problems), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# bench/bench_img.py
+# ------------------------------------------------------------
+# Benchmark proxy thumbnail /img (in-process) dengan origin stand-in lokal:
+# - origin lokal menyajikan JPEG sintetis (N gambar) → IMG_PROXY_ORIGINS=127.0.0.1
+# - fase cold: setiap (gambar, lebar, format) pertama kali (fetch + resize + tulis disk)
+# - fase warm: request acak ke varian yang sudah ada (baca disk)
+#
+# Contoh:
+#   python bench/bench_img.py --images 20 --concurrency 16 --seconds 5
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from _common import free_port, serve
+
+
+def _start_origin(port: int, size: int) -> dict:
+    """Stand-in origin: GET /src/{i}.jpg → JPEG sintetis size×size."""
+    from fastapi import FastAPI, Response
+    from PIL import Image
+
+    fake = FastAPI()
+    hits = {"n": 0}
+
+    @fake.get("/src/{name}")
+    def src(name: str):
+        hits["n"] += 1
+        i = int(name.split(".")[0])
+        img = Image.new("RGB", (size, size * 3 // 4), ((i * 37) % 255, (i * 91) % 255, 160))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        return Response(buf.getvalue(), media_type="image/jpeg")
+
+    serve(fake, port, "origin")
+    return hits
+
+
+async def _run(args, origin_hits: dict, port: int) -> dict:
+    import httpx
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from app import storage, thumbs
+    from app.main import app
+
+    storage.init_db()  # ASGITransport tidak menjalankan lifespan/startup
+
+    srcs = [f"http://127.0.0.1:{port}/src/{i}.jpg" for i in range(args.images)]
+    urls = [thumbs.proxy_url(s, w, f) for s in srcs for w in thumbs.IMG_WIDTHS for f in ("webp", "jpg")]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def cold(u):
+            async with sem:
+                (await client.get(u)).raise_for_status()
+
+        await asyncio.gather(*(cold(u) for u in urls))
+        cold_s = time.perf_counter() - t0
+
+        lat: list[float] = []
+        stop = time.perf_counter() + args.seconds
+
+        async def worker():
+            while time.perf_counter() < stop:
+                t = time.perf_counter()
+                (await client.get(random.choice(urls))).raise_for_status()
+                lat.append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3)
+    return {
+        "bench": "img_proxy",
+        "variants": len(urls),
+        "origin_fetches": origin_hits["n"],
+        "cold_s": round(cold_s, 3),
+        "warm_rps": round(len(lat) / elapsed, 1),
+        "warm_p50_ms": pct(0.50),
+        "warm_p99_ms": pct(0.99),
+        "cache": thumbs.stats(),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=20)
+    ap.add_argument("--source-px", type=int, default=1600)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    port = free_port()
+    hits = _start_origin(port, args.source_px)
+    os.environ.update(
+        BOT_TOKEN="123456:bench",
+        BASE_URL="http://127.0.0.1",
+        DB_PATH=os.path.join(tempfile.mkdtemp(), "bench.db"),
+        IMG_CACHE_DIR=tempfile.mkdtemp(),
+        IMG_PROXY_ORIGINS="127.0.0.1",
+        ENV="bench",
+    )
+    print(json.dumps(asyncio.run(_run(args, hits, port))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# bench/bench_qr.py
+# ------------------------------------------------------------
+# Round-trip render → decode app/qris.py (tanpa jaringan):
+# - payload QRIS sintetis (TLV + CRC valid) dengan panjang acak
+# - tiap payload di-render qris.render(..., "png", size) untuk --sizes
+#   (default termasuk 720 = QR_DEFAULT_SIZE) + qrcode.make() apa adanya
+# - decode_png harus mengembalikan payload yang sama; gagal → exit 1
+# - capture jaringan scraper (_attach_qr_capture) dengan PNG "Saweria" besar
+#   (QR 1080px tajam di kartu putih 1200px, RGBA) lewat context/response
+#   stand-in: future harus selesai dengan payload (bukan menunggu fallback DOM)
+# - laporan: jumlah gagal per ukuran + latency decode p50/p99
+#
+# Contoh:
+#   python bench/bench_qr.py
+#   python bench/bench_qr.py --payloads 200 --sizes 256,720,1440
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import qris  # noqa: E402
+
+
+def _tlv(tag: str, value: str) -> str:
+    return f"{tag}{len(value):02d}{value}"
+
+
+def _payload(rnd: random.Random) -> str:
+    merchant = _tlv("00", "ID.CO.SAWERIA.WWW") + _tlv("01", "".join(rnd.choices(string.digits, k=18)))
+    ref = "INV" + "".join(rnd.choices("0123456789abcdef-", k=rnd.randint(10, 40)))
+    body = (
+        _tlv("00", "01") + _tlv("01", "12") + _tlv("26", merchant)
+        + _tlv("52", "5812") + _tlv("53", "360") + _tlv("54", str(rnd.randint(1000, 999999)))
+        + _tlv("58", "ID") + _tlv("59", "X" * rnd.randint(5, 25)) + _tlv("60", "Jakarta")
+        + _tlv("62", _tlv("05", ref)) + "6304"
+    )
+    return body + f"{qris._crc16_ccitt(body.encode()):04X}"
+
+
+def _qrcode_make(payload: str) -> bytes:
+    import qrcode
+    buf = io.BytesIO()
+    qrcode.make(payload).save(buf)
+    return buf.getvalue()
+
+
+def _saweria_png(payload: str, qr_px: int = 1080, card_px: int = 1200) -> bytes:
+    """PNG mirip respons /qr-code Saweria: QR tajam besar di kartu putih RGBA."""
+    from PIL import Image
+    qr = Image.open(io.BytesIO(qris.render(payload, "png", qr_px))).convert("RGBA")
+    card = Image.new("RGBA", (card_px, card_px), (255, 255, 255, 255))
+    card.paste(qr, ((card_px - qr.width) // 2, (card_px - qr.height) // 2))
+    buf = io.BytesIO()
+    card.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Resp:
+    """Stand-in playwright Response (url, headers, body())."""
+
+    def __init__(self, url: str, body: bytes):
+        self.url = url
+        self.headers = {"content-type": "image/png"}
+        self._body = body
+
+    async def body(self) -> bytes:
+        return self._body
+
+
+class _Context:
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, event: str, fn) -> None:
+        self.handlers.append(fn)
+
+
+async def _capture(payload: str, timeout: float) -> bool:
+    from app import scraper
+    ctx = _Context()
+    captured = scraper._attach_qr_capture(ctx)
+    for fn in ctx.handlers:
+        await fn(_Resp("https://backend.saweria.co/donations/qr-code/x", _saweria_png(payload)))
+    try:
+        res = await asyncio.wait_for(captured, timeout)
+    except asyncio.TimeoutError:
+        return False
+    return res.get("qris") == payload
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payloads", type=int, default=30)
+    ap.add_argument("--sizes", default="256,512,720,1024,1440")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    if not qris.can_decode():
+        raise SystemExit("no QR decoder installed (opencv-python-headless / pyzbar)")
+
+    rnd = random.Random(args.seed)
+    cases = [(str(s), lambda p, s=int(s): qris.render(p, "png", s)) for s in args.sizes.split(",")]
+    cases.append(("qrcode.make", _qrcode_make))
+    failed = {name: 0 for name, _ in cases}
+    lat: list[float] = []
+    for _ in range(args.payloads):
+        payload = _payload(rnd)
+        for name, make in cases:
+            png = make(payload)
+            t0 = time.perf_counter()
+            got = qris.decode_png(png)
+            lat.append(time.perf_counter() - t0)
+            if got != payload:
+                failed[name] += 1
+
+    capture_failed = sum(
+        not asyncio.run(_capture(_payload(rnd), 10.0)) for _ in range(min(args.payloads, 10))
+    )
+
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2)
+    out = {
+        "bench": "qr_roundtrip",
+        "payloads": args.payloads,
+        "failed": failed,
+        "capture_failed": capture_failed,
+        "decode_p50_ms": pct(0.50),
+        "decode_p99_ms": pct(0.99),
+    }
+    print(json.dumps(out))
+    if any(failed.values()) or capture_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# bench/bench_storage.py
+# ------------------------------------------------------------
+# Micro-benchmark fungsi app/storage.py di DB temp (SQLite file, WAL):
+# - operasi: create_invoice, get_invoice, update_invoice_status, mark_paid,
+#   update_qris_payload (data URL ~100 KB), add_invite_log, list_invite_logs
+# - beberapa ukuran tabel (--sizes; invoices + invite_logs diisi lebih dulu)
+# - beberapa tingkat konkurensi (--concurrency; thread, seperti to_thread /
+#   beberapa request yang menunggu SQLite bersamaan)
+# - warmup tidak dihitung; tiap sel diulang --repeats kali, gc dimatikan saat
+#   mengukur; hasil = median throughput antar ulangan + persentil latency
+#   gabungan + CV antar ulangan (cv > --noisy-cv ditandai "noisy")
+#
+# Hasil JSON disimpan (--out) untuk dibandingkan antar run (--compare).
+#
+# Contoh:
+#   python bench/bench_storage.py --out /tmp/storage_before.json
+#   python bench/bench_storage.py --out /tmp/storage_after.json --compare /tmp/storage_before.json
+#   python bench/bench_storage.py --ops get_invoice,list_invite_logs --sizes 0,100000 --concurrency 1,8
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_storage_"), "init.db"))
+
+from app import storage  # noqa: E402
+
+GROUPS = ["-1008000001", "-1008000002"]
+OPS = (
+    "create_invoice", "get_invoice", "update_invoice_status", "mark_paid",
+    "update_qris_payload", "add_invite_log", "list_invite_logs",
+)
+
+
+def _qr_data_url(n_bytes: int) -> str:
+    return "data:image/png;base64," + base64.b64encode(os.urandom(n_bytes * 3 // 4)).decode()
+
+
+def _prefill(path: str, size: int) -> list:
+    """Isi invoices + invite_logs (2 log/invoice) langsung via executemany (cepat)."""
+    now = int(time.time())
+    ids = [str(uuid.uuid4()) for _ in range(size)]
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO invoices (invoice_id, user_id, amount, groups_json, status, created_at, timeline) "
+        "VALUES (?, ?, 25000, ?, ?, ?, ?)",
+        ((iid, 7_000_000 + i, json.dumps(GROUPS), "PAID" if i % 3 else "PENDING", now - i, f"created@{now * 1000};")
+         for i, iid in enumerate(ids)),
+    )
+    conn.executemany(
+        "INSERT INTO invite_logs (invoice_id, group_id, invite_link, error, created_at) VALUES (?, ?, ?, NULL, ?)",
+        ((iid, g, "(sent)", now) for iid in ids for g in GROUPS),
+    )
+    conn.commit()
+    conn.close()
+    return ids
+
+
+class Ctx:
+    """State per sel (ukuran tabel): id invoice yang ada + payload QR."""
+
+    def __init__(self, ids: list, qr_bytes: int):
+        self.ids = ids or []
+        self.lock = threading.Lock()
+        self.qr = _qr_data_url(qr_bytes)
+
+    def pick(self) -> str:
+        return random.choice(self.ids)
+
+    def add(self, iid: str) -> None:
+        with self.lock:
+            self.ids.append(iid)
+
+
+def _op(name: str, ctx: Ctx):
+    if name == "create_invoice":
+        return lambda: ctx.add(storage.create_invoice(7_000_001, GROUPS, 25000)["invoice_id"])
+    if name == "get_invoice":
+        return lambda: storage.get_invoice(ctx.pick())
+    if name == "update_invoice_status":
+        return lambda: storage.update_invoice_status(ctx.pick(), random.choice(("PENDING", "EXPIRED")))
+    if name == "mark_paid":
+        return lambda: storage.mark_paid(ctx.pick())
+    if name == "update_qris_payload":
+        return lambda: storage.update_qris_payload(ctx.pick(), ctx.qr)
+    if name == "add_invite_log":
+        return lambda: storage.add_invite_log(ctx.pick(), GROUPS[0], "(sent)", None)
+    if name == "list_invite_logs":
+        return lambda: storage.list_invite_logs(ctx.pick())
+    raise SystemExit(f"unknown op {name}")
+
+
+def _run_once(fn, n_ops: int, concurrency: int) -> tuple:
+    """n_ops panggilan dibagi ke `concurrency` thread → (detik, [latency_ns])."""
+    per = [n_ops // concurrency + (1 if i < n_ops % concurrency else 0) for i in range(concurrency)]
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(k: int) -> list:
+        lat = []
+        start.wait()
+        for _ in range(k):
+            t0 = time.perf_counter_ns()
+            fn()
+            lat.append(time.perf_counter_ns() - t0)
+        return lat
+
+    with ThreadPoolExecutor(concurrency) as ex:
+        futs = [ex.submit(worker, k) for k in per]
+        start.wait()
+        t0 = time.perf_counter()
+        lats = [x for f in futs for x in f.result()]
+        elapsed = time.perf_counter() - t0
+    return elapsed, lats
+
+
+def _pct_us(sorted_ns: list, p: float) -> float:
+    return round(sorted_ns[min(len(sorted_ns) - 1, int(p / 100 * len(sorted_ns)))] / 1000, 1)
+
+
+def _bench_cell(op: str, ctx: Ctx, concurrency: int, args) -> dict:
+    fn = _op(op, ctx)
+    _run_once(fn, args.warmup, concurrency)  # warmup: page cache, koneksi, jalur kode
+    rates, all_lat = [], []
+    for _ in range(args.repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            elapsed, lat = _run_once(fn, args.ops_per_repeat, concurrency)
+        finally:
+            gc.enable()
+        rates.append(len(lat) / elapsed)
+        all_lat.extend(lat)
+    all_lat.sort()
+    mean = statistics.fmean(rates)
+    cv = statistics.pstdev(rates) / mean if mean else 0.0
+    return {
+        "ops_per_s": round(statistics.median(rates), 1),
+        "ops_per_s_min": round(min(rates), 1),
+        "p50_us": _pct_us(all_lat, 50),
+        "p95_us": _pct_us(all_lat, 95),
+        "p99_us": _pct_us(all_lat, 99),
+        "cv": round(cv, 3),
+        "noisy": cv > args.noisy_cv,
+    }
+
+
+def _meta(args) -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        rev = None
+    return {
+        "git": rev,
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def _compare(results: list, old: dict) -> None:
+    prev = {(r["op"], r["size"], r["concurrency"]): r for r in old.get("results", [])}
+    print(f"{'op':24} {'size':>7} {'conc':>4} {'ops/s':>10} {'before':>10} {'delta':>8} {'p95 us':>9}", file=sys.stderr)
+    for r in results:
+        o = prev.get((r["op"], r["size"], r["concurrency"]))
+        before = o["ops_per_s"] if o else None
+        delta = f"{(r['ops_per_s'] / before - 1) * 100:+.1f}%" if before else "-"
+        flag = " ~" if r["noisy"] or (o and o.get("noisy")) else ""
+        print(f"{r['op']:24} {r['size']:>7} {r['concurrency']:>4} {r['ops_per_s']:>10} "
+              f"{before if before is not None else '-':>10} {delta:>8} {r['p95_us']:>9}{flag}", file=sys.stderr)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Micro-benchmark app/storage.py")
+    ap.add_argument("--ops", default=",".join(OPS), help="daftar operasi, dipisah koma")
+    ap.add_argument("--sizes", default="0,10000,100000", help="jumlah invoice yang diisi lebih dulu")
+    ap.add_argument("--concurrency", default="1,4,8", help="jumlah thread pemanggil")
+    ap.add_argument("--ops-per-repeat", type=int, default=500)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=100)
+    ap.add_argument("--qr-bytes", type=int, default=100_000, help="ukuran payload update_qris_payload")
+    ap.add_argument("--noisy-cv", type=float, default=0.10, help="CV antar ulangan di atas ini = noisy")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="simpan hasil JSON")
+    ap.add_argument("--compare", help="JSON run sebelumnya → tabel delta di stderr")
+    args = ap.parse_args()
+    random.seed(args.seed)
+
+    ops = [o.strip() for o in args.ops.split(",") if o.strip()]
+    sizes = [int(x) for x in args.sizes.split(",")]
+    levels = [int(x) for x in args.concurrency.split(",")]
+    results = []
+    for size in sizes:
+        # DB baru per ukuran tabel supaya sel tidak saling memengaruhi antar ukuran
+        storage.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_storage_"), f"n{size}.db")
+        storage.init_db()
+        ctx = Ctx(_prefill(storage.DB_PATH, size), args.qr_bytes)
+        if not ctx.ids:
+            ctx.add(storage.create_invoice(7_000_000, GROUPS, 25000)["invoice_id"])
+        for op in ops:
+            for c in levels:
+                r = {"op": op, "size": size, "concurrency": c, **_bench_cell(op, ctx, c, args)}
+                results.append(r)
+                print(json.dumps(r), file=sys.stderr)
+
+    out = {"bench": "storage", "meta": _meta(args), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(out, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(results, json.load(f))
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    main()